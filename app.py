@@ -1,16 +1,39 @@
-# --- PASSO 1: Adicione "send_file" e "io" aos imports ---
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, flash, session, send_file
-import io 
+from flask import Flask, render_template, request, redirect, url_for, send_from_directory, flash, session, jsonify, g
+import gzip
+import json
+import math
+import time
+import hashlib
+import uuid
+import logging
+from datetime import datetime, timezone
 from werkzeug.utils import secure_filename
+from werkzeug.http import is_resource_modified
 # Supondo que process_file agora gerará 3 gráficos
-from ml._main import process_file 
-import pandas as pd
+from ml._jobs import JobQueue, QueueFullError, STATUS_DONE
+from ml._cache import ResultCache
+from ml._results import ResultStore
+from ml._state import ModelStateStore
+from ml._select import ModelSelector
+from ml._intervals import BootstrapIntervals
+from ml._metrics import Metrics, SlowRequestProfiler, configure_logging
+from ml._preload import preload, HEAVY_MODULES
+from ml._template import (TEMPLATE_VERSION, DEFAULT_LANGUAGE, PRESETS, template_variant, template_etag,
+                          build_template)
+from ml._main import MODEL_PARAMS, MAX_PERIODS
+from ml._batch import DEFAULT_KEY_COL
+from ml._scenario import has_state, run_scenarios
+from ml._rollups import GRANULARITIES, DEFAULT_MAX_POINTS, POINT_LIMITS, load_rollup, downsample
+from ml._frames import frame_paths, has_frames, load_frames, ensure_workbook, write_atomic
+from ml._bytecache import BytesCache
+from ml._plots import render_chart, chart_size, CHART_KINDS, FORMATS, DEFAULT_SIZE, DEFAULT_DPI
 import os
 
-import matplotlib
-# Usar backend não interativo para evitar problemas com threads
-matplotlib.use('Agg')  # Usar backend não interativo
-import matplotlib.pyplot as plt
+# Brotli é opcional: sem ele a API comprime apenas com gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'xlsx', 'csv'}
@@ -18,15 +41,216 @@ ALLOWED_EXTENSIONS = {'xlsx', 'csv'}
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['SECRET_KEY'] = 'waste-textile-secret-key' # Use uma chave mais segura em produção
+# Tamanho máximo do upload: requisições maiores são recusadas (413) antes de o corpo ser lido
+app.config['MAX_CONTENT_LENGTH'] = int(float(os.environ.get('WASTE_MAX_UPLOAD_MB', 50)) * 1024 * 1024)
+# Fila de processamento: nº de processos do pool, limite de jobs pendentes e como
+# os processos são criados (vazio = padrão da plataforma; o gunicorn.conf.py usa forkserver)
+app.config['JOB_WORKERS'] = int(os.environ.get('WASTE_JOB_WORKERS', 2))
+app.config['JOB_MAX_PENDING'] = int(os.environ.get('WASTE_JOB_MAX_PENDING', 20))
+app.config['JOB_START_METHOD'] = os.environ.get('WASTE_JOB_START_METHOD') or None
+# Tempo máximo (s) de um job na fila (0 = sem limite)
+app.config['JOB_TIMEOUT'] = float(os.environ.get('WASTE_JOB_TIMEOUT', 600))
+# Cache de resultados por conteúdo: limite em MB e em número de entradas
+app.config['CACHE_MAX_MB'] = int(os.environ.get('WASTE_CACHE_MAX_MB', 500))
+app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('WASTE_CACHE_MAX_ENTRIES', 200))
+# Resultados por usuário: limite total em MB, idade máxima sem uso e intervalo da limpeza
+app.config['RESULTS_MAX_MB'] = int(os.environ.get('WASTE_RESULTS_MAX_MB', 1024))
+app.config['RESULTS_MAX_AGE_HOURS'] = float(os.environ.get('WASTE_RESULTS_MAX_AGE_HOURS', 168))
+app.config['RESULTS_SWEEP_SECONDS'] = float(os.environ.get('WASTE_RESULTS_SWEEP_SECONDS', 300))
+# Modo incremental: reajuste completo a cada N meses novos ou quando o erro passa de X RMSE
+app.config['REFIT_EVERY'] = int(os.environ.get('WASTE_REFIT_EVERY', 12))
+app.config['DRIFT_SIGMAS'] = float(os.environ.get('WASTE_DRIFT_SIGMAS', 3.0))
+# Seleção automática de modelo (0 = só o Holt), tempo máximo por arquivo e processos
+# de cada seleção (0 = CPUs divididas entre os processos da fila)
+app.config['SELECT_MODELS'] = os.environ.get('WASTE_SELECT_MODELS', '1') == '1'
+app.config['SELECT_BUDGET'] = float(os.environ.get('WASTE_SELECT_BUDGET', 30))
+app.config['SELECT_WORKERS'] = (int(os.environ.get('WASTE_SELECT_WORKERS', 0))
+                                or max(1, (os.cpu_count() or 1) // app.config['JOB_WORKERS']))
+# Intervalos de previsão por simulação: caminhos por série, semente e cobertura
+app.config['INTERVAL_PATHS'] = int(os.environ.get('WASTE_INTERVAL_PATHS', 5000))
+app.config['INTERVAL_SEED'] = int(os.environ.get('WASTE_INTERVAL_SEED', 42))
+app.config['INTERVAL_LEVEL'] = float(os.environ.get('WASTE_INTERVAL_LEVEL', 0.90))
+# Logs estruturados (chave=valor, ou JSON por linha com WASTE_LOG_JSON=1)
+app.config['LOG_LEVEL'] = os.environ.get('WASTE_LOG_LEVEL', 'INFO')
+app.config['LOG_JSON'] = os.environ.get('WASTE_LOG_JSON', '0') == '1'
+# Perfil de requisições lentas (desligado com 0): grava o perfil das que passarem de N ms
+app.config['PROFILE_SLOW_MS'] = float(os.environ.get('WASTE_PROFILE_SLOW_MS', 0))
+app.config['PROFILER'] = os.environ.get('WASTE_PROFILER', 'cprofile')
+# statsmodels, Matplotlib e openpyxl são importados sob demanda; com 1, já no início
+# (para servidores que fazem fork dos workers depois de carregar o app)
+app.config['PRELOAD'] = os.environ.get('WASTE_PRELOAD', '0') == '1'
+
+configure_logging(app.config['LOG_LEVEL'], app.config['LOG_JSON'])
+logger = logging.getLogger(__name__)
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+
+result_cache = ResultCache(
+    os.path.join(UPLOAD_FOLDER, '.cache'),
+    max_bytes=app.config['CACHE_MAX_MB'] * 1024 * 1024,
+    max_entries=app.config['CACHE_MAX_ENTRIES'],
+)
+
+# Estado ajustado do modelo por conjunto de dados, para atualizações incrementais
+model_states = ModelStateStore(
+    os.path.join(UPLOAD_FOLDER, '.states'),
+    refit_every=app.config['REFIT_EVERY'],
+    drift_sigmas=app.config['DRIFT_SIGMAS'],
+)
+
+# Uploads e resultados de cada usuário, em pastas com id único, removidos por idade/tamanho
+result_store = ResultStore(
+    os.path.join(UPLOAD_FOLDER, 'results'),
+    max_bytes=app.config['RESULTS_MAX_MB'] * 1024 * 1024,
+    max_age_seconds=app.config['RESULTS_MAX_AGE_HOURS'] * 3600,
+    sweep_seconds=app.config['RESULTS_SWEEP_SECONDS'],
+    states=model_states,
+)
+result_store.start_sweeper()
+
+# Contadores e histogramas (rota /metrics), somados entre o servidor e os workers da fila
+metrics = Metrics(os.path.join(UPLOAD_FOLDER, 'metrics.sqlite3'))
+metrics.start_flusher()
+
+profiler = None
+if app.config['PROFILE_SLOW_MS'] > 0:
+    profiler = SlowRequestProfiler(
+        os.path.join(UPLOAD_FOLDER, '.profiles'),
+        app.config['PROFILE_SLOW_MS'],
+        use_pyinstrument=app.config['PROFILER'] == 'pyinstrument',
+    )
+
+# Escolha do modelo de cada série (Holt, amortecido, multiplicativo, sazonal ou ingênuo);
+# sem ela, cada série usa o Holt de MODEL_PARAMS
+model_selector = None
+if app.config['SELECT_MODELS']:
+    model_selector = ModelSelector(budget_seconds=app.config['SELECT_BUDGET'], workers=app.config['SELECT_WORKERS'])
+
+# Faixa mínima/máxima esperada da produção prevista
+prediction_intervals = BootstrapIntervals(
+    paths=app.config['INTERVAL_PATHS'],
+    seed=app.config['INTERVAL_SEED'],
+    level=app.config['INTERVAL_LEVEL'],
+)
+
+# Gráficos renderizados sob demanda: LRU em memória + disco
+chart_cache = BytesCache(os.path.join(UPLOAD_FOLDER, '.charts'))
+
+# Modelos de upload (/download/template), montados uma vez por variante: o
+# cache LRU em memória + disco próprio, compartilhado entre workers
+template_cache = BytesCache(os.path.join(UPLOAD_FOLDER, '.templates'),
+                            max_memory_bytes=8 * 1024 * 1024, max_disk_bytes=32 * 1024 * 1024)
+
+def template_bytes(variant):
+    key = BytesCache.make_key('modelo', TEMPLATE_VERSION, *variant)
+    return template_cache.get_or_render(key, lambda: build_template(variant))
+
+if app.config['PRELOAD']:
+    preload()
+    # Variantes mais usadas do modelo já ficam prontas em memória
+    for preset in PRESETS:
+        template_bytes(template_variant(*preset))
+
+# Os jobs ficam em SQLite dentro da pasta de uploads e são retomados ao reiniciar
+jobs = JobQueue(
+    os.path.join(UPLOAD_FOLDER, 'jobs.sqlite3'),
+    max_workers=app.config['JOB_WORKERS'],
+    max_pending=app.config['JOB_MAX_PENDING'],
+    cache=result_cache,
+    states=model_states,
+    selector=model_selector,
+    metrics=metrics,
+    intervals=prediction_intervals,
+    start_method=app.config['JOB_START_METHOD'],
+    job_timeout=app.config['JOB_TIMEOUT'] or None,
+    preload_modules=HEAVY_MODULES if app.config['PRELOAD'] else (),
+)
+jobs.recover()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.profile = profiler.start() if profiler is not None else None
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.request_start
+    route = request.endpoint or 'desconhecida'
+    labels = {'route': route, 'method': request.method, 'status': response.status_code}
+    metrics.inc('waste_http_requests_total', **labels)
+    metrics.observe('waste_http_request_duration_seconds', elapsed, **labels)
+
+    if profiler is not None:
+        dump = profiler.stop(g.profile, route, elapsed * 1000)
+        if dump:
+            logger.warning('Requisição lenta', extra={'path': request.path, 'ms': round(elapsed * 1000, 1),
+                                                      'profile': dump})
+    return response
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    message = f"Arquivo muito grande! O limite é de {app.config['MAX_CONTENT_LENGTH'] / (1024 * 1024):g} MB."
+    if wants_json() or request.path == url_for('upload_batch'):
+        return jsonify({'error': message}), 413
+    flash(message)
+    return redirect(url_for('index'))
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def namespace():
+    # Cada sessão tem seu próprio espaço de resultados
+    if 'owner' not in session:
+        session['owner'] = uuid.uuid4().hex
+    return session['owner']
+
+def save_upload(file):
+    """
+    Grava o arquivo enviado na pasta de um resultado novo do usuário e
+    retorna (id do resultado, caminho do arquivo, pasta de saída).
+    """
+    filename = secure_filename(file.filename)
+    result_id, result_dir = result_store.create(namespace(), os.path.splitext(filename)[0])
+    filepath = write_atomic(os.path.join(result_dir, filename), file.save)
+    return result_id, filepath, result_dir
+
+def submit_upload(result_id, filepath, result_dir, **options):
+    """
+    Envia o upload gravado para a fila. Se ela encheu enquanto o arquivo
+    era gravado, descarta o resultado (pasta e índice) e repassa o
+    QueueFullError.
+    """
+    try:
+        return jobs.submit(filepath, result_dir, **options)
+    except QueueFullError:
+        result_store.discard(namespace(), result_id)
+        raise
+
+def dataset_name(filepath):
+    # O estado incremental é separado por usuário, como os resultados
+    dataset = secure_filename(request.form.get('conjunto', '')) or os.path.splitext(os.path.basename(filepath))[0]
+    return ModelStateStore.namespaced(namespace(), dataset)
+
+def forecast_horizon():
+    """
+    Horizonte da previsão pedido no campo `horizonte` (meses, padrão 12).
+    Levanta ValueError se não for um inteiro entre 1 e MAX_PERIODS.
+    """
+    value = request.form.get('horizonte', '').strip()
+    if not value:
+        return MODEL_PARAMS['periods']
+    if not value.isdigit() or not 1 <= int(value) <= MAX_PERIODS:
+        raise ValueError(f'O horizonte de previsão deve ser um número de meses entre 1 e {MAX_PERIODS}.')
+    return int(value)
+
+def wants_json():
+    # Clientes de API pedem JSON; o formulário da página segue com redirecionamento
+    return request.accept_mimetypes.best == 'application/json'
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', default_periods=MODEL_PARAMS['periods'], max_periods=MAX_PERIODS)
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -40,107 +264,363 @@ def upload_file():
         return redirect(url_for('index'))
 
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        try:
+            periods = forecast_horizon()
+        except ValueError as e:
+            if wants_json():
+                return jsonify({'error': str(e)}), 400
+            flash(str(e))
+            return redirect(url_for('index'))
 
+        # O processamento roda na fila; a resposta volta imediatamente com o id do job.
+        # Com a fila cheia, o upload é recusado antes de ser gravado.
         try:
-            # --- ALTERAÇÃO IMPORTANTE ---
-            # Ajuste sua função `process_file` para retornar o caminho do CSV e uma LISTA com os 3 caminhos dos gráficos.
-            # Exemplo de retorno esperado: ('caminho/do/output.csv', ['caminho/fig1.png', 'caminho/fig2.png', 'caminho/fig3.png'])
-            out_csv_path, out_fig_paths = process_file(filepath, app.config['UPLOAD_FOLDER'])
-            
-            # Verifique se foram retornados 3 gráficos
-            if len(out_fig_paths) != 3:
-                flash('Erro no processamento: a função não retornou 3 gráficos.')
-                return redirect(url_for('index'))
+            jobs.ensure_capacity()
+            result_id, filepath, result_dir = save_upload(file)
 
-        except Exception as e:
-            flash(f'Erro no processamento do arquivo: {str(e)}')
+            # Modo incremental: os meses enviados atualizam a previsão do conjunto
+            options = {'dataset': dataset_name(filepath), 'periods': periods}
+            if request.form.get('modo') == 'incremental':
+                options['incremental'] = True
+            job_id = submit_upload(result_id, filepath, result_dir, **options)
+        except QueueFullError as e:
+            if wants_json():
+                return jsonify({'error': str(e)}), 429
+            flash(str(e))
             return redirect(url_for('index'))
 
-        # Salva o nome do arquivo CSV na sessão
-        out_csv_name = os.path.basename(out_csv_path)
-        session['last_processed_file'] = out_csv_name
-
-        # Salva os nomes dos arquivos de imagem dos gráficos na sessão
-        session['fig1'] = os.path.basename(out_fig_paths[0])
-        session['fig2'] = os.path.basename(out_fig_paths[1])
-        session['fig3'] = os.path.basename(out_fig_paths[2])
+        # Guarda os jobs do usuário na sessão para autorizar a consulta de status
+        session['jobs'] = session.get('jobs', [])[-9:] + [job_id]
 
-        # Redireciona com sucesso
-        return redirect(url_for('index') + '?upload=success')
+        if wants_json():
+            return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
+        return redirect(url_for('index', job=job_id))
     else:
         flash('Tipo de arquivo não permitido! Envie apenas .xlsx ou .csv')
         return redirect(url_for('index'))
 
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    Upload em lote (API JSON): um arquivo em formato longo com várias
+    plantas/linhas identificadas pela coluna informada em `chave`, com
+    previsão para `horizonte` meses (padrão 12).
+    """
+    file = request.files.get('arquivo')
+    if file is None or file.filename == '':
+        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+    if not allowed_file(file.filename):
+        return jsonify({'error': 'Tipo de arquivo não permitido! Envie apenas .xlsx ou .csv'}), 400
+    try:
+        periods = forecast_horizon()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    key_col = request.form.get('chave', DEFAULT_KEY_COL)
+    try:
+        jobs.ensure_capacity()
+        result_id, filepath, result_dir = save_upload(file)
+        job_id = submit_upload(result_id, filepath, result_dir, kind='batch', key_col=key_col, periods=periods)
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429
+
+    session['jobs'] = session.get('jobs', [])[-9:] + [job_id]
+    return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    if job_id not in session.get('jobs', []):
+        return jsonify({'error': 'Job não encontrado'}), 404
+
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+
+    payload = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'progress': job['progress'],
+        'error': job['error'],
+    }
+
+    if job['status'] == STATUS_DONE:
+        # A pasta de saída do job é a pasta do resultado: registra os arquivos no índice
+        result_id = os.path.basename(job['output_dir'])
+        result_store.complete(namespace(), result_id, {
+            'kind': job['kind'],
+            'workbook': os.path.basename(job['result']['output']),
+        })
+        payload['result_id'] = result_id
+        payload['download_url'] = url_for('download_file_route', result_id=result_id)
+
+        # Lotes não alimentam o dashboard (que é de uma planta só), apenas o download
+        if job['kind'] != 'batch':
+            session['last_result'] = result_id
+            payload['plots'] = [url_for('serve_plot', result_id=result_id, kind=kind) for kind in CHART_KINDS]
+
+    return jsonify(payload)
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Contadores/histogramas acumulados + valores lidos na hora (fila e cache)
+    stats = result_cache.stats()
+    stored = result_store.stats()
+    extra = {
+        'waste_results_entries': ('gauge', stored['entries']),
+        'waste_results_bytes': ('gauge', stored['bytes']),
+        'waste_jobs_pending': ('gauge', jobs.pending_count()),
+        'waste_result_cache_entries': ('gauge', stats['entries']),
+        'waste_result_cache_bytes': ('gauge', stats['bytes']),
+        'waste_result_cache_hits_total': ('counter', stats['hits']),
+        'waste_result_cache_misses_total': ('counter', stats['misses']),
+        'waste_result_cache_evictions_total': ('counter', stats['evictions']),
+    }
+    return app.response_class(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
 # --- PASSO 2: Adicione a nova rota para o download do modelo aqui ---
 @app.route('/download/template')
 def download_template():
-    # Define as colunas que você quer no arquivo Excel
-    columns = [
-        'Mes', 
-        'Producao_Total_kg', 
-        'Eficiencia_kg_h', 
-        'Horas_Operacionais', 
-        'Residuo_kg'
-    ]
-    
-    # Cria um DataFrame do pandas vazio apenas com os cabeçalhos
-    df = pd.DataFrame(columns=columns)
-    
-    # Cria um buffer de bytes na memória para salvar o arquivo
-    output = io.BytesIO()
-    
-    # Salva o DataFrame como um arquivo Excel no buffer, sem o índice
-    df.to_excel(output, index=False, sheet_name='Dados')
-    
-    # Move o cursor para o início do buffer para que ele possa ser lido
-    output.seek(0)
-    
-    # Envia o arquivo em memória para o usuário como um anexo para download
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name='modelo_waste_textile.xlsx'
-    )
+    """
+    Modelo Excel para upload. Parâmetros opcionais: `idioma` (pt, en, es)
+    das instruções, `chave` (nome da coluna de planta/linha, para o upload
+    em lote) e `extras` (colunas opcionais separadas por vírgulas).
+    """
+    extras = request.args.get('extras')
+    try:
+        variant = template_variant(request.args.get('idioma', DEFAULT_LANGUAGE),
+                                   request.args.get('chave') or None,
+                                   extras.split(',') if extras else ())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Os bytes vêm do cache: a planilha só é montada na primeira vez de cada variante
+    data = template_bytes(variant)
+
+    # Envia o arquivo em memória para o usuário como um anexo para download,
+    # com ETag forte (hash dos bytes, que são determinísticos) para requisições condicionais
+    response = app.response_class(data, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    response.headers['Content-Disposition'] = 'attachment; filename=modelo_waste_textile.xlsx'
+    response.set_etag(template_etag(data))
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
 # -------------------------------------------------------------------------
 
-@app.route('/download/<filename>')
-def download_file_route(filename): # Renomeado para evitar conflito de nome
-    if 'last_processed_file' not in session or session['last_processed_file'] != filename:
+def find_result(result_id, kind=None):
+    """
+    Procura o resultado no índice, só entre os do usuário atual. Retorna o
+    registro e o caminho do Excel (que pode ainda não ter sido gerado), ou
+    (None, None).
+    """
+    result = result_store.lookup(namespace(), result_id)
+    if result is None or (kind is not None and result['files'].get('kind') != kind):
+        return None, None
+    workbook_path = os.path.join(result['dir'], result['files']['workbook'])
+    if not has_frames(workbook_path):
+        return None, None
+    return result, workbook_path
+
+@app.route('/download/<result_id>')
+def download_file_route(result_id): # Renomeado para evitar conflito de nome
+    result, file_path = find_result(result_id)
+    if result is None:
         flash('Arquivo não encontrado ou acesso inválido.')
         return redirect(url_for('index'))
 
+    # O Excel é gerado a partir dos Parquet só no primeiro download
+    if not os.path.exists(file_path):
+        with metrics.span('waste_workbook_build_seconds'):
+            ensure_workbook(file_path)
+
     return send_from_directory(
-        directory=app.config['UPLOAD_FOLDER'],
-        path=filename,
-        as_attachment=True
+        directory=result['dir'],
+        path=result['files']['workbook'],
+        as_attachment=True,
+        # O nome do conjunto leva o namespace do usuário (ver dataset_name); o download não
+        download_name=result['files']['workbook'].removeprefix(ModelStateStore.namespaced(namespace(), ''))
     )
 
 # --- ROTA PARA SERVIR AS IMAGENS ---
-@app.route('/plots/<filename>')
-def serve_plot(filename):
-    # Por segurança, verifica se o arquivo solicitado está na sessão
-    allowed_files = [session.get('fig1'), session.get('fig2'), session.get('fig3')]
-    if filename not in allowed_files:
-        return 'Acesso não permitido', 403
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+def number_arg(name, default):
+    # Lê um parâmetro numérico da query string; inválido, NaN ou infinito vira o padrão
+    value = request.args.get(name, default, type=float)
+    return value if math.isfinite(value) else default
+
+def bounded_arg(name, default, limits):
+    # Lê um parâmetro numérico da query string, limitado a `limits`
+    return min(max(number_arg(name, default), limits[0]), limits[1])
+
+@app.route('/plots/<result_id>/<kind>')
+def serve_plot(result_id, kind):
+    """
+    Renderiza o gráfico `kind` (ver CHART_KINDS) na primeira requisição, a
+    partir dos Parquet do resultado. Aceita `w` e `h` (polegadas), `dpi` e
+    `format` (png ou svg); tamanho e dpi vão para os valores aceitos mais
+    próximos (ver chart_size).
+    """
+    # Por segurança, só resultados do próprio usuário são encontrados
+    _, workbook_path = find_result(result_id, kind='single')
+    if kind not in CHART_KINDS or workbook_path is None:
+        return 'Gráfico não encontrado', 404
+
+    fmt = request.args.get('format', 'png')
+    if fmt not in FORMATS:
+        return 'Formato não suportado', 400
+    width, height, dpi = chart_size(number_arg('w', DEFAULT_SIZE[0]), number_arg('h', DEFAULT_SIZE[1]),
+                                    number_arg('dpi', DEFAULT_DPI))
+
+    # A data de modificação dos Parquet entra na chave: reprocessar o mesmo
+    # arquivo gera um resultado novo e invalida os gráficos antigos
+    version = os.stat(frame_paths(workbook_path)['combined']).st_mtime_ns
+    key = BytesCache.make_key(result_id, version, kind, width, height, dpi, fmt)
+
+    def render():
+        with metrics.span('waste_chart_render_seconds', kind=kind, format=fmt):
+            combined_df, forecast_df = load_frames(workbook_path)
+            return render_chart(combined_df, forecast_df, kind, width, height, dpi, fmt)
+
+    data = chart_cache.get_or_render(key, render)
+    return app.response_class(data, mimetype=FORMATS[fmt])
+
+# --- API JSON DE RESULTADOS ---
+# Chaves de série que podem ser pedidas em `fields`
+SERIES_FIELDS = ['months', 'production', 'efficiency', 'hours', 'waste', 'min_expected', 'max_expected', 'is_forecast']
+
+# Respostas menores que isso não compensam a compressão
+MIN_COMPRESS_BYTES = 512
+
+def json_safe(values):
+    # NaN não é JSON válido: vira null
+    return [None if isinstance(v, float) and math.isnan(v) else v for v in values]
+
+def select_series(data, fields):
+    """Seleciona as séries do dashboard pedidas em `fields`."""
+    return {field: json_safe(data[field]) for field in fields if field in SERIES_FIELDS and field in data}
+
+def negotiate_encoding():
+    # Prefere br quando disponível; a qualidade pedida pelo cliente decide entre os suportados
+    supported = (['br'] if brotli is not None else []) + ['gzip']
+    return request.accept_encodings.best_match(supported)
+
+def compressed_json_response(build, version, last_modified):
+    """
+    Monta a resposta JSON com ETag/Last-Modified e compressão negociada.
+    A ETag depende só da versão do resultado, da consulta e da codificação
+    aceita, então o 304 sai antes de montar o payload: `build()` (que
+    retorna o payload) só é chamado quando o cliente não tem a
+    representação atual.
+    """
+    negotiated = negotiate_encoding()
+    digest = hashlib.sha256(f"{version}|{request.query_string.decode()}".encode()).hexdigest()[:32]
+    etag = f"{digest}-{negotiated}" if negotiated else digest
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = app.response_class(status=304)
+    else:
+        body = json.dumps(build(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        encoding = negotiated if len(body) >= MIN_COMPRESS_BYTES else None
+        if encoding == 'br':
+            body = brotli.compress(body)
+        elif encoding == 'gzip':
+            body = gzip.compress(body)
+        response = app.response_class(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.vary.add('Accept-Encoding')
+    response.vary.add('Cookie')
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response
+
+@app.route('/api/v1/results/<result_id>')
+def api_result(result_id):
+    """
+    Séries e métricas de um resultado para o dashboard.
+
+    Parâmetros: `fields` (lista separada por vírgulas de SERIES_FIELDS e/ou
+    `metrics`), `start` e `end` (AAAA-MM) para limitar o período,
+    `granularity` (month, quarter ou year) e `points` (máximo de pontos por
+    série; séries maiores são reduzidas com LTTB).
+    """
+    _, workbook_path = find_result(result_id, kind='single')
+    if workbook_path is None:
+        return jsonify({'error': 'Resultado não encontrado'}), 404
+
+    fields = request.args.get('fields')
+    fields = fields.split(',') if fields else SERIES_FIELDS + ['metrics']
+    unknown = [f for f in fields if f not in SERIES_FIELDS + ['metrics']]
+    if unknown:
+        return jsonify({'error': f'Campos desconhecidos: {", ".join(unknown)}'}), 400
+    granularity = request.args.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f'Granularidade desconhecida: {granularity}'}), 400
+    max_points = int(bounded_arg('points', DEFAULT_MAX_POINTS, POINT_LIMITS))
+
+    stat = os.stat(frame_paths(workbook_path)['combined'])
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), tz=timezone.utc)
+
+    def build():
+        data = process_data_for_dashboard(workbook_path, granularity, request.args.get('start'),
+                                          request.args.get('end'), max_points)
+        payload = {
+            'id': result_id,
+            'api_version': 1,
+            'granularity': granularity,
+            'series': select_series(data, fields),
+        }
+        if 'metrics' in fields:
+            payload['metrics'] = data['metrics']
+        return payload
+
+    return compressed_json_response(build, stat.st_mtime_ns, last_modified)
+
+@app.route('/api/v1/results/<result_id>/scenarios', methods=['POST'])
+def api_scenarios(result_id):
+    """
+    Cenários "e se" sobre a previsão de um resultado, sem reprocessar o
+    arquivo: o corpo JSON é {"scenarios": [{"name": ..., "efficiency_pct":
+    5, "hours_max": 700, ...}, ...]} (ou um único cenário como objeto) e
+    todos são calculados de uma vez sobre o modelo já ajustado (ver
+    ml._scenario).
+    """
+    _, workbook_path = find_result(result_id, kind='single')
+    if workbook_path is None or not has_state(workbook_path):
+        return jsonify({'error': 'Resultado não encontrado'}), 404
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Envie um objeto JSON com os cenários.'}), 400
+    specs = body['scenarios'] if 'scenarios' in body else [body]
+
+    try:
+        with metrics.span('waste_scenario_seconds'):
+            payload = run_scenarios(workbook_path, prediction_intervals, specs)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(payload, id=result_id, api_version=1))
 
 @app.route('/dashboard')
 def dashboard():
     # Verificar se há dados processados disponíveis
-    if 'last_processed_file' not in session:
+    if 'last_result' not in session:
         flash('Nenhum dado processado encontrado. Faça upload de um arquivo primeiro.')
         return redirect(url_for('index'))
     
     try:
-        # Carregar dados do arquivo processado
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], session['last_processed_file'])
+        # Carregar dados do arquivo processado (procurado no índice de resultados)
+        result_id = session['last_result']
+        _, file_path = find_result(result_id, kind='single')
         
-        # Verificar se o arquivo existe
-        if not os.path.exists(file_path):
+        # Verificar se os dados do resultado existem
+        if file_path is None:
             flash('Arquivo processado não encontrado. Faça upload novamente.')
             return redirect(url_for('index'))
             
@@ -152,122 +632,85 @@ def dashboard():
             flash('Erro ao processar dados para o dashboard.')
             return redirect(url_for('index'))
             
-        return render_template('dashboard.html', data=dashboard_data)
+        # As séries completas são buscadas pelo navegador na API JSON (cacheável);
+        # o HTML leva apenas as métricas dos cards
+        return render_template('dashboard.html', data=dashboard_data,
+                               api_url=url_for('api_result', result_id=result_id))
         
     except Exception as e:
-        app.logger.error(f'Erro ao carregar dashboard: {str(e)}')
+        logger.exception('Erro ao carregar dashboard')
         flash(f'Erro ao carregar dashboard: {str(e)}')
         return redirect(url_for('index'))
 
-def process_data_for_dashboard(csv_path):
+EMPTY_METRICS = {
+    'producao_total': 0, 'variacao_producao': 0,
+    'eficiencia': 0, 'variacao_eficiencia': 0,
+    'horas_operacionais': 0, 'variacao_horas': 0,
+    'residuo_estimado': 0, 'variacao_residuo': 0
+}
+
+def dashboard_metrics(monthly):
+    """Métricas dos cards: último mês histórico vs. primeiro mês previsto."""
+    history = monthly[~monthly['is_forecast']]
+    forecast = monthly[monthly['is_forecast']]
+    if len(history) == 0 or len(forecast) == 0:
+        # Valores padrão se não houver dados suficientes
+        return dict(EMPTY_METRICS)
+
+    ultimo_historico = history.iloc[-1]
+    primeira_previsao = forecast.iloc[0]
+
+    def variacao(col):
+        return float((primeira_previsao[col] - ultimo_historico[col]) / ultimo_historico[col] * 100)
+
+    return {
+        'producao_total': float(primeira_previsao['production']),
+        'variacao_producao': variacao('production'),
+        'eficiencia': float(primeira_previsao['efficiency']),
+        'variacao_eficiencia': variacao('efficiency'),
+        'horas_operacionais': float(primeira_previsao['hours']),
+        'variacao_horas': variacao('hours'),
+        'residuo_estimado': float(primeira_previsao['waste']),
+        'variacao_residuo': variacao('production')  # Resíduo varia na mesma proporção da produção
+    }
+
+def process_data_for_dashboard(csv_path, granularity='month', start=None, end=None, max_points=DEFAULT_MAX_POINTS):
     """
-    Processa os dados do arquivo Excel gerado pelo sistema para o dashboard
+    Processa os dados do resultado gerado pelo sistema para o dashboard.
+
+    As séries vêm das agregações por mês, trimestre ou ano (`granularity`),
+    calculadas uma vez por resultado (ver ml._rollups), filtradas pelos
+    períodos que tocam [`start`, `end`] (AAAA-MM) e reduzidas a no máximo
+    `max_points` pontos com LTTB, qualquer que seja o tamanho do histórico.
     """
     try:
-        # Ler o arquivo Excel (que contém duas abas)
-        dados_completos_df = pd.read_excel(csv_path, sheet_name='Dados_Completos')
-        previsoes_df = pd.read_excel(csv_path, sheet_name='Previsoes_12m')
-        
-        # VERIFICAÇÃO CRÍTICA: A aba Dados_Completos já contém as previsões!
-        # Precisamos separar apenas os dados históricos (primeiras 12 linhas)
-        dados_historicos = dados_completos_df.iloc[:12].copy()  # Apenas 2023
-        
-        # Garantir que a coluna Residuo_kg existe para dados históricos
-        if 'Residuo_kg' not in dados_historicos.columns or dados_historicos['Residuo_kg'].isnull().all():
-            dados_historicos['Residuo_kg'] = dados_historicos['Producao_Total_kg'] * 0.10
-        
-        # Preparar previsões - usar apenas da aba Previsoes_12m
-        previsoes_para_combinar = previsoes_df.copy()
-        
-        # Combinar dados históricos (2023) e previsões (2024)
-        dados_combinados = pd.concat([dados_historicos, previsoes_para_combinar], ignore_index=True)
-        
-        # Adicionar coluna is_forecast para identificar previsões
-        dados_combinados['is_forecast'] = [False] * len(dados_historicos) + [True] * len(previsoes_para_combinar)
-        
-        # Adicionar intervalos de confiança se disponíveis nas previsões
-        if all(col in previsoes_df.columns for col in ['Producao_Minima_Esperada', 'Producao_Maxima_Esperada']):
-            # Para dados históricos, preencher com valores vazios
-            min_expected_historical = [None] * len(dados_historicos)
-            max_expected_historical = [None] * len(dados_historicos)
-            
-            dados_combinados['min_expected'] = min_expected_historical + previsoes_df['Producao_Minima_Esperada'].tolist()
-            dados_combinados['max_expected'] = max_expected_historical + previsoes_df['Producao_Maxima_Esperada'].tolist()
-        
-        # Preparar dados para o dashboard
-        dashboard_data = {
-            'months': dados_combinados['Mes'].astype(str).tolist(),
-            'production': dados_combinados['Producao_Total_kg'].tolist(),
-            'efficiency': dados_combinados['Eficiencia_kg_h'].tolist(),
-            'hours': dados_combinados['Horas_Operacionais'].tolist(),
-            'waste': dados_combinados['Residuo_kg'].tolist(),
-            'is_forecast': dados_combinados['is_forecast'].tolist()
-        }
-        
-        # Adicionar intervalos de confiança se disponíveis
-        if 'min_expected' in dados_combinados.columns:
-            dashboard_data['min_expected'] = dados_combinados['min_expected'].tolist()
-        if 'max_expected' in dados_combinados.columns:
-            dashboard_data['max_expected'] = dados_combinados['max_expected'].tolist()
-        
-        # Calcular métricas para os cards (comparar último histórico vs primeira previsão)
-        if len(dados_historicos) > 0 and len(previsoes_para_combinar) > 0:
-            ultimo_historico = dados_historicos.iloc[-1]  # Último mês de 2023
-            primeira_previsao = previsoes_para_combinar.iloc[0]  # Primeiro mês de 2024
-            
-            # Calcular variações percentuais
-            variacao_producao = ((primeira_previsao['Producao_Total_kg'] - ultimo_historico['Producao_Total_kg']) / 
-                                 ultimo_historico['Producao_Total_kg']) * 100
-            variacao_eficiencia = ((primeira_previsao['Eficiencia_kg_h'] - ultimo_historico['Eficiencia_kg_h']) / 
-                                   ultimo_historico['Eficiencia_kg_h']) * 100
-            variacao_horas = ((primeira_previsao['Horas_Operacionais'] - ultimo_historico['Horas_Operacionais']) / 
-                              ultimo_historico['Horas_Operacionais']) * 100
-            
-            # Adicionar métricas ao dashboard_data
-            dashboard_data['metrics'] = {
-                'producao_total': float(primeira_previsao['Producao_Total_kg']),
-                'variacao_producao': float(variacao_producao),
-                'eficiencia': float(primeira_previsao['Eficiencia_kg_h']),
-                'variacao_eficiencia': float(variacao_eficiencia),
-                'horas_operacionais': float(primeira_previsao['Horas_Operacionais']),
-                'variacao_horas': float(variacao_horas),
-                'residuo_estimado': float(primeira_previsao['Residuo_kg']),
-                'variacao_residuo': float(variacao_producao)  # Resíduo varia na mesma proporção da produção
-            }
-        else:
-            # Valores padrão se não houver dados suficientes
-            dashboard_data['metrics'] = {
-                'producao_total': 0, 'variacao_producao': 0,
-                'eficiencia': 0, 'variacao_eficiencia': 0,
-                'horas_operacionais': 0, 'variacao_horas': 0,
-                'residuo_estimado': 0, 'variacao_residuo': 0
-            }
-        
-        # DEBUG: Verificar quantos registros temos
-        print(f"DEBUG: Dados históricos: {len(dados_historicos)} registros")
-        print(f"DEBUG: Previsões: {len(previsoes_para_combinar)} registros")
-        print(f"DEBUG: Total combinado: {len(dados_combinados)} registros")
-        print(f"DEBUG: Primeiros meses: {dados_combinados['Mes'].head(5).tolist()}")
-        print(f"DEBUG: Últimos meses: {dados_combinados['Mes'].tail(5).tolist()}")
-        
+        monthly = load_rollup(csv_path, 'month')
+        rollup = monthly if granularity == 'month' else load_rollup(csv_path, granularity)
+
+        if start is not None:
+            rollup = rollup[rollup['end'] >= start]
+        if end is not None:
+            rollup = rollup[rollup['start'] <= end]
+        shown = downsample(rollup, max_points)
+
+        dashboard_data = {field: shown[field].tolist() for field in SERIES_FIELDS}
+        dashboard_data['metrics'] = dashboard_metrics(monthly)
+
+        logger.debug('Dados do dashboard', extra={
+            'granularidade': granularity,
+            'periodos': len(rollup),
+            'pontos': len(shown),
+            'primeiro': dashboard_data['months'][0] if len(shown) else None,
+            'ultimo': dashboard_data['months'][-1] if len(shown) else None,
+        })
+
         return dashboard_data
-        
-    except Exception as e:
-        print(f"Erro ao processar dados para dashboard: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        
+
+    except Exception:
+        logger.exception('Erro ao processar dados para dashboard', extra={'path': csv_path})
+
         # Retornar dados vazios em caso de erro
-        return {
-            'months': [], 'production': [], 'efficiency': [], 'hours': [], 'waste': [],
-            'min_expected': [], 'max_expected': [], 'is_forecast': [], 
-            'metrics': {
-                'producao_total': 0, 'variacao_producao': 0,
-                'eficiencia': 0, 'variacao_eficiencia': 0,
-                'horas_operacionais': 0, 'variacao_horas': 0,
-                'residuo_estimado': 0, 'variacao_residuo': 0
-            }
-        }
+        return dict({field: [] for field in SERIES_FIELDS}, metrics=dict(EMPTY_METRICS))
 
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
\ No newline at end of file
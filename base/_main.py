@@ -1,63 +1,152 @@
 # Gerar o arquivo
+import os
+import argparse
+
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
 
-def criar_base_dados_melhorada():
+# Perfil sazonal das horas operacionais (mais horas no meio do ano), repetido a cada 12 meses
+HORAS_SAZONAIS = np.array([680, 720, 730, 710, 690, 750, 760, 740, 720, 710, 690, 680])
+
+# Eficiência do primeiro ano: tendência de melhoria ao longo do ano
+EFICIENCIA_BASE = np.array([78, 80, 82, 84, 85, 86, 87, 88, 89, 90, 91, 92])
+
+# Crescimento mensal da eficiência (kg/h) depois do primeiro ano
+INCLINACAO_PADRAO = 1.0
+
+# Formatos de saída aceitos por salvar_base
+FORMATOS = ('.csv', '.xlsx', '.parquet')
+
+
+def _eficiencia_base(meses, inclinacao, mudancas_tendencia):
+    # Incrementos mês a mês: os do primeiro ano, depois `inclinacao`; cada
+    # mudança de tendência {mês: nova inclinação} vale a partir daquele mês
+    incrementos = np.full(max(meses - 1, 0), float(inclinacao))
+    n = min(len(EFICIENCIA_BASE) - 1, len(incrementos))
+    incrementos[:n] = np.diff(EFICIENCIA_BASE)[:n]
+    for mes, nova in sorted((mudancas_tendencia or {}).items()):
+        incrementos[max(mes - 1, 0):] = nova
+    return EFICIENCIA_BASE[0] + np.concatenate([[0.0], np.cumsum(incrementos)])
+
+
+def criar_base_dados_melhorada(meses=12, plantas=1, ruido=1.0, sazonalidade=True, mudancas_tendencia=None,
+                               inclinacao=INCLINACAO_PADRAO, inicio='2023-01', semente=42):
     """
     Cria uma base de dados mais sólida e realista para análise de produção têxtil
+
+    Sem argumentos gera a base original (12 meses de 2023, uma planta). Os
+    parâmetros permitem gerar bases sintéticas maiores para testes e
+    benchmarks:
+    - `meses`: quantidade de meses a partir de `inicio` ('AAAA-MM')
+    - `plantas`: com mais de uma, adiciona a coluna `Planta` (formato longo,
+      aceito pela previsão em lote) e varia o porte de cada planta
+    - `ruido`: multiplica o desvio padrão da variação aleatória
+    - `sazonalidade`: repete o perfil sazonal das horas; se falso, usa a média
+    - `mudancas_tendencia`: {mês (0 = primeiro): inclinação da eficiência em kg/h por mês}
+    - `semente`: semente do gerador, para resultados consistentes
     """
-    # Período de 12 meses (2023)
-    meses = [f"2023-{str(i).zfill(2)}" for i in range(1, 13)]
-    
-    # Valores base mais realistas para produção têxtil
-    np.random.seed(42)  # Para resultados consistentes
-    
+    periodos = pd.period_range(inicio, periods=meses, freq='M')
+    rng = np.random.RandomState(semente)  # Para resultados consistentes
+
     # Horas operacionais - variação sazonal (mais horas no meio do ano)
-    horas_base = np.array([680, 720, 730, 710, 690, 750, 760, 740, 720, 710, 690, 680])
-    horas_variacao = np.random.normal(0, 20, 12)
-    horas_operacionais = np.maximum(600, horas_base + horas_variacao)  # Mínimo de 600 horas
-    
-    # Eficiência - tendência de melhoria ao longo do ano
-    eficiencia_base = np.array([78, 80, 82, 84, 85, 86, 87, 88, 89, 90, 91, 92])
-    eficiencia_variacao = np.random.normal(0, 2, 12)
-    eficiencia_kg_h = np.maximum(75, eficiencia_base + eficiencia_variacao)
-    
-    # Produção total = eficiência × horas operacionais
-    producao_total_kg = np.round(eficiencia_kg_h * horas_operacionais, 1)
-    
-    # Resíduo = 10% da produção (valor comum na indústria têxtil)
-    residuo_kg = np.round(producao_total_kg * 0.1, 1)
-    
+    perfil = HORAS_SAZONAIS if sazonalidade else np.full(12, HORAS_SAZONAIS.mean())
+    horas_base = perfil[(periodos.month - 1).to_numpy()]
+
+    # Eficiência - tendência de melhoria, com mudanças de inclinação opcionais
+    eficiencia_base = _eficiencia_base(meses, inclinacao, mudancas_tendencia)
+
+    partes = []
+    for planta in range(plantas):
+        # A primeira planta usa os valores base; as outras têm porte diferente
+        horas_variacao = rng.normal(0, 20 * ruido, meses)
+        eficiencia_variacao = rng.normal(0, 2 * ruido, meses)
+        escala = 1.0 if planta == 0 else rng.uniform(0.6, 1.4)
+
+        horas_operacionais = np.maximum(600, horas_base + horas_variacao)  # Mínimo de 600 horas
+        eficiencia_kg_h = np.maximum(75, eficiencia_base + eficiencia_variacao) * escala
+
+        # Produção total = eficiência × horas operacionais
+        producao_total_kg = np.round(eficiencia_kg_h * horas_operacionais, 1)
+
+        # Resíduo = 10% da produção (valor comum na indústria têxtil)
+        residuo_kg = np.round(producao_total_kg * 0.1, 1)
+
+        dados = {
+            'Mes': periodos.strftime('%Y-%m'),
+            'Producao_Total_kg': producao_total_kg,
+            'Eficiencia_kg_h': eficiencia_kg_h,
+            'Horas_Operacionais': horas_operacionais,
+            'Residuo_kg': residuo_kg
+        }
+        if plantas > 1:
+            dados = {'Planta': f'P{planta + 1:02d}', **dados}
+        partes.append(pd.DataFrame(dados))
+
     # Criar DataFrame
-    dados = {
-        'Mes': meses,
-        'Producao_Total_kg': producao_total_kg,
-        'Eficiencia_kg_h': eficiencia_kg_h,
-        'Horas_Operacionais': horas_operacionais,
-        'Residuo_kg': residuo_kg
-    }
-    
-    df = pd.DataFrame(dados)
-    
+    df = pd.concat(partes, ignore_index=True)
+
     return df
 
-def gerar_excel_base_solida():
+
+def salvar_base(df, nome_arquivo):
+    """Salva a base em CSV, Excel ou Parquet, conforme a extensão do arquivo."""
+    extensao = os.path.splitext(nome_arquivo)[1].lower()
+    if extensao == '.csv':
+        df.to_csv(nome_arquivo, index=False)
+    elif extensao == '.xlsx':
+        df.to_excel(nome_arquivo, index=False)
+    elif extensao == '.parquet':
+        df.to_parquet(nome_arquivo, index=False)
+    else:
+        raise ValueError(f"Formato não suportado: {extensao} (use {', '.join(FORMATOS)})")
+    return nome_arquivo
+
+
+def gerar_excel_base_solida(nome_arquivo="base_residuos_teste.xlsx", **parametros):
     """
-    Gera um arquivo Excel com base de dados sólida para análise
+    Gera um arquivo (Excel por padrão) com base de dados sólida para análise.
+    `parametros` são repassados para criar_base_dados_melhorada.
     """
-    df = criar_base_dados_melhorada()
-    
+    df = criar_base_dados_melhorada(**parametros)
+
     # Adicionar algumas métricas calculadas
     df['Producao_Minima_Esperada'] = np.round(df['Producao_Total_kg'] * 0.95, 1)
     df['Producao_Maxima_Esperada'] = np.round(df['Producao_Total_kg'] * 1.05, 1)
     df['Utilizacao_Capacidade'] = np.round((df['Horas_Operacionais'] / 720) * 100, 1)  # 720h = capacidade máxima teórica
-    
-    # Salvar como Excel
-    nome_arquivo = "base_residuos_teste.xlsx"
-    df.to_excel(nome_arquivo, index=False)
-    
+
+    # Salvar no formato da extensão
+    salvar_base(df, nome_arquivo)
+
     print(f"Arquivo {nome_arquivo} gerado com sucesso!")
     return nome_arquivo
 
-gerar_excel_base_solida()
\ No newline at end of file
+
+def _mudanca(texto):
+    # "MES:INCLINACAO" -> (mês, inclinação)
+    mes, inclinacao = texto.split(':')
+    return int(mes), float(inclinacao)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera uma base sintética de produção têxtil.')
+    parser.add_argument('--saida', default='base_residuos_teste.xlsx', help='Arquivo de saída (.csv, .xlsx ou .parquet)')
+    parser.add_argument('--meses', type=int, default=12)
+    parser.add_argument('--plantas', type=int, default=1)
+    parser.add_argument('--ruido', type=float, default=1.0)
+    parser.add_argument('--sem-sazonalidade', action='store_true')
+    parser.add_argument('--mudanca', type=_mudanca, action='append', default=[], metavar='MES:INCLINACAO',
+                        help='Muda a inclinação da eficiência a partir do mês (pode repetir)')
+    parser.add_argument('--inicio', default='2023-01')
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    gerar_excel_base_solida(
+        args.saida,
+        meses=args.meses,
+        plantas=args.plantas,
+        ruido=args.ruido,
+        sazonalidade=not args.sem_sazonalidade,
+        mudancas_tendencia=dict(args.mudanca),
+        inicio=args.inicio,
+        semente=args.semente,
+    )
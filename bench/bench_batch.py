@@ -0,0 +1,74 @@
+"""
+Benchmark do ajuste em lote: compara o tempo para prever N séries com o
+loop atual (um ExponentialSmoothing do statsmodels por série) e com o
+ajuste vetorizado de ml._batch, e a precisão do lote em relação ao loop:
+razão entre os erros quadráticos do ajuste (mediana e máxima; abaixo de
+1 o lote achou um ajuste melhor) e a maior diferença entre as previsões,
+relativa ao nível médio de cada série.
+
+Uso (na raiz do projeto):
+    python -m bench.bench_batch
+    python -m bench.bench_batch --sizes 10 100 --months 36
+"""
+import time
+import argparse
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from ml._main import fit_series
+from ml._state import forecast_from_state
+from ml._batch import holt_fit_batch, holt_forecast_batch
+
+
+def synthetic_series(n_series, n_months, seed=42):
+    """Séries com nível, tendência e ruído diferentes, no estilo de base/_main.py."""
+    rng = np.random.default_rng(seed)
+    level = rng.uniform(70, 800, size=(n_series, 1))
+    slope = rng.normal(0, 2, size=(n_series, 1))
+    noise = rng.normal(0, 0.03, size=(n_series, n_months)) * level
+    return level + slope * np.arange(n_months)[None, :] + noise
+
+
+def bench_loop(Y, index, periods):
+    start = time.perf_counter()
+    states = []
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for row in Y:
+            states.append(fit_series(pd.Series(row, index=index)))
+    forecast = np.array([forecast_from_state(state, periods) for state in states])
+    return time.perf_counter() - start, np.array([state['sse'] for state in states]), forecast
+
+
+def bench_batch(Y, periods):
+    start = time.perf_counter()
+    fit = holt_fit_batch(Y)
+    forecast = holt_forecast_batch(fit, periods)
+    return time.perf_counter() - start, fit['sse'], forecast
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--periods', type=int, default=12)
+    args = parser.parse_args()
+
+    index = pd.date_range('2022-01-01', periods=args.months, freq='MS')
+    print(f"{'séries':>8} {'loop (s)':>10} {'lote (s)':>10} {'séries/s loop':>14} {'séries/s lote':>14} {'ganho':>8}"
+          f" {'SSE med':>8} {'SSE máx':>8} {'prev. máx':>10}")
+    for n in args.sizes:
+        Y = synthetic_series(n, args.months)
+        t_loop, sse_loop, forecast_loop = bench_loop(Y, index, args.periods)
+        t_batch, sse_batch, forecast_batch = bench_batch(Y, args.periods)
+        ratio = sse_batch / sse_loop
+        # Diferença relativa ao nível médio da série (a previsão pode passar perto de zero)
+        diff = np.max(np.abs(forecast_batch - forecast_loop) / np.abs(Y).mean(axis=1, keepdims=True))
+        print(f"{n:>8} {t_loop:>10.3f} {t_batch:>10.3f} {n / t_loop:>14.1f} {n / t_batch:>14.1f} {t_loop / t_batch:>7.1f}x"
+              f" {np.median(ratio):>8.3f} {ratio.max():>8.3f} {diff:>9.1%}")
+
+
+if __name__ == '__main__':
+    main()
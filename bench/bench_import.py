@@ -0,0 +1,69 @@
+"""
+Benchmark da inicialização: mede, em processos novos, o tempo de
+`import app` e da primeira requisição a `/` e `/download/template` (as
+rotas que não usam statsmodels nem Matplotlib), com as dependências
+pesadas importadas sob demanda (padrão) e com o pré-carregamento
+(WASTE_PRELOAD=1, equivalente aos imports no topo dos módulos).
+
+Uso (na raiz do projeto):
+    python -m bench.bench_import
+    python -m bench.bench_import --repeat 10
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+MODES = {'sob_demanda': '0', 'preload': '1'}
+
+
+def run_one():
+    # Executado no processo filho, dentro de uma pasta temporária (o app cria uploads/ nela)
+    os.environ.setdefault('WASTE_LOG_LEVEL', 'WARNING')
+    start = time.perf_counter()
+    import app
+    result = {'import': time.perf_counter() - start}
+
+    client = app.app.test_client()
+    for route in ('/', '/download/template'):
+        start = time.perf_counter()
+        client.get(route)
+        result[route] = time.perf_counter() - start
+    heavy = ('statsmodels', 'matplotlib', 'openpyxl')
+    result['heavy_loaded'] = [name for name in heavy if name in sys.modules]
+    print(json.dumps(result))
+
+
+def measure(preload):
+    root = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, WASTE_PRELOAD=preload, PYTHONPATH=root)
+        out = subprocess.run([sys.executable, '-m', 'bench.bench_import', '--run'], cwd=tmp, env=env,
+                             check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_one()
+        return
+
+    print(f"{'modo':>12} {'import app (ms)':>16} {'1ª GET / (ms)':>14} {'1ª GET /download/template (ms)':>31}  carregados")
+    for mode, preload in MODES.items():
+        runs = [measure(preload) for _ in range(args.repeat)]
+        median = {key: statistics.median(r[key] for r in runs) * 1000 for key in ('import', '/', '/download/template')}
+        print(f"{mode:>12} {median['import']:>16.0f} {median['/']:>14.1f} {median['/download/template']:>31.1f}"
+              f"  {', '.join(runs[-1]['heavy_loaded']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark da leitura: gera logs horários sintéticos (com colunas extras que
+o pipeline não usa) e compara a leitura em blocos com agregação mensal
+(ml._ingest.read_monthly) com a leitura completa em um único DataFrame.
+Cada medição roda em um processo separado para isolar a memória de pico
+(RSS máximo), e o resultado é reportado em linhas/s e MB.
+
+Uso (na raiz do projeto):
+    python -m bench.bench_ingest
+    python -m bench.bench_ingest --rows 100000 1000000 --max-memory-mb 16
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+
+def generate_log(path, n_rows, seed=42):
+    """Log horário de máquina: uma linha por hora, com colunas que não entram na previsão."""
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range('2015-01-01', periods=n_rows, freq='h')
+    hours = rng.uniform(0.5, 1.0, n_rows)
+    eff = rng.normal(90, 5, n_rows)
+    df = pd.DataFrame({
+        'Mes': ts.strftime('%Y-%m-%d %H:%M:%S'),
+        'Maquina': rng.choice(['TEAR-01', 'TEAR-02', 'TEAR-03'], n_rows),
+        'Operador': rng.choice(['Ana', 'Bruno', 'Carla', 'Diego'], n_rows),
+        'Producao_Total_kg': np.round(eff * hours, 3),
+        'Eficiencia_kg_h': np.round(eff, 3),
+        'Horas_Operacionais': np.round(hours, 3),
+        'Temperatura_C': np.round(rng.normal(25, 3, n_rows), 1),
+        'Observacao': 'sem ocorrencias',
+    })
+    if path.endswith('.xlsx'):
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def eager_monthly(path):
+    """Leitura anterior: arquivo inteiro em memória, agregação depois."""
+    df = pd.read_excel(path, engine='openpyxl') if path.endswith('.xlsx') else pd.read_csv(path)
+    df['Mes_dt'] = pd.to_datetime(df['Mes'], errors='coerce').dt.to_period('M')
+    return df.dropna(subset=['Mes_dt']).groupby('Mes_dt')[['Producao_Total_kg', 'Horas_Operacionais']].sum()
+
+
+def peak_rss_mb():
+    """
+    Pico de RSS do processo atual. No Linux usa VmHWM, que é zerado no exec;
+    o ru_maxrss herdaria o pico do processo pai que gerou os dados.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_one(mode, path, max_memory_mb):
+    # Executado no processo filho: mede o tempo e o RSS máximo do próprio processo
+    from ml._ingest import read_monthly
+
+    start = time.perf_counter()
+    if mode == 'stream':
+        months = len(read_monthly(path, max_memory_mb=max_memory_mb))
+    else:
+        months = len(eager_monthly(path))
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'seconds': elapsed, 'peak_rss_mb': peak_rss_mb(), 'months': months}))
+
+
+def measure(mode, path, max_memory_mb):
+    out = subprocess.run(
+        [sys.executable, '-m', 'bench.bench_ingest', '--run', mode, path, '--max-memory-mb', str(max_memory_mb)],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--xlsx-rows', type=int, nargs='*', default=[50_000])
+    parser.add_argument('--max-memory-mb', type=int, default=16)
+    parser.add_argument('--run', nargs=2, metavar=('MODO', 'ARQUIVO'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_one(args.run[0], args.run[1], args.max_memory_mb)
+        return
+
+    cases = [('.csv', n) for n in args.rows] + [('.xlsx', n) for n in args.xlsx_rows]
+    print(f"{'arquivo':>8} {'linhas':>10} {'modo':>7} {'linhas/s':>12} {'pico RSS (MB)':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for ext, n_rows in cases:
+            path = os.path.join(tmp, f"log_{n_rows}{ext}")
+            generate_log(path, n_rows)
+            for mode in ('eager', 'stream'):
+                result = measure(mode, path, args.max_memory_mb)
+                rate = n_rows / result['seconds']
+                print(f"{ext:>8} {n_rows:>10} {mode:>7} {rate:>12,.0f} {result['peak_rss_mb']:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
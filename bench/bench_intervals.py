@@ -0,0 +1,76 @@
+"""
+Benchmark dos intervalos de previsão: mede o tempo da simulação
+(ml._intervals.BootstrapIntervals) por série, para cada número de
+caminhos, no modo de um arquivo (modelos Holt e sazonal, e a tendência
+multiplicativa, que é simulada mês a mês) e no modo em lote, e compara
+com o orçamento de latência por série.
+
+Uso (na raiz do projeto):
+    python -m bench.bench_intervals
+    python -m bench.bench_intervals --paths 1000 5000 20000 --budget-ms 50
+"""
+import time
+import argparse
+
+import numpy as np
+
+from ml._intervals import BootstrapIntervals
+
+
+def series_state(model, n_months, rng):
+    """Estado ajustado sintético no formato de ml._select.fit_candidate."""
+    state = {'model': model, 'trend_type': 'add', 'alpha': 0.4, 'beta': 0.1, 'phi': 1.0,
+             'level': 90.0, 'trend': 0.5, 'residuals': rng.normal(0, 3, n_months).tolist()}
+    if model == 'holt_multiplicativo':
+        state.update(trend_type='mul', trend=1.005)
+    elif model == 'sazonal_amortecido':
+        state.update(phi=0.95, gamma=0.2, season=rng.normal(0, 5, 12).tolist())
+    return state
+
+
+def bench_single(intervals, model, n_months, periods, repeat, rng):
+    eff = series_state(model, n_months, rng)
+    hours = dict(series_state(model, n_months, rng), level=700.0)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        intervals.production(eff, hours, periods)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_batch(intervals, n_series, n_months, periods, rng):
+    fits = [{'alpha': np.full(n_series, 0.4), 'beta': np.full(n_series, 0.1),
+             'resid': rng.normal(0, 3, (n_series, n_months))} for _ in range(2)]
+    forecasts = [np.full((n_series, periods), 90.0), np.full((n_series, periods), 700.0)]
+    start = time.perf_counter()
+    intervals.production_batch(fits[0], fits[1], *forecasts)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paths', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--months', type=int, default=36)
+    parser.add_argument('--periods', type=int, default=12)
+    parser.add_argument('--batch-series', type=int, default=200)
+    parser.add_argument('--budget-ms', type=float, default=50.0)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'modo':>20} {'caminhos':>9} {'ms/série':>10} {'orçamento':>10}")
+    for paths in args.paths:
+        intervals = BootstrapIntervals(paths=paths)
+        rows = [(model, bench_single(intervals, model, args.months, args.periods, args.repeat, rng))
+                for model in ('holt', 'sazonal_amortecido', 'holt_multiplicativo')]
+        elapsed = bench_batch(intervals, args.batch_series, args.months, args.periods, rng)
+        rows.append((f'lote ({args.batch_series})', elapsed / args.batch_series))
+        for mode, seconds in rows:
+            ms = seconds * 1000
+            status = 'ok' if ms <= args.budget_ms else 'ACIMA'
+            print(f"{mode:>20} {paths:>9} {ms:>10.2f} {status:>10}")
+
+
+if __name__ == '__main__':
+    main()
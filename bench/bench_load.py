@@ -0,0 +1,177 @@
+"""
+Teste de carga contra um servidor local: vários usuários simultâneos
+(threads, cada um com a sua sessão) enviam uma base sintética para
+`/upload`, esperam o job terminar e abrem `/dashboard`. Mede a vazão
+(requisições/s) e a latência p50/p95 de cada rota, além do tempo do
+envio até o job terminar.
+
+Com `--serve`, sobe o próprio servidor (gunicorn com gunicorn.conf.py)
+em uma pasta temporária; sem ele, usa o servidor em `--url`.
+
+Uso (na raiz do projeto):
+    python -m bench.bench_load --serve
+    python -m bench.bench_load --url http://127.0.0.1:8000 --users 16 --duration 60
+    WASTE_WEB_WORKERS=4 WASTE_WEB_THREADS=8 python -m bench.bench_load --serve --output carga.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from http.cookiejar import CookieJar
+
+from base._main import criar_base_dados_melhorada
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def multipart(fields, files):
+    # Corpo multipart/form-data sem dependências externas
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data) in files.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                   f'Content-Type: text/csv\r\n\r\n'.encode())
+        body.write(data + b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+class User:
+    """Um usuário simulado: sessão própria (cookies) e as medições de cada rota."""
+
+    def __init__(self, url, data, timeout):
+        self.url = url.rstrip('/')
+        self.data = data
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+        self.samples = {'upload': [], 'dashboard': [], 'job': []}
+        self.errors = 0
+
+    def request(self, path, body=None, content_type=None):
+        headers = {'Accept': 'application/json'}
+        if content_type:
+            headers['Content-Type'] = content_type
+        req = urllib.request.Request(self.url + path, data=body, headers=headers)
+        with self.opener.open(req, timeout=self.timeout) as response:
+            return response.status, response.read()
+
+    def run_once(self):
+        body, content_type = multipart({}, {'arquivo': ('carga.csv', self.data)})
+        start = time.perf_counter()
+        _, payload = self.request('/upload', body, content_type)
+        self.samples['upload'].append(time.perf_counter() - start)
+        status_url = json.loads(payload)['status_url']
+
+        while True:
+            job = json.loads(self.request(status_url)[1])
+            if job['status'] in ('done', 'error'):
+                break
+            time.sleep(0.05)
+        if job['status'] == 'error':
+            raise RuntimeError(job['error'])
+        self.samples['job'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        self.request('/dashboard')
+        self.samples['dashboard'].append(time.perf_counter() - start)
+
+    def loop(self, deadline):
+        while time.perf_counter() < deadline:
+            try:
+                self.run_once()
+            except (urllib.error.URLError, OSError, RuntimeError, ValueError, KeyError):
+                self.errors += 1
+
+
+def wait_ready(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError(f'Servidor não respondeu em {url}')
+
+
+def start_server(tmp, port):
+    # O app cria a pasta de uploads, a fila e os caches no diretório atual
+    root = os.getcwd()
+    env = dict(os.environ, PYTHONPATH=root, WASTE_BIND=f'127.0.0.1:{port}', WASTE_LOG_LEVEL='WARNING',
+               WASTE_ACCESS_LOG='')
+    return subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(root, 'gunicorn.conf.py'),
+                             'wsgi:app'], cwd=tmp, env=env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--serve', action='store_true', help='Sobe o gunicorn em uma pasta temporária')
+    parser.add_argument('--users', type=int, default=8, help='Usuários simultâneos')
+    parser.add_argument('--duration', type=float, default=30, help='Duração do teste (s)')
+    parser.add_argument('--months', type=int, default=36, help='Meses da base enviada')
+    parser.add_argument('--timeout', type=float, default=60, help='Timeout de cada requisição (s)')
+    parser.add_argument('--output', help='Arquivo JSON de saída (padrão: só imprime)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        if args.serve:
+            port = int(args.url.rsplit(':', 1)[1].split('/')[0])
+            server = start_server(tmp, port)
+        try:
+            wait_ready(args.url)
+            users = []
+            for i in range(args.users):
+                # Bases diferentes por usuário, para não medir só o cache de resultados
+                buffer = io.StringIO()
+                criar_base_dados_melhorada(meses=args.months, semente=i).to_csv(buffer, index=False)
+                users.append(User(args.url, buffer.getvalue().encode(), args.timeout))
+
+            start = time.perf_counter()
+            deadline = start + args.duration
+            threads = [threading.Thread(target=user.loop, args=(deadline,)) for user in users]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    results = []
+    print(f"{'rota':>10} {'requisições':>12} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for route in ('upload', 'job', 'dashboard'):
+        samples = [value for user in users for value in user.samples[route]]
+        if not samples:
+            continue
+        result = {'route': route, 'count': len(samples), 'throughput': len(samples) / elapsed,
+                  'p50': percentile(samples, 0.50), 'p95': percentile(samples, 0.95)}
+        results.append(result)
+        print(f"{route:>10} {result['count']:>12} {result['throughput']:>8.2f} "
+              f"{result['p50'] * 1000:>9.1f} {result['p95'] * 1000:>9.1f}")
+    errors = sum(user.errors for user in users)
+    print(f'erros: {errors}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'seconds': elapsed, 'errors': errors, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Suíte de benchmark do pipeline: gera bases sintéticas com
+base/_main.py (criar_base_dados_melhorada) em vários tamanhos e mede
+- `process_file` de ponta a ponta e por etapa (as mesmas etapas do
+  histograma waste_pipeline_stage_seconds);
+- as rotas `/upload` (resposta e tempo até o job terminar) e `/dashboard`
+  pelo cliente de teste do Flask, com o app rodando em uma pasta temporária.
+
+O resultado sai em JSON (`--output`) para comparar commits; `--compare`
+mostra a razão entre cada medição e a de um JSON anterior.
+
+Uso (na raiz do projeto):
+    python -m bench.bench_pipeline --output bench.json
+    python -m bench.bench_pipeline --months 12 120 --compare bench.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from base._main import criar_base_dados_melhorada, salvar_base
+
+# Razão acima da qual uma medição é marcada como regressão no --compare
+REGRESSION_RATIO = 1.2
+
+
+class StageRecorder:
+    """Substitui ml._metrics.Metrics no StageClock, guardando as durações de cada etapa."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def observe(self, name, value, stage=None, **labels):
+        self.stages.setdefault(stage, []).append(value)
+
+
+def _summary(samples):
+    return {'min': min(samples), 'median': statistics.median(samples), 'runs': len(samples)}
+
+
+def bench_process_file(tmp, months, repeat, selector):
+    from ml._main import process_file
+
+    path = os.path.join(tmp, f'base_{months}.csv')
+    salvar_base(criar_base_dados_melhorada(meses=months), path)
+    out_dir = os.path.join(tmp, 'saida')
+    os.makedirs(out_dir, exist_ok=True)
+
+    totals, recorder = [], StageRecorder()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process_file(path, out_dir, selector=selector, metrics=recorder)
+        totals.append(time.perf_counter() - start)
+    stages = {stage: _summary(values) for stage, values in recorder.stages.items()}
+    return {'name': 'process_file', 'months': months, 'seconds': _summary(totals), 'stages': stages}
+
+
+def bench_routes(tmp, months, repeat):
+    # O app cria a pasta de uploads, a fila e o cache no diretório atual
+    os.chdir(tmp)
+    os.environ.setdefault('WASTE_LOG_LEVEL', 'WARNING')
+    import app as webapp
+
+    client = webapp.app.test_client()
+    upload, job, dashboard = [], [], []
+    for run in range(repeat):
+        # Cada envio tem dados diferentes, para não reaproveitar o cache de resultados
+        path = os.path.join(tmp, f'rota_{months}_{run}.csv')
+        salvar_base(criar_base_dados_melhorada(meses=months, semente=run), path)
+
+        start = time.perf_counter()
+        with open(path, 'rb') as f:
+            response = client.post('/upload', data={'arquivo': (f, os.path.basename(path))},
+                                   headers={'Accept': 'application/json'})
+        upload.append(time.perf_counter() - start)
+        job_id = response.get_json()['job_id']
+
+        while True:
+            status = client.get(f'/jobs/{job_id}').get_json()
+            if status['status'] in ('done', 'error'):
+                break
+            time.sleep(0.01)
+        job.append(time.perf_counter() - start)
+        if status['status'] == 'error':
+            raise RuntimeError(f"Job falhou: {status['error']}")
+
+        start = time.perf_counter()
+        client.get('/dashboard')
+        dashboard.append(time.perf_counter() - start)
+
+    return [
+        {'name': 'rota_upload', 'months': months, 'seconds': _summary(upload)},
+        {'name': 'job_upload', 'months': months, 'seconds': _summary(job)},
+        {'name': 'rota_dashboard', 'months': months, 'seconds': _summary(dashboard)},
+    ]
+
+
+def _commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r['name'], r['months']): r for r in json.load(f)['results']}
+    print(f"\n{'medição':>16} {'meses':>6} {'antes (ms)':>11} {'agora (ms)':>11} {'razão':>7}")
+    for result in results:
+        before = baseline.get((result['name'], result['months']))
+        if before is None:
+            continue
+        old, new = before['seconds']['median'], result['seconds']['median']
+        ratio = new / old if old else float('inf')
+        flag = ' regressão' if ratio > REGRESSION_RATIO else ''
+        print(f"{result['name']:>16} {result['months']:>6} {old * 1000:>11.1f} {new * 1000:>11.1f} {ratio:>7.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--months', type=int, nargs='+', default=[12, 60, 240])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--select', action='store_true', help='Usa a seleção automática de modelo')
+    parser.add_argument('--no-routes', action='store_true', help='Não mede as rotas do Flask')
+    parser.add_argument('--output', help='Arquivo JSON de saída (padrão: só imprime)')
+    parser.add_argument('--compare', help='JSON de uma execução anterior para comparar')
+    args = parser.parse_args()
+
+    selector = None
+    if args.select:
+        from ml._select import ModelSelector
+        selector = ModelSelector()
+
+    commit, cwd = _commit(), os.getcwd()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for months in args.months:
+            results.append(bench_process_file(tmp, months, args.repeat, selector))
+        if not args.no_routes:
+            for months in args.months:
+                results.extend(bench_routes(tmp, months, args.repeat))
+        os.chdir(cwd)
+
+    print(f"{'medição':>16} {'meses':>6} {'mediana (ms)':>13}  etapas (ms)")
+    for result in results:
+        stages = ' '.join(f"{stage}={s['median'] * 1000:.1f}" for stage, s in result.get('stages', {}).items())
+        print(f"{result['name']:>16} {result['months']:>6} {result['seconds']['median'] * 1000:>13.1f}  {stages}")
+
+    report = {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'args': vars(args),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""
+Configuração do gunicorn (`gunicorn -c gunicorn.conf.py wsgi:app`), lida
+das mesmas variáveis de ambiente WASTE_* do app. Workers `gthread`: cada
+processo atende várias requisições em threads; o processamento pesado
+roda no pool da fila de jobs de cada worker, fora das threads.
+"""
+import os
+
+bind = os.environ.get('WASTE_BIND', '0.0.0.0:8000')
+worker_class = 'gthread'
+workers = int(os.environ.get('WASTE_WEB_WORKERS', 2))
+threads = int(os.environ.get('WASTE_WEB_THREADS', 4))
+
+# `timeout` não limita requisições: com gthread é só o batimento do worker
+# (o processo principal reinicia um worker cujo laço parou de responder por
+# mais que isso; uma thread lenta não conta). O limite por requisição fica
+# no proxy reverso (ver README). Também: tempo para encerrar com calma e
+# conexões keep-alive
+timeout = int(os.environ.get('WASTE_WEB_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('WASTE_WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('WASTE_WEB_KEEPALIVE', 5))
+
+# Com WASTE_PRELOAD=1 o app (e statsmodels, Matplotlib, openpyxl) é carregado
+# uma vez no processo principal e compartilhado pelos workers após o fork
+preload_app = os.environ.get('WASTE_PRELOAD', '0') == '1'
+
+# O pool da fila é criado dentro de um worker com várias threads: processos
+# criados por fork nesse momento poderiam herdar locks presos por outras threads.
+# Com WASTE_PRELOAD=1 o servidor de fork também importa as dependências
+# pesadas, e cada job segue limitado por WASTE_JOB_TIMEOUT
+os.environ.setdefault('WASTE_JOB_START_METHOD', 'forkserver')
+
+accesslog = os.environ.get('WASTE_ACCESS_LOG', '-') or None
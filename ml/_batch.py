@@ -0,0 +1,269 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+
+from ml._main import MODEL_PARAMS, MAX_PERIODS, forecast_frame, combine_frames
+from ml._ingest import read_monthly
+from ml._frames import save_frames
+from ml._metrics import StageClock
+from ml._intervals import BootstrapIntervals
+
+logger = logging.getLogger(__name__)
+
+# Coluna padrão que identifica a planta/linha no arquivo em formato longo
+DEFAULT_KEY_COL = 'Planta'
+
+# Métricas previstas por entidade; a produção é derivada de eficiência × horas
+BATCH_METRICS = ['Eficiencia_kg_h', 'Horas_Operacionais']
+
+# Grade inicial de parâmetros de suavização, avaliada para todas as séries de uma vez
+ALPHA_GRID = np.round(np.arange(0.0, 1.0001, 0.05), 2)
+BETA_GRID = np.round(np.arange(0.0, 1.0001, 0.05), 2)
+
+# Refinamento em torno do melhor ponto de cada série: a cada rodada, uma
+# grade REFINE_POINTS × REFINE_POINTS com metade do passo anterior
+REFINE_ROUNDS = 5
+REFINE_POINTS = 5
+
+MIN_MONTHS = 6
+
+
+def _holt_pass(Y, alpha, beta, level, trend, first, resid=None):
+    # Uma passada das equações do Holt por todos os meses; `alpha`/`beta`
+    # são (n_series, n_grid) ou broadcast para isso. Com `resid`
+    # ((n_series, n_meses)), grava nele o erro um passo à frente de cada
+    # mês observado.
+    sse = np.zeros(np.broadcast_shapes(level.shape, alpha.shape))
+    for i, y in enumerate(Y.T):
+        y = y[:, None]
+        started = (first <= i)[:, None]
+        update = started & ~np.isnan(y)
+
+        pred = level + trend
+        err = np.where(update, y - pred, 0.0)
+        sse += err * err
+        if resid is not None:
+            resid[:, i] = np.where(update[:, 0], err[:, 0], np.nan)
+
+        new_level = np.where(update, alpha * y + (1 - alpha) * pred, np.where(started, pred, level))
+        trend = np.where(update, beta * (new_level - level) + (1 - beta) * trend, trend)
+        level = new_level
+    return level, trend, sse
+
+
+def _profile_pass(Y, alpha, beta, first):
+    """
+    SSE de cada par (alpha, beta) já com o melhor estado inicial (nível e
+    tendência um mês antes da primeira observação), como o
+    `initialization_method='estimated'` do statsmodels.
+
+    Com alpha e beta fixos, as previsões um passo à frente são lineares
+    no estado inicial: a passada leva junto as derivadas do nível e da
+    tendência em relação a ele (mesmas equações, sem os dados) e acumula
+    as somas dos mínimos quadrados. Retorna (sse, nível inicial, tendência
+    inicial), todos com o formato de `alpha`.
+    """
+    shape = np.broadcast_shapes((Y.shape[0], 1), alpha.shape)
+    zeros, ones = np.zeros(shape), np.ones(shape)
+    # Canal 0: estado inicial zero com os dados; canais 1 e 2: derivadas em relação a nível e tendência iniciais
+    level = [zeros, ones, zeros]
+    trend = [zeros, zeros, ones]
+    sums = {key: np.zeros(shape) for key in ('ee', 'e1', 'e2', '11', '12', '22')}
+    for i, y in enumerate(Y.T):
+        y = y[:, None]
+        started = (first <= i)[:, None]
+        update = started & ~np.isnan(y)
+        observed = np.where(update, y, 0.0)
+
+        pred = [l + t for l, t in zip(level, trend)]
+        # Erro = e - p1·nível0 - p2·tendência0, com e o erro do canal 0
+        e = np.where(update, observed - pred[0], 0.0)
+        p1, p2 = (np.where(update, p, 0.0) for p in pred[1:])
+        sums['ee'] += e * e
+        sums['e1'] += e * p1
+        sums['e2'] += e * p2
+        sums['11'] += p1 * p1
+        sums['12'] += p1 * p2
+        sums['22'] += p2 * p2
+
+        for k in range(3):
+            target = observed if k == 0 else 0.0
+            new_level = np.where(update, alpha * target + (1 - alpha) * pred[k], np.where(started, pred[k], level[k]))
+            trend[k] = np.where(update, beta * (new_level - level[k]) + (1 - beta) * trend[k], trend[k])
+            level[k] = new_level
+
+    det = sums['11'] * sums['22'] - sums['12'] ** 2
+    # Sistema quase singular (ex.: alpha = 1 apaga o nível inicial): tendência inicial 0
+    singular = det <= 1e-12 * np.maximum(sums['11'] * sums['22'], 1e-300)
+    safe = np.where(singular, 1.0, det)
+    level0 = np.where(singular, sums['e1'] / np.maximum(sums['11'], 1e-300),
+                      (sums['e1'] * sums['22'] - sums['e2'] * sums['12']) / safe)
+    trend0 = np.where(singular, 0.0, (sums['e2'] * sums['11'] - sums['e1'] * sums['12']) / safe)
+    sse = sums['ee'] - level0 * sums['e1'] - trend0 * sums['e2']
+    return np.maximum(sse, 0.0), level0, trend0
+
+
+def holt_fit_batch(Y, alphas=ALPHA_GRID, betas=BETA_GRID, rounds=REFINE_ROUNDS, points=REFINE_POINTS):
+    """
+    Ajusta o modelo Holt (tendência aditiva) para várias séries ao mesmo
+    tempo, em operações NumPy, minimizando o erro quadrático um passo à
+    frente como o ajuste do statsmodels de uma série só (ml._main.fit_series).
+
+    `Y` tem formato (n_series, n_meses), alinhado pelo mês; valores NaN
+    marcam meses sem observação (séries que começam depois ou lacunas).
+    Em meses sem dado o estado apenas se propaga (nível + tendência).
+
+    Toda a grade alpha × beta é avaliada com o melhor estado inicial de
+    cada par (ver _profile_pass); depois, `rounds` rodadas refinam a
+    grade em torno do melhor ponto de cada série, com metade do passo a
+    cada rodada.
+
+    Retorna um dicionário com arrays (n_series,): alpha, beta, level,
+    trend (estado ao final do último mês) e sse (erro quadrático um passo
+    à frente do melhor ajuste), mais resid (n_series, n_meses) com esses
+    erros mês a mês (NaN nos meses sem observação).
+    """
+    Y = np.asarray(Y, dtype='float64')
+    n = Y.shape[0]
+    rows = np.arange(n)
+    first = (~np.isnan(Y)).argmax(axis=1)
+
+    alpha, beta = np.meshgrid(alphas, betas, indexing='ij')
+    alpha = alpha.ravel()[None, :]
+    beta = beta.ravel()[None, :]
+    sse, level0, trend0 = _profile_pass(Y, alpha, beta, first)
+    best = np.argmin(sse, axis=1)
+    best_alpha, best_beta = alpha[0, best], beta[0, best]
+    best_sse, best_level0, best_trend0 = sse[rows, best], level0[rows, best], trend0[rows, best]
+
+    # Refinamento: grade local por série, limitada a [0, 1]
+    step = np.array([np.diff(alphas).min() if len(alphas) > 1 else 0.05,
+                     np.diff(betas).min() if len(betas) > 1 else 0.05])
+    offsets = np.linspace(-1, 1, points)
+    d_alpha, d_beta = (v.ravel()[None, :] for v in np.meshgrid(offsets, offsets, indexing='ij'))
+    for _ in range(rounds):
+        step = step / 2
+        alpha = np.clip(best_alpha[:, None] + d_alpha * step[0], 0.0, 1.0)
+        beta = np.clip(best_beta[:, None] + d_beta * step[1], 0.0, 1.0)
+        sse, level0, trend0 = _profile_pass(Y, alpha, beta, first)
+        local = np.argmin(sse, axis=1)
+        better = sse[rows, local] < best_sse
+        best_alpha = np.where(better, alpha[rows, local], best_alpha)
+        best_beta = np.where(better, beta[rows, local], best_beta)
+        best_level0 = np.where(better, level0[rows, local], best_level0)
+        best_trend0 = np.where(better, trend0[rows, local], best_trend0)
+        best_sse = np.where(better, sse[rows, local], best_sse)
+
+    # Passada final só com o melhor ajuste de cada série: estado ao fim do
+    # último mês e erros mês a mês, sem manter (n_series × grade × meses)
+    resid = np.empty_like(Y)
+    level, trend, sse = _holt_pass(Y, best_alpha[:, None], best_beta[:, None], best_level0[:, None],
+                                   best_trend0[:, None], first, resid)
+    return {
+        'alpha': best_alpha,
+        'beta': best_beta,
+        'level': level[:, 0],
+        'trend': trend[:, 0],
+        'sse': sse[:, 0],
+        'resid': resid,
+    }
+
+
+def holt_forecast_batch(fit, periods=MODEL_PARAMS['periods']):
+    """Previsão (n_series, periods) a partir do estado final de holt_fit_batch."""
+    steps = np.arange(1, periods + 1)
+    return fit['level'][:, None] + fit['trend'][:, None] * steps[None, :]
+
+
+def forecast_batch(df, key_col=DEFAULT_KEY_COL, periods=MODEL_PARAMS['periods'], intervals=None):
+    """
+    Prevê todas as séries (entidade, métrica) de um DataFrame em formato
+    longo (colunas `key_col`, `Mes_dt` e BATCH_METRICS) com um único ajuste
+    vetorizado. Retorna um DataFrame de previsões com uma linha por
+    entidade e mês, já com produção, resíduo e faixa esperada (calculada
+    por `intervals`, um ml._intervals.BootstrapIntervals), montado de uma
+    vez por ml._main.forecast_frame.
+    """
+    if intervals is None:
+        intervals = BootstrapIntervals()
+    months = pd.date_range(df['Mes_dt'].min(), df['Mes_dt'].max(), freq='MS')
+    entities = pd.Index(df[key_col].drop_duplicates().sort_values())
+
+    # Uma matriz (entidades × meses) por métrica, empilhadas em um único lote
+    blocks = [
+        df.pivot_table(index=key_col, columns='Mes_dt', values=metric, aggfunc='mean')
+          .reindex(index=entities, columns=months)
+          .to_numpy(dtype='float64')
+        for metric in BATCH_METRICS
+    ]
+    Y = np.vstack(blocks)
+
+    counts = (~np.isnan(blocks[0]) & ~np.isnan(blocks[1])).sum(axis=1)
+    short = entities[counts < MIN_MONTHS]
+    if len(short):
+        raise ValueError(
+            f'Poucos dados para prever ({key_col}: {", ".join(map(str, short))}). '
+            f'Forneça pelo menos {MIN_MONTHS} meses por entidade.'
+        )
+
+    fit = holt_fit_batch(Y)
+    forecast = holt_forecast_batch(fit, periods)
+    n_entities = len(entities)
+
+    # Faixa esperada: simulação conjunta de eficiência e horas de cada entidade
+    eff_fit, hours_fit = ({name: values[part] for name, values in fit.items()}
+                          for part in (slice(None, n_entities), slice(n_entities, None)))
+    lower, upper = intervals.production_batch(eff_fit, hours_fit, forecast[:n_entities], forecast[n_entities:])
+
+    return forecast_frame(months[-1], forecast[:n_entities], forecast[n_entities:], lower, upper,
+                          keys=entities.to_numpy(), key_col=key_col)
+
+
+def process_batch(input_path, output_dir, progress=None, cache=None, states=None, selector=None,
+                  metrics=None, intervals=None, key_col=DEFAULT_KEY_COL, periods=MODEL_PARAMS['periods']):
+    """
+    Versão em lote de `process_file`: lê um arquivo em formato longo com
+    várias plantas/linhas (coluna `key_col`), prevê todas as séries juntas
+    e salva um único resultado combinado (Parquet, com o Excel gerado sob
+    demanda). Não gera gráficos.
+
+    `cache`, `states` e `selector` são aceitos para manter a mesma
+    assinatura usada pela fila de jobs, mas não são usados no modo em
+    lote, que ajusta sempre o Holt vetorizado. `metrics` recebe a duração
+    de cada etapa e `intervals` calcula a faixa esperada, como em
+    `process_file`; `periods` é o horizonte em meses (até MAX_PERIODS).
+    """
+    if not 1 <= periods <= MAX_PERIODS:
+        raise ValueError(f'O horizonte de previsão deve ter entre 1 e {MAX_PERIODS} meses.')
+    clock = StageClock(metrics, 'waste_pipeline_stage_seconds', kind='batch')
+
+    def report(stage, percent):
+        clock.mark(stage)
+        if progress is not None:
+            progress(stage, percent)
+
+    logger.info('Processando lote', extra={'input': input_path, 'key_col': key_col})
+
+    # 1. Ler arquivo em blocos, agregando por entidade e mês
+    # 2. Validar colunas (feito na leitura)
+    # 3. 'Mes_dt' também vem da leitura, ordenado por entidade e mês
+    report('leitura', 0)
+    df = read_monthly(input_path, key_col=key_col)
+
+    # 4. Ajuste vetorizado de todas as séries
+    report('modelagem', 20)
+    forecast_df = forecast_batch(df, key_col=key_col, periods=periods, intervals=intervals)
+
+    # 5. Combinar dados originais + previsões, agrupados por entidade
+    combined_df = combine_frames(df, forecast_df, key_col=key_col).sort_values([key_col, 'Mes_dt'], kind='stable')
+
+    # 6. Salvar os DataFrames em Parquet; o Excel só é gerado no download
+    report('dados', 60)
+    base = os.path.splitext(os.path.basename(input_path))[0]
+    out_path = os.path.join(output_dir, f"{base}_lote_com_previsao.xlsx")
+    save_frames(out_path, combined_df, forecast_df)
+
+    report('concluido', 100)
+    logger.info('Lote com previsões salvo', extra={'output': out_path})
+    return out_path, []
@@ -0,0 +1,83 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class BytesCache:
+    """
+    Cache LRU de conteúdos gerados sob demanda (gráficos, modelos de
+    upload): uma camada em memória limitada em bytes e uma camada em disco
+    (também limitada) que sobrevive a reinícios e é compartilhada entre
+    processos. É seguro para uso entre threads.
+    """
+
+    def __init__(self, disk_dir, max_memory_bytes=64 * 1024 * 1024, max_disk_bytes=256 * 1024 * 1024):
+        self.disk_dir = disk_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key)
+
+    def _remember(self, key, data):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def get_or_render(self, key, render):
+        """
+        Retorna os bytes da entrada `key`, chamando `render()` apenas se ela
+        não estiver em memória nem em disco.
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Marca como usado para o despejo LRU em disco
+        except FileNotFoundError:
+            data = render()
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._evict_disk()
+
+        self._remember(key, data)
+        return data
+
+    def _evict_disk(self):
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
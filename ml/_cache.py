@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+# Incrementar quando a lógica de previsão/saída mudar, invalidando o cache antigo
+CACHE_VERSION = 5
+
+# Colunas da entrada normalizada que determinam o resultado
+KEY_COLUMNS = ['Producao_Total_kg', 'Eficiencia_kg_h', 'Horas_Operacionais']
+
+
+def cache_key(df, params):
+    """
+    Calcula a chave do cache a partir das séries já normalizadas (Mes e
+    colunas numéricas) e dos parâmetros do modelo. Bytes diferentes no
+    arquivo original que resultem nas mesmas séries geram a mesma chave.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps({'version': CACHE_VERSION, 'params': params}, sort_keys=True).encode())
+    h.update('\n'.join(df['Mes_dt'].dt.strftime('%Y-%m')).encode())
+    for col in KEY_COLUMNS:
+        h.update(np.ascontiguousarray(df[col].to_numpy(dtype='float64')).tobytes())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Cache em disco dos resultados de `process_file`, endereçado pelo
+    conteúdo da entrada. Cada entrada é uma pasta com os arquivos gerados;
+    um índice SQLite guarda tamanho e último uso para despejo LRU limitado
+    por tamanho total e número de entradas, além dos contadores de acerto.
+
+    O objeto só guarda caminhos e limites, então pode ser enviado para os
+    processos da fila de jobs.
+    """
+
+    def __init__(self, cache_dir, max_bytes=500 * 1024 * 1024, max_entries=200):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.db_path = os.path.join(cache_dir, 'index.sqlite3')
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                '''CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )'''
+            )
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.executemany('INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)',
+                             [('hits',), ('misses',), ('evictions',)])
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _incr(self, conn, name, amount=1):
+        conn.execute('UPDATE counters SET value = value + ? WHERE name = ?', (amount, name))
+
+    def get(self, key):
+        """
+        Retorna a pasta da entrada `key` (marcando-a como usada agora) ou
+        None em caso de ausência. Atualiza os contadores de acerto/falha.
+        """
+        entry_dir = self._entry_dir(key)
+        with self._connect() as conn:
+            found = conn.execute(
+                'UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key)
+            ).rowcount
+            if found and os.path.isdir(entry_dir):
+                self._incr(conn, 'hits')
+                return entry_dir
+            if found:
+                # Índice aponta para pasta removida por fora: descarta a entrada
+                conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self._incr(conn, 'misses')
+        return None
+
+    def put(self, key, files):
+        """
+        Copia os arquivos `files` ({nome_na_entrada: caminho_origem}) para
+        uma nova entrada. A pasta é montada em um diretório temporário e
+        renomeada no final, então leitores nunca veem entradas incompletas.
+        """
+        entry_dir = self._entry_dir(key)
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+        size = 0
+        for name, src in files.items():
+            dst = os.path.join(tmp_dir, name)
+            shutil.copyfile(src, dst)
+            size += os.path.getsize(dst)
+
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Outro processo gravou a mesma entrada primeiro
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return entry_dir
+
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO entries (key, size, last_used) VALUES (?, ?, ?)',
+                         (key, size, time.time()))
+        self.evict()
+        return entry_dir
+
+    def evict(self):
+        """Remove as entradas menos usadas até respeitar os limites."""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT key, size FROM entries ORDER BY last_used DESC').fetchall()
+            total = sum(size for _, size in rows)
+            evicted = []
+            while rows and (total > self.max_bytes or len(rows) > self.max_entries):
+                key, size = rows.pop()
+                total -= size
+                evicted.append(key)
+            if evicted:
+                conn.executemany('DELETE FROM entries WHERE key = ?', [(k,) for k in evicted])
+                self._incr(conn, 'evictions', len(evicted))
+
+        for key in evicted:
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        return len(evicted)
+
+    def stats(self):
+        with self._connect() as conn:
+            counters = dict(conn.execute('SELECT name, value FROM counters').fetchall())
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        counters.update({'entries': entries, 'bytes': size,
+                         'max_entries': self.max_entries, 'max_bytes': self.max_bytes})
+        return counters
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import pandas as pd
+
+# Abas do Excel e o DataFrame correspondente de cada uma
+SHEETS = {'combined': 'Dados_Completos', 'forecast': 'Previsoes_12m'}
+
+
+def write_atomic(path, write):
+    """
+    Chama `write(caminho_temporário)` e renomeia o arquivo para `path` só no
+    final, então leitores nunca veem um arquivo pela metade. O temporário
+    mantém a extensão de `path` (o ExcelWriter escolhe o formato por ela).
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp-',
+                                    suffix=os.path.splitext(path)[1])
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return path
+
+
+def frame_paths(workbook_path):
+    """
+    Caminhos dos arquivos Parquet que guardam os DataFrames de um resultado,
+    gravados ao lado do Excel (`<nome>_com_previsao.xlsx` ->
+    `<nome>_com_previsao.combined.parquet` etc.).
+    """
+    stem = os.path.splitext(workbook_path)[0]
+    return {name: f"{stem}.{name}.parquet" for name in SHEETS}
+
+
+def result_state_path(workbook_path):
+    """Estado ajustado do modelo que gerou o resultado (`<nome>_com_previsao.state.json`)."""
+    return f"{os.path.splitext(workbook_path)[0]}.state.json"
+
+
+def has_frames(workbook_path):
+    return all(os.path.exists(path) for path in frame_paths(workbook_path).values())
+
+
+def discard_workbook(workbook_path):
+    """Remove um Excel gerado antes, que não corresponde mais aos Parquet."""
+    if os.path.exists(workbook_path):
+        os.remove(workbook_path)
+
+
+def save_frames(workbook_path, combined_df, forecast_df):
+    """Grava os DataFrames de resultado em Parquet ao lado do Excel."""
+    frames = {'combined': combined_df, 'forecast': forecast_df}
+    for name, path in frame_paths(workbook_path).items():
+        write_atomic(path, lambda tmp_path: frames[name].to_parquet(tmp_path, index=False))
+    discard_workbook(workbook_path)
+
+
+def load_frames(workbook_path, columns=None):
+    """
+    Lê os DataFrames (combined, forecast) de um resultado. `columns`
+    restringe as colunas lidas, aproveitando o formato colunar.
+    """
+    paths = frame_paths(workbook_path)
+    return (pd.read_parquet(paths['combined'], columns=columns),
+            pd.read_parquet(paths['forecast'], columns=columns))
+
+
+def ensure_workbook(workbook_path):
+    """
+    Gera o Excel a partir dos Parquet apenas quando ele é pedido (download).
+    A escrita vai para um arquivo temporário renomeado no final, então
+    downloads simultâneos nunca recebem um arquivo pela metade.
+    """
+    if os.path.exists(workbook_path):
+        return workbook_path
+
+    combined_df, forecast_df = load_frames(workbook_path)
+
+    def write(tmp_path):
+        # Remove a coluna de data auxiliar antes de salvar
+        with pd.ExcelWriter(tmp_path, engine='openpyxl') as writer:
+            combined_df.drop(columns=['Mes_dt']).to_excel(writer, sheet_name=SHEETS['combined'], index=False)
+            forecast_df.drop(columns=['Mes_dt']).to_excel(writer, sheet_name=SHEETS['forecast'], index=False)
+
+    return write_atomic(workbook_path, write)
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+
+# Colunas lidas do arquivo; as demais são ignoradas já na leitura
+VALUE_COLS = ['Producao_Total_kg', 'Eficiencia_kg_h', 'Horas_Operacionais']
+DATE_COL = 'Mes'
+
+# Tipos explícitos: evita a inferência (e colunas object) linha a linha
+VALUE_DTYPE = 'float64'
+
+# Memória máxima aproximada ocupada por um bloco em leitura
+DEFAULT_MAX_MEMORY_MB = 64
+
+# Estimativa de bytes por linha de um bloco já convertido (texto da data,
+# valores e cópias temporárias da agregação); usada para dimensionar o bloco
+BYTES_PER_ROW = 400
+
+# Somas acumuladas por mês (e por entidade, no modo em lote). Valores
+# ausentes não entram nas somas; `eff_hours` são as horas das linhas com
+# eficiência (peso da média) e `count` as linhas com eficiência.
+_SUMS = ['prod', 'hours', 'eff_x_hours', 'eff_hours', 'eff', 'count']
+
+
+def chunk_rows(max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """Número de linhas por bloco que cabe no limite de memória informado."""
+    return max(1000, int(max_memory_mb * 1024 * 1024 / BYTES_PER_ROW))
+
+
+def _month_index(values):
+    # 'AAAA-MM', datas completas ou carimbos de hora -> nº do mês (ano * 12 + mês - 1)
+    dates = pd.to_datetime(values, format='ISO8601', errors='coerce')
+    return (dates.dt.year * 12 + dates.dt.month - 1).astype('Int32')
+
+
+def _aggregate_chunk(chunk, key_col=None):
+    """
+    Reduz um bloco de linhas às somas mensais (ver _SUMS). Um mês sem
+    nenhum valor de uma coluna fica NaN nela, e não 0.
+    """
+    month = _month_index(chunk[DATE_COL])
+    eff = chunk['Eficiencia_kg_h'].to_numpy(dtype=VALUE_DTYPE)
+    hours = chunk['Horas_Operacionais'].to_numpy(dtype=VALUE_DTYPE)
+    has_eff = ~np.isnan(eff)
+    sums = pd.DataFrame({
+        'month': month,
+        'prod': chunk['Producao_Total_kg'].to_numpy(dtype=VALUE_DTYPE),
+        'hours': hours,
+        'eff_x_hours': eff * hours,
+        'eff_hours': np.where(has_eff, hours, np.nan),
+        'eff': eff,
+        'count': has_eff.astype('int64'),
+    })
+    keys = ['month']
+    if key_col is not None:
+        sums.insert(0, key_col, chunk[key_col].to_numpy())
+        keys = [key_col, 'month']
+    return sums.dropna(subset=keys).groupby(keys).sum(min_count=1)
+
+
+def _finalize(totals, key_col=None):
+    """Converte as somas acumuladas no DataFrame mensal usado pelo pipeline."""
+    totals = totals.reset_index()
+    months = totals['month'].to_numpy(dtype='int64')
+    mes_dt = pd.to_datetime({'year': months // 12, 'month': months % 12 + 1, 'day': 1})
+
+    # Eficiência do mês: média ponderada pelas horas; sem horas, média simples.
+    # Com uma linha só no mês o valor original é mantido sem arredondamentos.
+    count = totals['count'].to_numpy()
+    hours = totals['hours'].to_numpy()
+    eff_hours = totals['eff_hours'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weighted = np.where(eff_hours > 0, totals['eff_x_hours'].to_numpy() / eff_hours,
+                            totals['eff'].to_numpy() / count)
+    eff = np.where(count == 1, totals['eff'].to_numpy(), weighted)
+
+    df = pd.DataFrame({
+        'Mes': mes_dt.dt.strftime('%Y-%m'),
+        'Producao_Total_kg': totals['prod'].to_numpy(),
+        'Eficiencia_kg_h': eff,
+        'Horas_Operacionais': hours,
+        'Mes_dt': mes_dt,
+    })
+    if key_col is not None:
+        df.insert(0, key_col, totals[key_col].to_numpy())
+        return df.sort_values([key_col, 'Mes_dt']).reset_index(drop=True)
+    return df.sort_values('Mes_dt').reset_index(drop=True)
+
+
+def _check_columns(columns, needed):
+    for col in needed:
+        if col not in columns:
+            raise ValueError(f'Coluna obrigatória não encontrada: {col}')
+
+
+def _check_months(df):
+    # Como na validação original: meses sem valor são rejeitados, não zerados
+    for col in VALUE_COLS:
+        missing = df.loc[df[col].isna(), 'Mes']
+        if len(missing):
+            raise ValueError(f"Meses sem valores de {col}: {', '.join(missing)}")
+
+
+def _iter_csv(input_path, needed, rows):
+    _check_columns(pd.read_csv(input_path, nrows=0).columns, needed)
+    dtypes = {col: VALUE_DTYPE for col in VALUE_COLS}
+    dtypes[DATE_COL] = 'str'
+    yield from pd.read_csv(input_path, usecols=needed, dtype=dtypes, chunksize=rows)
+
+
+def _iter_xlsx(input_path, needed, rows):
+    # Importado aqui para não pesar no início de quem só lê CSV (ver ml._preload)
+    from openpyxl import load_workbook
+
+    # Modo somente leitura: o openpyxl percorre a planilha sem montá-la em memória
+    wb = load_workbook(input_path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        values = ws.iter_rows(values_only=True)
+        header = next(values, ())
+        _check_columns(header, needed)
+        positions = [header.index(col) for col in needed]
+
+        block = []
+        for row in values:
+            block.append([row[i] if i < len(row) else None for i in positions])
+            if len(block) >= rows:
+                yield _xlsx_frame(block, needed)
+                block = []
+        if block:
+            yield _xlsx_frame(block, needed)
+    finally:
+        wb.close()
+
+
+def _xlsx_frame(block, needed):
+    frame = pd.DataFrame(block, columns=needed)
+    # Datas do Excel chegam como datetime; o resto vira texto para o mesmo parser do CSV
+    frame[DATE_COL] = frame[DATE_COL].map(lambda v: v.isoformat() if hasattr(v, 'isoformat') else v).astype('str')
+    for col in VALUE_COLS:
+        frame[col] = pd.to_numeric(frame[col], errors='coerce').astype(VALUE_DTYPE)
+    return frame
+
+
+def read_monthly(input_path, key_col=None, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """
+    Lê um .csv ou .xlsx em blocos e já agrega para meses durante a leitura.
+
+    Apenas as colunas necessárias são lidas, com tipos explícitos. A coluna
+    `Mes` pode ter meses (AAAA-MM) ou datas/horários de registros diários
+    ou horários: produção e horas são somadas no mês e a eficiência é a
+    média ponderada pelas horas. Com `key_col`, agrega por entidade e mês.
+    O tamanho do bloco é limitado por `max_memory_mb`, então a memória de
+    pico não cresce com o número de linhas do arquivo.
+
+    Valores ausentes são ignorados nas somas. Um mês sem nenhum valor de
+    uma coluna levanta ValueError; no modo em lote ele fica NaN e a
+    entidade trata o mês como não observado.
+    """
+    needed = ([key_col] if key_col else []) + [DATE_COL] + VALUE_COLS
+    rows = chunk_rows(max_memory_mb)
+
+    if input_path.endswith('.xlsx'):
+        chunks = _iter_xlsx(input_path, needed, rows)
+    elif input_path.endswith('.csv'):
+        chunks = _iter_csv(input_path, needed, rows)
+    else:
+        raise ValueError('Formato de arquivo não suportado')
+
+    totals = None
+    for chunk in chunks:
+        partial = _aggregate_chunk(chunk, key_col)
+        totals = partial if totals is None else totals.add(partial, fill_value=0)
+
+    if totals is None or totals.empty:
+        # Nenhuma linha com data válida
+        columns = ([key_col] if key_col else []) + ['Mes'] + VALUE_COLS + ['Mes_dt']
+        return pd.DataFrame(columns=columns)
+    df = _finalize(totals, key_col)
+    if key_col is None:
+        _check_months(df)
+    return df
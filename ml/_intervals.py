@@ -0,0 +1,163 @@
+import numpy as np
+
+from ml._state import forecast_from_state
+
+# Caminhos simulados por série, semente do sorteio e cobertura do intervalo
+DEFAULT_PATHS = 5000
+DEFAULT_SEED = 42
+DEFAULT_LEVEL = 0.90
+
+# Limite de valores simulados por bloco no modo em lote (séries × caminhos × meses)
+CHUNK_VALUES = 4_000_000
+
+
+def coefficient_matrix(alpha, beta, phi, gamma, season_length, periods):
+    """
+    Matrizes (n_series, periods, periods) que levam os erros um passo à
+    frente dos meses previstos ao erro de previsão de cada mês, para os
+    modelos com tendência e sazonalidade aditivas:
+
+        erro(T+h) = e(T+h) + soma_j c_j * e(T+h-j),
+        c_j = alpha * (1 + beta * (phi + ... + phi^j)) + gamma * [j múltiplo de m]
+
+    Todos os argumentos de parâmetro são arrays (n_series,); `gamma` = 0
+    (ou `season_length` = 0) em séries sem sazonalidade.
+    """
+    alpha, beta, phi, gamma, season_length = (
+        np.asarray(v, dtype='float64')[:, None] for v in (alpha, beta, phi, gamma, season_length))
+    j = np.arange(1, periods, dtype='float64')[None, :]
+    damped = np.cumsum(phi ** j, axis=1)
+    seasonal = (season_length > 0) & (np.mod(j, np.maximum(season_length, 1)) == 0)
+    coef = alpha * (1 + beta * damped) + gamma * seasonal
+
+    # Linha h, coluna i: peso do erro do mês i na previsão do mês h (i <= h)
+    lag = np.arange(periods)[:, None] - np.arange(periods)[None, :]
+    padded = np.concatenate([np.ones((coef.shape[0], 1)), coef], axis=1)
+    return np.where(lag >= 0, padded[:, np.clip(lag, 0, None)], 0.0)
+
+
+def _draw_residuals(resid, counts, paths, periods, rng):
+    # Sorteia (com reposição) um mês de resíduo por caminho e mês previsto;
+    # o mesmo índice é usado para eficiência e horas, preservando a correlação
+    idx = np.floor(rng.random((resid[0].shape[0], paths, periods)) * counts[:, None, None]).astype('int64')
+    rows = np.arange(resid[0].shape[0])[:, None, None]
+    return [r[rows, idx] for r in resid]
+
+
+def _quantiles(production, level):
+    lower, upper = np.quantile(production, [(1 - level) / 2, (1 + level) / 2], axis=1)
+    return lower, upper
+
+
+def _recursive_paths(series_state, draws):
+    """
+    Caminhos simulados pelas próprias equações do modelo, vetorizados nos
+    caminhos (um passo por mês). Usado para a tendência multiplicativa,
+    que não tem a forma linear de coefficient_matrix.
+    """
+    alpha, beta = series_state['alpha'], series_state['beta']
+    phi = series_state.get('phi', 1.0)
+    gamma = series_state.get('gamma', 0.0)
+    # Componentes sazonais por caminho, atualizados como em ml._state.update_series
+    season = np.tile(np.asarray(series_state.get('season') or [0.0], dtype='float64'), (draws.shape[0], 1))
+    level = np.full(draws.shape[0], series_state['level'])
+    trend = np.full(draws.shape[0], series_state['trend'])
+    out = np.empty_like(draws)
+    for h in range(draws.shape[1]):
+        i = h % season.shape[1]
+        s = season[:, i]
+        base = level * trend ** phi
+        y = base + s + draws[:, h]
+        new_level = alpha * (y - s) + (1 - alpha) * base
+        trend = beta * (new_level / level) + (1 - beta) * trend ** phi
+        season[:, i] = gamma * (y - base) + (1 - gamma) * s
+        level = new_level
+        out[:, h] = y
+    return out
+
+
+def _linear_params(series_state):
+    return (series_state['alpha'], series_state['beta'], series_state.get('phi', 1.0),
+            series_state.get('gamma', 0.0), len(series_state.get('season') or []))
+
+
+class BootstrapIntervals:
+    """
+    Intervalos de previsão da produção por simulação: resíduos um passo à
+    frente de eficiência e horas são reamostrados em `paths` caminhos
+    (um único sorteio NumPy), propagados pelo modelo, multiplicados e
+    reduzidos aos quantis da cobertura `level`. `seed` torna o resultado
+    reprodutível. O objeto só guarda a configuração, então pode ser
+    enviado para os processos da fila de jobs.
+    """
+
+    def __init__(self, paths=DEFAULT_PATHS, seed=DEFAULT_SEED, level=DEFAULT_LEVEL):
+        self.paths = paths
+        self.seed = seed
+        self.level = level
+
+    def params(self):
+        """Configuração que afeta o resultado (entra na chave do cache)."""
+        return {'paths': self.paths, 'seed': self.seed, 'level': self.level}
+
+    def simulate(self, eff_state, hours_state, periods):
+        """
+        Caminhos simulados (eficiência, horas), cada um (paths, periods),
+        a partir dos estados ajustados das duas séries (com os resíduos em
+        'residuals'). Usados por `production` e pelos cenários (ml._scenario).
+        """
+        rng = np.random.default_rng(self.seed)
+        # Meses em comum: os resíduos mais recentes das duas séries
+        k = min(len(eff_state['residuals']), len(hours_state['residuals']))
+        resid = [np.asarray(state['residuals'][-k:], dtype='float64')[None, :] for state in (eff_state, hours_state)]
+        eff_draws, hours_draws = (d[0] for d in _draw_residuals(resid, np.array([k]), self.paths, periods, rng))
+
+        sims = []
+        for state, draws in ((eff_state, eff_draws), (hours_state, hours_draws)):
+            if state.get('trend_type', 'add') == 'mul':
+                sims.append(_recursive_paths(state, draws))
+            else:
+                coef = coefficient_matrix(*([v] for v in _linear_params(state)), periods)[0]
+                sims.append(forecast_from_state(state, periods)[None, :] + draws @ coef.T)
+        return sims
+
+    def production(self, eff_state, hours_state, periods):
+        """
+        Limites (inferior, superior) da produção prevista para os próximos
+        `periods` meses, a partir dos estados ajustados das duas séries.
+        """
+        eff_sims, hours_sims = self.simulate(eff_state, hours_state, periods)
+        lower, upper = _quantiles((eff_sims * hours_sims)[None, :, :], self.level)
+        return lower[0], upper[0]
+
+    def production_batch(self, eff_fit, hours_fit, eff_forecast, hours_forecast):
+        """
+        Versão em lote para o Holt vetorizado (ml._batch): `*_fit` são os
+        dicionários de holt_fit_batch (com 'resid' (n_series, n_meses), NaN
+        onde não houve observação) e `*_forecast` as previsões
+        (n_series, periods). Processa as séries em blocos para limitar a
+        memória a CHUNK_VALUES valores simulados.
+        """
+        rng = np.random.default_rng(self.seed)
+        n_series, periods = eff_forecast.shape
+
+        # Resíduos dos meses observados nas duas séries, alinhados à esquerda
+        valid = ~np.isnan(eff_fit['resid']) & ~np.isnan(hours_fit['resid'])
+        order = np.argsort(~valid, axis=1, kind='stable')
+        counts = valid.sum(axis=1)
+        resid = [np.take_along_axis(np.nan_to_num(fit['resid']), order, axis=1) for fit in (eff_fit, hours_fit)]
+
+        coefs = [coefficient_matrix(fit['alpha'], fit['beta'], np.ones(n_series), np.zeros(n_series),
+                                    np.zeros(n_series), periods) for fit in (eff_fit, hours_fit)]
+
+        lower = np.empty((n_series, periods))
+        upper = np.empty((n_series, periods))
+        step = max(1, CHUNK_VALUES // (self.paths * periods))
+        for start in range(0, n_series, step):
+            block = slice(start, start + step)
+            eff_draws, hours_draws = _draw_residuals([r[block] for r in resid], counts[block],
+                                                     self.paths, periods, rng)
+            eff_sims = eff_forecast[block, None, :] + eff_draws @ coefs[0][block].transpose(0, 2, 1)
+            hours_sims = hours_forecast[block, None, :] + hours_draws @ coefs[1][block].transpose(0, 2, 1)
+            lower[block], upper[block] = _quantiles(eff_sims * hours_sims, self.level)
+        return lower, upper
@@ -0,0 +1,369 @@
+import os
+import json
+import time
+import uuid
+import signal
+import logging
+import sqlite3
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from ml._main import process_file
+from ml._batch import process_batch
+
+logger = logging.getLogger(__name__)
+
+# Estados possíveis de um job
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_ERROR = 'error'
+
+# Tempo máximo padrão de um job, em segundos (None = sem limite)
+DEFAULT_JOB_TIMEOUT = 600
+
+# Tipos de job e a função de processamento de cada um
+PROCESSORS = {
+    'single': process_file,
+    'batch': process_batch,
+}
+
+
+QUEUE_FULL_MESSAGE = 'Fila de processamento cheia. Tente novamente em instantes.'
+
+
+class QueueFullError(Exception):
+    """Levantada quando a fila atingiu o limite de jobs pendentes."""
+
+
+class JobTimeoutError(Exception):
+    """Levantada dentro do processo do pool quando um job passa do tempo máximo."""
+
+
+@contextmanager
+def _connect(db_path):
+    # A conexão é sempre fechada ao sair: conexões SQLite abertas não podem
+    # ser herdadas pelos processos do pool criados via fork.
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _proc_stat(pid):
+    # Estado e início do processo (em ticks desde o boot), lidos do /proc no
+    # Linux; None sem /proc ou se o processo não existe
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    return fields[0], fields[19]
+
+
+def _identity():
+    """
+    Identificação do processo atual gravada em `owner`: pid e início do
+    processo. O pid sozinho é reaproveitado (ex.: um contêiner reiniciado
+    recria os processos com os mesmos pids); o par não.
+    """
+    pid = os.getpid()
+    stat = _proc_stat(pid)
+    return f'{pid}:{stat[1]}' if stat else str(pid)
+
+
+def _alive(owner):
+    # O processo `owner` (ver _identity) ainda existe e é o mesmo?
+    if not owner:
+        return False
+    pid, _, started = str(owner).partition(':')
+    try:
+        # Sinal 0 só verifica se o processo existe (e pode receber sinais)
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    stat = _proc_stat(pid)
+    if stat is None:
+        return True
+    state, current = stat
+    # Processo zumbi (morreu, ainda não recolhido) ou outro com o mesmo pid
+    return state not in ('Z', 'X') and (not started or current == started)
+
+
+@contextmanager
+def _time_limit(seconds):
+    # SIGALRM interrompe o job no processo do pool, onde a tarefa roda na
+    # thread principal. Sem setitimer (Windows) o job roda sem limite.
+    if not seconds or not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def expire(signum, frame):
+        raise JobTimeoutError(f'O processamento passou do tempo máximo de {seconds:g} s.')
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _update(db_path, job_id, **fields):
+    fields['updated_at'] = time.time()
+    cols = ', '.join(f'{k} = ?' for k in fields)
+    with _connect(db_path) as conn:
+        conn.execute(f'UPDATE jobs SET {cols} WHERE id = ?', (*fields.values(), job_id))
+
+
+def _run_job(db_path, job_id, kind, input_path, output_dir, options, cache=None, states=None, selector=None,
+             metrics=None, intervals=None, timeout=None):
+    """
+    Executa o processamento do tipo `kind` (ver PROCESSORS) dentro de um
+    processo do pool, gravando etapa, progresso e resultado diretamente no
+    banco SQLite da fila. `options` são repassadas como argumentos nomeados.
+    Um job que passa de `timeout` segundos termina com erro e libera o
+    processo para o próximo.
+    """
+    # Reivindica o job de forma atômica: se outro processo já o pegou, sai.
+    # `owner` identifica o processo que o executa (ver _identity e JobQueue.recover).
+    started = time.time()
+    with _connect(db_path) as conn:
+        claimed = conn.execute(
+            'UPDATE jobs SET status = ?, owner = ?, updated_at = ? WHERE id = ? AND status = ?',
+            (STATUS_RUNNING, _identity(), started, job_id, STATUS_QUEUED),
+        ).rowcount
+        created_at = conn.execute('SELECT created_at FROM jobs WHERE id = ?', (job_id,)).fetchone()[0]
+    if not claimed:
+        return
+
+    def progress(stage, percent):
+        _update(db_path, job_id, stage=stage, progress=percent)
+
+    status = STATUS_ERROR
+    try:
+        with _time_limit(timeout):
+            out_path, fig_paths = PROCESSORS[kind](input_path, output_dir, progress=progress, cache=cache,
+                                                 states=states, selector=selector, metrics=metrics,
+                                                 intervals=intervals, **options)
+        result = {'output': out_path, 'figures': fig_paths}
+        _update(db_path, job_id, status=STATUS_DONE, stage='concluido', progress=100,
+                result=json.dumps(result))
+        status = STATUS_DONE
+    except Exception as e:
+        logger.exception('Falha no processamento', extra={'job_id': job_id, 'kind': kind})
+        _update(db_path, job_id, status=STATUS_ERROR, error=str(e))
+    finally:
+        if metrics is not None:
+            metrics.inc('waste_jobs_total', kind=kind, status=status)
+            metrics.observe('waste_job_queue_wait_seconds', started - created_at, kind=kind)
+            metrics.observe('waste_job_duration_seconds', time.time() - started, kind=kind, status=status)
+            # O worker pode ficar ocioso por muito tempo: grava já o que mediu
+            metrics.flush()
+
+
+class JobQueue:
+    """
+    Fila de processamento persistida em SQLite e executada por um pool de
+    processos limitado. Jobs pendentes sobrevivem a reinícios do servidor:
+    `recover` os recoloca no pool ao iniciar.
+
+    Cada processo do servidor (ex.: workers do gunicorn) tem o seu pool; o
+    banco é compartilhado e um job só é executado por quem o reivindicar
+    primeiro (ver _run_job). `start_method` escolhe como os processos do
+    pool são criados ('fork', 'forkserver', 'spawn'; None = padrão da
+    plataforma). Com threads atendendo requisições, 'forkserver' evita que
+    o pool herde locks presos por outras threads no momento do fork.
+
+    Se um processo do pool morre no meio de um job (ex.: falta de memória),
+    o pool é recriado: o job que ele executava termina com erro e os que
+    esperavam no pool quebrado são reenviados. `job_timeout` limita a
+    duração de cada job (ver _run_job).
+
+    `preload_modules` são importados pelo servidor de fork ('forkserver')
+    antes de criar os processos do pool, que assim já nascem com eles
+    carregados (com 'fork' os processos herdam o que o servidor importou).
+    """
+
+    def __init__(self, db_path, max_workers=2, max_pending=20, cache=None, states=None, selector=None,
+                 metrics=None, intervals=None, start_method=None, job_timeout=DEFAULT_JOB_TIMEOUT,
+                 preload_modules=()):
+        self.db_path = db_path
+        self.metrics = metrics
+        self.cache = cache
+        self.states = states
+        self.selector = selector
+        self.intervals = intervals
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.start_method = start_method
+        self.job_timeout = job_timeout
+        self.preload_modules = list(preload_modules)
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+        with _connect(self.db_path) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                '''CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL DEFAULT 'single',
+                    options TEXT,
+                    status TEXT NOT NULL,
+                    owner TEXT,
+                    stage TEXT,
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    input_path TEXT NOT NULL,
+                    output_dir TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )'''
+            )
+
+    def _get_executor(self, broken=None):
+        # O pool só é criado no primeiro uso, para não gerar processos
+        # filhos no import (ex.: reloader do Flask em modo debug). Um pool
+        # herdado por fork (gunicorn --preload) não funciona no processo
+        # filho, que cria o seu. `broken` é um pool quebrado a descartar.
+        with self._lock:
+            if broken is not None and self._executor is broken:
+                broken.shutdown(wait=False)
+                self._executor = None
+            if self._executor is None or self._executor_pid != os.getpid():
+                context = None
+                if self.start_method is not None:
+                    context = multiprocessing.get_context(self.start_method)
+                    if self.start_method == 'forkserver':
+                        # O servidor de fork já carrega o processamento (e, com
+                        # preload, as dependências pesadas) uma vez
+                        context.set_forkserver_preload(['ml._jobs', *self.preload_modules])
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _dispatch(self, job_id, kind, input_path, output_dir, options):
+        args = (self.db_path, job_id, kind, input_path, output_dir, options, self.cache, self.states,
+                self.selector, self.metrics, self.intervals, self.job_timeout)
+        executor = self._get_executor()
+        try:
+            future = executor.submit(_run_job, *args)
+        except BrokenProcessPool:
+            executor = self._get_executor(broken=executor)
+            future = executor.submit(_run_job, *args)
+        future.add_done_callback(
+            lambda done: self._finished(done, executor, job_id, kind, input_path, output_dir, options))
+
+    def _finished(self, future, executor, job_id, kind, input_path, output_dir, options):
+        # Chamado quando a tarefa do pool termina. _run_job grava o próprio
+        # resultado; aqui só sobra o caso do pool quebrado.
+        if future.cancelled() or not isinstance(future.exception(), BrokenProcessPool):
+            return
+        self._get_executor(broken=executor)
+        job = self.get(job_id)
+        if job is None:
+            return
+        if job['status'] == STATUS_QUEUED:
+            self._dispatch(job_id, kind, input_path, output_dir, options)
+        elif job['status'] == STATUS_RUNNING and not _alive(job['owner']):
+            logger.error('Processo do pool terminou durante o job', extra={'job_id': job_id, 'kind': kind})
+            _update(self.db_path, job_id, status=STATUS_ERROR,
+                    error='O processamento foi interrompido: o processo terminou inesperadamente '
+                          '(ex.: falta de memória).')
+
+    def pending_count(self):
+        with _connect(self.db_path) as conn:
+            row = conn.execute(
+                'SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)',
+                (STATUS_QUEUED, STATUS_RUNNING),
+            ).fetchone()
+        return row[0]
+
+    def ensure_capacity(self):
+        """
+        Levanta QueueFullError se a fila já tiver `max_pending` jobs
+        pendentes. Permite recusar um upload antes de gravá-lo; `submit`
+        verifica de novo, de forma atômica.
+        """
+        if self.pending_count() >= self.max_pending:
+            raise QueueFullError(QUEUE_FULL_MESSAGE)
+
+    def submit(self, input_path, output_dir, kind='single', **options):
+        """
+        Enfileira um arquivo para processamento e retorna o id do job.
+        `kind` escolhe o processamento (ver PROCESSORS) e `options` são
+        repassadas a ele. Levanta QueueFullError se já houver
+        `max_pending` jobs pendentes.
+        """
+        if kind not in PROCESSORS:
+            raise ValueError(f'Tipo de job desconhecido: {kind}')
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with _connect(self.db_path) as conn:
+            # Contagem e inserção na mesma transação de escrita: requisições
+            # simultâneas (threads ou workers) não passam juntas do limite
+            conn.execute('BEGIN IMMEDIATE')
+            pending = conn.execute(
+                'SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)',
+                (STATUS_QUEUED, STATUS_RUNNING),
+            ).fetchone()[0]
+            if pending >= self.max_pending:
+                raise QueueFullError(QUEUE_FULL_MESSAGE)
+            conn.execute(
+                '''INSERT INTO jobs (id, kind, options, status, stage, progress, input_path, output_dir,
+                                     created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?, ?)''',
+                (job_id, kind, json.dumps(options), STATUS_QUEUED, 'fila', input_path, output_dir, now, now),
+            )
+        self._dispatch(job_id, kind, input_path, output_dir, options)
+        return job_id
+
+    def get(self, job_id):
+        """Retorna o estado do job como dicionário, ou None se não existir."""
+        with _connect(self.db_path) as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['options'] = json.loads(job['options']) if job['options'] else {}
+        return job
+
+    def recover(self):
+        """
+        Recoloca no pool os jobs que ficaram pendentes de uma execução
+        anterior. Jobs "running" cujo processo dono (`owner`) não existe
+        mais voltam para a fila; os de processos vivos (pools de outros
+        workers do servidor) continuam com eles. Retorna quantos jobs
+        foram reenviados.
+        """
+        with _connect(self.db_path) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            running = conn.execute('SELECT id, owner FROM jobs WHERE status = ?', (STATUS_RUNNING,)).fetchall()
+            orphans = [(STATUS_QUEUED, row['id']) for row in running if not _alive(row['owner'])]
+            conn.executemany('UPDATE jobs SET status = ?, owner = NULL WHERE id = ?', orphans)
+            rows = conn.execute(
+                'SELECT id, kind, options, input_path, output_dir FROM jobs WHERE status = ? ORDER BY created_at',
+                (STATUS_QUEUED,),
+            ).fetchall()
+
+        for row in rows:
+            if os.path.exists(row['input_path']):
+                options = json.loads(row['options']) if row['options'] else {}
+                self._dispatch(row['id'], row['kind'], row['input_path'], row['output_dir'], options)
+            else:
+                _update(self.db_path, row['id'], status=STATUS_ERROR,
+                        error='Arquivo de entrada não encontrado após reinício.')
+        return len(rows)
@@ -1,156 +1,255 @@
 import os
+import json
+import shutil
+import logging
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
 
-def process_file(input_path, output_dir):
+from ml._cache import cache_key
+from ml._frames import frame_paths, result_state_path, save_frames, discard_workbook, write_atomic
+from ml._plots import CHART_KINDS
+from ml._ingest import read_monthly
+from ml._select import fit_candidate
+from ml._state import (STATE_SERIES, append_months, incremental_update, forecast_from_state,
+                       new_state)
+from ml._metrics import StageClock
+from ml._intervals import BootstrapIntervals
+
+logger = logging.getLogger(__name__)
+
+# Parâmetros do modelo; fazem parte da chave do cache de resultados
+MODEL_PARAMS = {'trend': 'add', 'seasonal': None, 'periods': 12}
+
+# Maior horizonte de previsão aceito, em meses
+MAX_PERIODS = 60
+
+# Colunas do histórico que entram no resultado combinado
+HISTORY_OUTPUT_COLUMNS = ['Mes', 'Producao_Total_kg', 'Eficiencia_kg_h', 'Horas_Operacionais', 'Mes_dt']
+
+# Nomes dos arquivos dentro de uma entrada do cache
+CACHED_FRAMES = {'combined': 'dados_completos.parquet', 'forecast': 'previsoes.parquet'}
+# Estado ajustado do modelo, guardado na mesma entrada do cache
+CACHED_STATE = 'estado.json'
+
+def save_result_state(workbook_path, state):
+    """Grava o estado ajustado ao lado do resultado (usado pelos cenários, ver ml._scenario)."""
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+    return write_atomic(result_state_path(workbook_path), write)
+
+def fit_series(series):
+    """
+    Ajusta o modelo padrão (Holt, tendência aditiva) para uma série mensal
+    indexada por data e retorna o estado final do ajuste: parâmetros de
+    suavização, nível, tendência e o erro quadrático um passo à frente.
+    """
+    return fit_candidate(series, 'holt')
+
+def forecast_series(series, periods=MODEL_PARAMS['periods']):
     """
-    Lê um arquivo de dados, gera previsões para 12 meses, salva um Excel 
-    com os resultados e cria 3 gráficos de visualização.
+    Ajusta um modelo Holt para uma série mensal indexada por data e retorna
+    a previsão dos próximos `periods` meses.
     """
-    print('Processando arquivo:', input_path)
-
-    # 1. Ler arquivo
-    if input_path.endswith('.xlsx'):
-        df = pd.read_excel(input_path, engine='openpyxl')
-    elif input_path.endswith('.csv'):
-        df = pd.read_csv(input_path)
-    else:
-        raise ValueError('Formato de arquivo não suportado')
-
-    # 2. Validar colunas
-    required_cols = ['Mes', 'Producao_Total_kg', 'Eficiencia_kg_h', 'Horas_Operacionais']
-    for col in required_cols:
-        if col not in df.columns:
-            raise ValueError(f'Coluna obrigatória não encontrada: {col}')
-
-    # 3. Converter 'Mes' para datetime para cálculos
-    df['Mes_dt'] = pd.to_datetime(df['Mes'], format='%Y-%m', errors='coerce')
-    df = df.dropna(subset=['Mes_dt']).sort_values('Mes_dt').reset_index(drop=True)
+    return forecast_from_state(fit_series(series), periods)
 
+def forecast_frame(last_month, eff, hours, lower, upper, keys=None, key_col=None):
+    """
+    Tabela de previsões de uma ou várias séries, montada coluna a coluna:
+    `eff`, `hours`, `lower` e `upper` são arrays (n_series, periods) (ou
+    (periods,) para uma série só) e cada coluna é preenchida de uma vez
+    com operações NumPy, sem objetos por linha. Com `keys`, a coluna
+    `key_col` identifica a entidade de cada linha (ordem: entidade, mês).
+    """
+    eff, hours, lower, upper = (np.atleast_2d(np.asarray(v, dtype='float64')) for v in (eff, hours, lower, upper))
+    n_series, periods = eff.shape
+    months = pd.date_range(last_month + pd.DateOffset(months=1), periods=periods, freq='MS')
+
+    prod = np.round(eff * hours, 2)
+    columns = {}
+    if key_col is not None:
+        columns[key_col] = np.repeat(np.asarray(keys), periods)
+    columns.update({
+        'Mes': np.tile(months.strftime('%Y-%m').to_numpy(dtype=object), n_series),
+        'Mes_dt': np.tile(months.to_numpy(), n_series),
+        'Eficiencia_kg_h': np.round(eff, 2).ravel(),
+        'Horas_Operacionais': np.round(hours, 2).ravel(),
+        'Producao_Total_kg': prod.ravel(),
+        'Residuo_kg': np.round(prod * 0.10, 2).ravel(),
+        'Producao_Minima_Esperada': np.round(lower, 2).ravel(),
+        'Producao_Maxima_Esperada': np.round(upper, 2).ravel(),
+    })
+    return pd.DataFrame(columns)
+
+def combine_frames(history, forecast_df, key_col=None):
+    """
+    Histórico + previsões em um único DataFrame. Cada coluna é um único
+    array concatenado (NaN no histórico para as colunas que só a previsão
+    tem), sem copiar o histórico para um DataFrame intermediário.
+    """
+    history_cols = ([key_col] if key_col is not None else []) + HISTORY_OUTPUT_COLUMNS
+    columns = history_cols + [col for col in forecast_df.columns if col not in history_cols]
+    n_history = len(history)
+    return pd.DataFrame({
+        col: np.concatenate([history[col].to_numpy() if col in history_cols else np.full(n_history, np.nan),
+                             forecast_df[col].to_numpy()])
+        for col in columns
+    })
+
+def process_file(input_path, output_dir, progress=None, cache=None, states=None, incremental=False,
+                 dataset=None, selector=None, metrics=None, intervals=None, periods=MODEL_PARAMS['periods']):
+    """
+    Lê um arquivo de dados, gera previsões para `periods` meses (padrão
+    12, até MAX_PERIODS), salva os resultados em Parquet e retorna os
+    caminhos do Excel e dos 3 gráficos de visualização, que são gerados
+    sob demanda a partir dos Parquet.
+
+    `progress`, se informado, é chamado como progress(etapa, percentual)
+    no início de cada etapa (usado pela fila de jobs para reportar status).
+    `cache` (um ml._cache.ResultCache) permite reaproveitar o resultado de
+    uma entrada com as mesmas séries, pulando a modelagem.
+
+    `states` (um ml._state.ModelStateStore) guarda o estado ajustado do
+    conjunto `dataset` (padrão: nome do arquivo). Com `incremental=True`,
+    meses novos — enviados sozinhos ou com o histórico inteiro — só
+    atualizam esse estado; o ajuste completo roda quando não há estado
+    compatível, no reajuste agendado ou quando há desvio.
+
+    `selector` (um ml._select.ModelSelector) escolhe o modelo de cada série
+    no ajuste completo; sem ele, usa o Holt com tendência aditiva. A
+    seleção anterior do conjunto, se houver, serve de ponto de partida.
+
+    `metrics` (um ml._metrics.Metrics) recebe a duração de cada etapa no
+    histograma `waste_pipeline_stage_seconds`.
+
+    `intervals` (um ml._intervals.BootstrapIntervals) calcula a produção
+    mínima/máxima esperada; sem ele, usa a configuração padrão.
+    """
+    if intervals is None:
+        intervals = BootstrapIntervals()
+    if not 1 <= periods <= MAX_PERIODS:
+        raise ValueError(f'O horizonte de previsão deve ter entre 1 e {MAX_PERIODS} meses.')
+    clock = StageClock(metrics, 'waste_pipeline_stage_seconds', kind='single')
+
+    def report(stage, percent):
+        clock.mark(stage)
+        if progress is not None:
+            progress(stage, percent)
+
+    logger.info('Processando arquivo', extra={'input': input_path})
+
+    # 1. Ler arquivo em blocos, só com as colunas necessárias, já agregando
+    # os registros por mês (aceita planilhas mensais ou logs diários/horários)
+    report('leitura', 0)
+    df = read_monthly(input_path)
+
+    # Nomes dos arquivos de saída (por conjunto de dados)
+    base = dataset or os.path.splitext(os.path.basename(input_path))[0]
+
+    # Parâmetros que definem o resultado (cache e compatibilidade do estado salvo)
+    params = MODEL_PARAMS if selector is None else dict(MODEL_PARAMS, selection=selector.params())
+
+    # 1.1 Modo incremental: junta os meses novos ao histórico salvo do conjunto
+    previous = states.load(base, params) if states is not None else None
+    saved = previous if incremental else None
+    appended = append_months(saved[1], df) if saved is not None else None
+    if appended is not None:
+        df, new_rows = appended
+    elif saved is not None:
+        logger.info('Entrada não continua o histórico salvo; ajuste completo', extra={'dataset': base})
+
+    # 2. Validar colunas (feito na leitura) e quantidade de meses
+    # 3. 'Mes_dt' (datetime) também vem da leitura, já ordenado
+    report('validacao', 10)
     if len(df) < 6:
         raise ValueError('Poucos dados para prever. Forneça pelo menos 6 meses.')
 
+    out_path = os.path.join(output_dir, f"{base}_com_previsao.xlsx")
+    # Os gráficos não são gravados aqui: a rota /plots os renderiza sob demanda
+    fig_paths = [os.path.join(output_dir, f"{base}_grafico_{kind}.png") for kind in CHART_KINDS]
+
+    # 3.1 Atualizar o estado salvo só com os meses novos (O(meses novos))
+    model_state = None
+    if appended is not None:
+        model_state, reason = incremental_update(saved[0], new_rows, states.refit_every, states.drift_sigmas)
+        if model_state is None:
+            logger.info('Reajuste completo', extra={'dataset': base, 'reason': reason})
+
+    # 3.2 Consultar o cache: mesmas séries + mesmos parâmetros = mesmo resultado
+    # (só para o ajuste completo; o resultado incremental depende do estado salvo)
+    key = None
+    if cache is not None and model_state is None:
+        clock.mark('cache')
+        key = cache_key(df, dict(params, periods=periods, intervals=intervals.params()))
+        entry_dir = cache.get(key)
+        if entry_dir is not None:
+            for name, frame_path in frame_paths(out_path).items():
+                src = os.path.join(entry_dir, CACHED_FRAMES[name])
+                write_atomic(frame_path, lambda tmp_path: shutil.copyfile(src, tmp_path))
+            discard_workbook(out_path)
+            state_path = os.path.join(entry_dir, CACHED_STATE)
+            if os.path.exists(state_path):
+                write_atomic(result_state_path(out_path), lambda tmp_path: shutil.copyfile(state_path, tmp_path))
+                if states is not None:
+                    states.copy_state(base, state_path, df)
+            report('concluido', 100)
+            logger.info('Resultado reaproveitado do cache', extra={'key': key[:12], 'output': out_path})
+            return out_path, fig_paths
+
     # 4. Extrair último mês histórico para iniciar a previsão
     last_date = df['Mes_dt'].iloc[-1]
-    start_forecast = (last_date + pd.DateOffset(months=1))
-
-    # 5. Função para prever séries com Holt-Winters
-    def forecast_series(series, periods=12):
-        # A frequência 'MS' significa "Month Start" (início do mês)
-        series_resampled = series.asfreq('MS')
-        model = ExponentialSmoothing(
-            series_resampled,
-            trend='add',
-            seasonal=None, # Sem sazonalidade neste modelo simples
-            initialization_method='estimated'
-        )
-        fit = model.fit()
-        forecast = fit.forecast(periods)
-        return forecast.values
-
-    # 6. Preparar séries temporais para previsão
+
+    # 5. Previsão das séries com Holt-Winters: ver forecast_series
+
+    # 6. Ajuste completo: preparar séries temporais e ajustar (ou escolher) o modelo de cada uma
     # O índice da série DEVE ser do tipo datetime
-    eff_series = pd.Series(df['Eficiencia_kg_h'].values, index=df['Mes_dt'])
-    hours_series = pd.Series(df['Horas_Operacionais'].values, index=df['Mes_dt'])
-
-    eff_forecast = forecast_series(eff_series)
-    hours_forecast = forecast_series(hours_series)
-
-    # 7. Gerar dados de previsão mês a mês
-    forecast_data = []
-    for i in range(12):
-        next_month_dt = start_forecast + pd.DateOffset(months=i)
-        next_month_str = next_month_dt.strftime('%Y-%m')
-        eff = eff_forecast[i]
-        hours = hours_forecast[i]
-        prod = round(eff * hours, 2)
-        residuo = round(prod * 0.10, 2)
-        lower = round(prod * 0.95, 2)
-        upper = round(prod * 1.05, 2)
-        forecast_data.append({
-            'Mes': next_month_str,
-            'Mes_dt': next_month_dt,
-            'Eficiencia_kg_h': round(eff, 2),
-            'Horas_Operacionais': round(hours, 2),
-            'Producao_Total_kg': prod,
-            'Residuo_kg': residuo,
-            'Producao_Minima_Esperada': lower,
-            'Producao_Maxima_Esperada': upper
-        })
-
-    # 8. Criar DataFrame de previsões
-    forecast_df = pd.DataFrame(forecast_data)
-
-    # 9. Combinar dados originais + previsões
-    # Selecionamos apenas as colunas originais para concatenar
-    original_cols_for_concat = df[['Mes', 'Producao_Total_kg', 'Eficiencia_kg_h', 'Horas_Operacionais', 'Mes_dt']]
-    combined_df = pd.concat([original_cols_for_concat, forecast_df], ignore_index=True)
-
-    # 10. Salvar como Excel
-    base = os.path.splitext(os.path.basename(input_path))[0]
-    out_name = f"{base}_com_previsao.xlsx"
-    out_path = os.path.join(output_dir, out_name)
-
-    # Remove a coluna de data auxiliar antes de salvar
-    with pd.ExcelWriter(out_path, engine='openpyxl') as writer:
-        combined_df.drop(columns=['Mes_dt']).to_excel(writer, sheet_name='Dados_Completos', index=False)
-        forecast_df.drop(columns=['Mes_dt']).to_excel(writer, sheet_name='Previsoes_12m', index=False)
-
-    # --- 11. GERAÇÃO DE GRÁFICOS (NOVA SEÇÃO) ---
-    fig_paths = []
-    plt.style.use('seaborn-v0_8-whitegrid') # Estilo visual dos gráficos
-
-    # Gráfico 1: Produção Histórica vs. Previsão
-    plt.figure(figsize=(14, 9))
-    # Plota os dados históricos (até o último ponto dos dados originais)
-    plt.plot(combined_df['Mes_dt'][:len(df)], combined_df['Producao_Total_kg'][:len(df)], marker='o', linestyle='-', label='Produção Histórica')
-    # Plota a previsão (começando do último ponto histórico para criar uma linha contínua)
-    plt.plot(combined_df['Mes_dt'][len(df)-1:], combined_df['Producao_Total_kg'][len(df)-1:], marker='o', linestyle='--', label='Produção Prevista')
-    plt.title('Produção Total: Histórico vs. Previsão (12 Meses)', fontsize=22)
-    plt.ylabel('Produção (kg)', fontsize=22)
-    plt.xlabel('Mês', fontsize=22)
-    plt.xticks(rotation=45, fontsize=22)
-    plt.yticks(fontsize=22)
-    plt.legend(fontsize=22)
-    plt.tight_layout()
-    fig1_path = os.path.join(output_dir, f"{base}_grafico_producao.png")
-    plt.savefig(fig1_path)
-    fig_paths.append(fig1_path)
-    plt.close()
-
-    # Gráfico 2: Previsão de Eficiência
-    plt.figure(figsize=(14, 9))
-    plt.plot(forecast_df['Mes_dt'], forecast_df['Eficiencia_kg_h'], marker='o', color='green')
-    plt.title('Previsão de Eficiência (12 Meses)', fontsize=22)
-    plt.ylabel('Eficiência (kg/h)', fontsize=22)
-    plt.xlabel('Mês', fontsize=22)
-    plt.xticks(rotation=45, fontsize=22)
-    plt.yticks(fontsize=22)
-    plt.tight_layout()
-    fig2_path = os.path.join(output_dir, f"{base}_grafico_eficiencia.png")
-    plt.savefig(fig2_path)
-    fig_paths.append(fig2_path)
-    plt.close()
-
-    # Gráfico 3: Previsão de Horas Operacionais
-    plt.figure(figsize=(14, 9))
-    plt.plot(forecast_df['Mes_dt'], forecast_df['Horas_Operacionais'], marker='o', color='purple')
-    plt.title('Previsão de Horas Operacionais (12 Meses)', fontsize=22)
-    plt.ylabel('Horas', fontsize=22)
-    plt.xlabel('Mês', fontsize=22)
-    plt.xticks(rotation=45, fontsize=22)
-    plt.yticks(fontsize=22)
-
-    plt.tight_layout()
-    fig3_path = os.path.join(output_dir, f"{base}_grafico_horas.png")
-    plt.savefig(fig3_path)
-    fig_paths.append(fig3_path)
-    plt.close()
-
-    print(f"Arquivo com previsões salvo em: {out_path}")
-    print(f"Gráficos salvos: {fig_paths}")
-
-    # --- 12. RETORNO CORRIGIDO ---
-    # Agora retorna o caminho do Excel e a LISTA com os 3 caminhos dos gráficos.
+    report('modelagem', 20)
+    if model_state is None:
+        series_by_name = {name: pd.Series(df[col].values, index=df['Mes_dt']) for name, col in STATE_SERIES.items()}
+        if selector is None:
+            fitted = {name: fit_series(series) for name, series in series_by_name.items()}
+        else:
+            fitted = selector.select(series_by_name, warm=previous[0]['series'] if previous else None)
+            logger.info('Modelos escolhidos', extra={'dataset': base,
+                                                      'models': {name: state['model'] for name, state in fitted.items()}})
+        model_state = new_state(fitted, params, last_date)
+    if states is not None:
+        states.save(base, model_state, df)
+
+    eff_forecast = forecast_from_state(model_state['series']['eff'], periods)
+    hours_forecast = forecast_from_state(model_state['series']['hours'], periods)
+    # Faixa esperada da produção: quantis da simulação com os erros do ajuste
+    lower_bound, upper_bound = intervals.production(model_state['series']['eff'],
+                                                    model_state['series']['hours'], periods)
+
+    # 7. Montar a tabela de previsões coluna a coluna (ver forecast_frame)
+    clock.mark('previsao')
+    forecast_df = forecast_frame(last_date, eff_forecast, hours_forecast, lower_bound, upper_bound)
+
+    # 8. Combinar dados originais + previsões (só as colunas originais do histórico)
+    combined_df = combine_frames(df, forecast_df)
+
+    # 9. Salvar os DataFrames em Parquet; o Excel só é gerado no download
+    # (ver ml._frames.ensure_workbook)
+    report('dados', 50)
+    save_frames(out_path, combined_df, forecast_df)
+    # O estado do ajuste fica com o resultado: os cenários reaproveitam o modelo sem reajustar
+    save_result_state(out_path, model_state)
+
+    # --- 10. GRÁFICOS ---
+    # Renderizados sob demanda na primeira requisição a /plots (ver ml._plots)
+
+    # 10.1 Guardar no cache os DataFrames de resultado
+    if key is not None:
+        clock.mark('cache_gravacao')
+        files = {CACHED_FRAMES[name]: path for name, path in frame_paths(out_path).items()}
+        files[CACHED_STATE] = result_state_path(out_path)
+        cache.put(key, files)
+
+    report('concluido', 100)
+    logger.info('Resultados com previsões salvos', extra={'output': out_path})
+
+    # --- 11. RETORNO CORRIGIDO ---
+    # Retorna o caminho do Excel e a LISTA com os 3 caminhos dos gráficos
+    # (ambos gerados sob demanda a partir dos Parquet).
     return out_path, fig_paths
\ No newline at end of file
@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+import cProfile
+from contextlib import contextmanager
+
+# pyinstrument é opcional: sem ele o perfil de requisições lentas usa o cProfile
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+# Limites (segundos) dos histogramas de duração
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+
+# Intervalo mínimo entre gravações do buffer de um processo no SQLite
+DEFAULT_FLUSH_SECONDS = 1.0
+
+
+def _format_labels(labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{k}="{escape(v)}"' for k, v in sorted(labels.items()))
+
+
+def _format_le(le):
+    return '+Inf' if le == float('inf') else repr(float(le))
+
+
+class Metrics:
+    """
+    Contadores e histogramas no formato do Prometheus, somados entre
+    processos: cada processo (servidor web ou worker da fila de jobs)
+    acumula as observações em memória e as grava periodicamente em um
+    SQLite compartilhado; `render` lê o total de todos eles.
+
+    O objeto enviado para outros processos leva só o caminho e a
+    configuração; o buffer recomeça vazio em cada processo. Como a
+    gravação só acontece junto de uma observação, processos que podem
+    ficar ociosos usam `start_flusher`.
+    """
+
+    def __init__(self, db_path, flush_seconds=DEFAULT_FLUSH_SECONDS, buckets=DEFAULT_BUCKETS):
+        self.db_path = db_path
+        self.flush_seconds = flush_seconds
+        self.buckets = tuple(buckets)
+        self._init_buffer()
+
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS types (name TEXT PRIMARY KEY, type TEXT NOT NULL)')
+            conn.execute(
+                '''CREATE TABLE IF NOT EXISTS samples (
+                    name TEXT NOT NULL,
+                    labels TEXT NOT NULL,
+                    le REAL NOT NULL DEFAULT 0,
+                    value REAL NOT NULL,
+                    PRIMARY KEY (name, labels, le)
+                )'''
+            )
+
+    def _init_buffer(self):
+        self._lock = threading.Lock()
+        self._types = {}
+        self._samples = {}
+        self._last_flush = time.monotonic()
+
+    def __getstate__(self):
+        return {'db_path': self.db_path, 'flush_seconds': self.flush_seconds, 'buckets': self.buckets}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_buffer()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _add(self, name, labels, amount, le=0.0):
+        key = (name, labels, le)
+        self._samples[key] = self._samples.get(key, 0.0) + amount
+
+    def inc(self, name, amount=1, **labels):
+        """Incrementa o contador `name` (com os rótulos informados)."""
+        with self._lock:
+            self._types.setdefault(name, 'counter')
+            self._add(name, _format_labels(labels), amount)
+        self._maybe_flush()
+
+    def observe(self, name, value, **labels):
+        """Registra `value` no histograma `name`."""
+        label_str = _format_labels(labels)
+        with self._lock:
+            self._types.setdefault(name, 'histogram')
+            # Todos os limites são gravados (mesmo com 0) para o histograma ficar completo
+            for le in self.buckets:
+                self._add(f'{name}_bucket', label_str, 1 if value <= le else 0, le)
+            self._add(f'{name}_sum', label_str, value)
+            self._add(f'{name}_count', label_str, 1)
+        self._maybe_flush()
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Mede a duração do bloco no histograma `name` (segundos)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Soma o buffer deste processo ao SQLite compartilhado."""
+        with self._lock:
+            types, samples = self._types, self._samples
+            self._types, self._samples = {}, {}
+            self._last_flush = time.monotonic()
+        if not samples:
+            return
+        with self._connect() as conn:
+            conn.executemany('INSERT OR IGNORE INTO types (name, type) VALUES (?, ?)', types.items())
+            conn.executemany(
+                '''INSERT INTO samples (name, labels, le, value) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (name, labels, le) DO UPDATE SET value = value + excluded.value''',
+                [(name, labels, le, value) for (name, labels, le), value in samples.items()],
+            )
+
+    def _start_flush_thread(self):
+        def loop():
+            while True:
+                time.sleep(self.flush_seconds)
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception('Falha ao gravar as métricas')
+
+        thread = threading.Thread(target=loop, name='metrics-flusher', daemon=True)
+        thread.start()
+        return thread
+
+    def _after_fork(self):
+        # O buffer herdado é do processo pai (que o grava) e o lock pode ter
+        # sido copiado preso por outra thread: recomeça vazio, com a thread
+        self._init_buffer()
+        self._start_flush_thread()
+
+    def start_flusher(self):
+        """
+        Grava o buffer a cada `flush_seconds` em uma thread em segundo
+        plano e ao encerrar o processo (atexit), para que as últimas
+        observações de um processo ocioso ou encerrado não se percam.
+        Processos criados por fork depois da chamada (ex.: workers do
+        gunicorn com --preload) recomeçam o buffer e têm a sua thread.
+        """
+        atexit.register(self.flush)
+        os.register_at_fork(after_in_child=self._after_fork)
+        return self._start_flush_thread()
+
+    def render(self, extra=None):
+        """
+        Texto no formato de exposição do Prometheus com o total de todos os
+        processos. `extra` ({nome: (tipo, valor)}) acrescenta valores lidos
+        na hora, como o tamanho da fila.
+        """
+        self.flush()
+        with self._connect() as conn:
+            types = conn.execute('SELECT name, type FROM types ORDER BY name').fetchall()
+            samples = conn.execute('SELECT name, labels, le, value FROM samples ORDER BY labels, name, le').fetchall()
+
+        lines = []
+        for base, kind in types:
+            lines.append(f'# TYPE {base} {kind}')
+            names = {f'{base}_bucket', f'{base}_sum', f'{base}_count'} if kind == 'histogram' else {base}
+            for name, labels, le, value in samples:
+                if name not in names:
+                    continue
+                if name.endswith('_bucket'):
+                    labels = ','.join(filter(None, [labels, f'le="{_format_le(le)}"']))
+                lines.append(f'{name}{{{labels}}} {value:g}' if labels else f'{name} {value:g}')
+        for name, (kind, value) in sorted((extra or {}).items()):
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+class StageClock:
+    """
+    Mede a duração de etapas consecutivas: `mark(etapa)` encerra a etapa
+    anterior (registrando-a no histograma `name` com o rótulo `stage`) e
+    inicia a próxima. Sem `metrics` não faz nada.
+    """
+
+    def __init__(self, metrics, name, **labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self._stage = None
+        self._start = None
+
+    def mark(self, stage):
+        if self.metrics is None:
+            return
+        now = time.perf_counter()
+        if self._stage is not None:
+            self.metrics.observe(self.name, now - self._start, stage=self._stage, **self.labels)
+        self._stage, self._start = stage, now
+
+
+class SlowRequestProfiler:
+    """
+    Perfil opcional por requisição: cada requisição roda com o profiler
+    ligado e o resultado só é gravado em `dump_dir` quando ela demora mais
+    que `threshold_ms` (`.prof` do cProfile, ou `.html` do pyinstrument se
+    ele estiver instalado e `use_pyinstrument` for verdadeiro).
+    """
+
+    def __init__(self, dump_dir, threshold_ms, use_pyinstrument=False):
+        self.dump_dir = dump_dir
+        self.threshold_ms = threshold_ms
+        self.use_pyinstrument = use_pyinstrument and pyinstrument is not None
+        os.makedirs(dump_dir, exist_ok=True)
+
+    def start(self):
+        """Liga o profiler e retorna o objeto a passar para `stop`, ou None."""
+        try:
+            if self.use_pyinstrument:
+                profiler = pyinstrument.Profiler()
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+        except (RuntimeError, ValueError):
+            # Outro profiler já ativo (ex.: requisições simultâneas)
+            return None
+        return profiler
+
+    def stop(self, profiler, name, elapsed_ms):
+        """Desliga o profiler e grava o perfil se a requisição foi lenta."""
+        if profiler is None:
+            return None
+        if self.use_pyinstrument:
+            profiler.stop()
+        else:
+            profiler.disable()
+        if elapsed_ms < self.threshold_ms:
+            return None
+
+        stem = os.path.join(self.dump_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{name}_{int(elapsed_ms)}ms")
+        if self.use_pyinstrument:
+            path = f'{stem}.html'
+            with open(path, 'w') as f:
+                f.write(profiler.output_html())
+        else:
+            path = f'{stem}.prof'
+            profiler.dump_stats(path)
+        return path
+
+
+# Atributos padrão de um LogRecord; o resto veio de `extra` e vira campo do log
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Logs estruturados: os campos passados em `extra` saem como pares
+    chave=valor após a mensagem ou, com `json_lines`, um objeto JSON por
+    linha.
+    """
+
+    def __init__(self, json_lines=False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+        if self.json_lines:
+            entry = {'ts': self.formatTime(record), 'level': record.levelname, 'logger': record.name,
+                     'msg': record.getMessage(), **fields}
+            if record.exc_info:
+                entry['exc'] = self.formatException(record.exc_info)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        pairs = ' '.join(f'{k}={json.dumps(v, ensure_ascii=False, default=str)}' for k, v in fields.items())
+        line = f'{self.formatTime(record)} {record.levelname} {record.name}: {record.getMessage()}'
+        if pairs:
+            line = f'{line} {pairs}'
+        if record.exc_info:
+            line = f'{line}\n{self.formatException(record.exc_info)}'
+        return line
+
+
+def configure_logging(level='INFO', json_lines=False):
+    """Configura o logger raiz com o StructuredFormatter."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter(json_lines))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
@@ -0,0 +1,110 @@
+import io
+import threading
+
+# Tipos de gráfico e o sufixo usado no nome do arquivo (`<base>_grafico_<tipo>.png`)
+CHART_KINDS = ['producao', 'eficiencia', 'horas']
+
+FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+# Tamanho padrão (polegadas) e resolução padrão
+DEFAULT_SIZE = (14, 9)
+DEFAULT_DPI = 100
+
+# Tamanhos e resoluções aceitos pela rota /plots: os valores pedidos vão
+# para o mais próximo, então cada gráfico tem poucas variantes no cache
+SIZES = tuple(range(2, 13)) + (14, 16, 20, 24, 30)
+DPIS = (50, 72, 100, 150, 200, 300)
+
+# Pixels máximos de um gráfico (largura × altura × dpi²): acima disso a
+# resolução é reduzida, o que limita o tempo e a memória de cada render
+MAX_PIXELS = 12_000_000
+
+# Fonte usada no tamanho padrão; acompanha a largura em tamanhos menores
+BASE_FONT_SIZE = 22
+
+# O Matplotlib não é seguro entre threads (caches de fontes e de texto são
+# globais): com o servidor em threads, um gráfico é desenhado por vez em
+# cada processo. Os gráficos ficam no BytesCache, então isso é raro.
+_RENDER_LOCK = threading.Lock()
+
+
+def _style_axes(ax):
+    # Equivalente ao estilo 'seaborn-v0_8-whitegrid' aplicado só a este
+    # eixo, sem alterar o rcParams global (que não é seguro entre threads).
+    ax.set_facecolor('white')
+    ax.grid(True, color='0.8', linestyle='-', linewidth=1)
+    ax.set_axisbelow(True)
+    ax.tick_params(length=0)
+    for spine in ax.spines.values():
+        spine.set_color('0.8')
+
+
+def _nearest(value, choices):
+    return min(choices, key=lambda choice: (abs(choice - value), choice))
+
+
+def chart_size(width, height, dpi):
+    """
+    Ajusta largura, altura (polegadas) e dpi pedidos aos valores aceitos
+    (SIZES, DPIS), com a maior resolução que não passa de MAX_PIXELS.
+    Retorna (largura, altura, dpi).
+    """
+    width, height = _nearest(width, SIZES), _nearest(height, SIZES)
+    allowed = [choice for choice in DPIS if width * height * choice ** 2 <= MAX_PIXELS] or DPIS[:1]
+    return width, height, _nearest(dpi, allowed)
+
+
+def render_chart(combined_df, forecast_df, kind, width=DEFAULT_SIZE[0], height=DEFAULT_SIZE[1],
+                 dpi=DEFAULT_DPI, fmt='png'):
+    """
+    Desenha um gráfico do resultado com a API orientada a objetos do
+    Matplotlib (Figure + FigureCanvasAgg, sem pyplot) e retorna os bytes
+    no formato `fmt` ('png' ou 'svg'). Pode ser chamada de várias threads.
+    """
+    with _RENDER_LOCK:
+        return _render_chart(combined_df, forecast_df, kind, width, height, dpi, fmt)
+
+
+def _render_chart(combined_df, forecast_df, kind, width, height, dpi, fmt):
+    # O Matplotlib é importado só no primeiro gráfico (ver ml._preload)
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(width, height), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    _style_axes(ax)
+    fontsize = BASE_FONT_SIZE * width / DEFAULT_SIZE[0]
+
+    if kind == 'producao':
+        # Gráfico 1: Produção Histórica vs. Previsão
+        n_hist = len(combined_df) - len(forecast_df)
+        dates = combined_df['Mes_dt'].to_numpy()
+        prod = combined_df['Producao_Total_kg'].to_numpy()
+        # Histórico até o último ponto original; a previsão começa nele para a linha ser contínua
+        ax.plot(dates[:n_hist], prod[:n_hist], marker='o', linestyle='-', label='Produção Histórica')
+        ax.plot(dates[n_hist - 1:], prod[n_hist - 1:], marker='o', linestyle='--', label='Produção Prevista')
+        ax.set_title(f'Produção Total: Histórico vs. Previsão ({len(forecast_df)} Meses)', fontsize=fontsize)
+        ax.set_ylabel('Produção (kg)', fontsize=fontsize)
+        ax.legend(fontsize=fontsize)
+    elif kind == 'eficiencia':
+        # Gráfico 2: Previsão de Eficiência
+        ax.plot(forecast_df['Mes_dt'].to_numpy(), forecast_df['Eficiencia_kg_h'].to_numpy(), marker='o', color='green')
+        ax.set_title(f'Previsão de Eficiência ({len(forecast_df)} Meses)', fontsize=fontsize)
+        ax.set_ylabel('Eficiência (kg/h)', fontsize=fontsize)
+    elif kind == 'horas':
+        # Gráfico 3: Previsão de Horas Operacionais
+        ax.plot(forecast_df['Mes_dt'].to_numpy(), forecast_df['Horas_Operacionais'].to_numpy(), marker='o', color='purple')
+        ax.set_title(f'Previsão de Horas Operacionais ({len(forecast_df)} Meses)', fontsize=fontsize)
+        ax.set_ylabel('Horas', fontsize=fontsize)
+    else:
+        raise ValueError(f'Tipo de gráfico desconhecido: {kind}')
+
+    ax.set_xlabel('Mês', fontsize=fontsize)
+    ax.tick_params(axis='x', labelrotation=45, labelsize=fontsize)
+    ax.tick_params(axis='y', labelsize=fontsize)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt)
+    return buffer.getvalue()
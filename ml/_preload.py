@@ -0,0 +1,55 @@
+import time
+import logging
+import importlib
+
+logger = logging.getLogger(__name__)
+
+# Dependências pesadas importadas só no primeiro uso (ajuste, gráfico, planilha)
+HEAVY_MODULES = (
+    'statsmodels.tsa.holtwinters',
+    'matplotlib.figure',
+    'matplotlib.backends.backend_agg',
+    'openpyxl',
+)
+
+
+def _warm_up():
+    # Um ajuste e um gráfico mínimos carregam o que os módulos só importam
+    # na primeira chamada (otimizadores do scipy, fontes do Matplotlib)
+    import numpy as np
+    import pandas as pd
+    from ml._select import fit_candidate
+    from ml._plots import render_chart
+
+    months = pd.date_range('2000-01-01', periods=12, freq='MS')
+    values = 100 + np.arange(12, dtype='float64') + np.tile([1.0, -1.0], 6)
+    fit_candidate(pd.Series(values, index=months), 'holt')
+
+    frame = pd.DataFrame({'Mes_dt': months, 'Producao_Total_kg': values,
+                          'Eficiencia_kg_h': values, 'Horas_Operacionais': values})
+    render_chart(frame, frame.iloc[6:], 'producao', width=2, height=2, dpi=30)
+
+
+def preload(modules=HEAVY_MODULES, warm_up=True):
+    """
+    Importa agora as dependências que o app carrega sob demanda. Usado por
+    servidores que fazem fork dos workers a partir de um processo já
+    carregado (ex.: gunicorn --preload): os módulos ficam compartilhados
+    entre os processos (copy-on-write) em vez de importados em cada um.
+    O pool da fila de jobs com 'forkserver' não herda esses módulos: o
+    app passa HEAVY_MODULES para o JobQueue (`preload_modules`), que o
+    servidor de fork importa antes de criar os processos do pool.
+
+    Retorna {módulo: segundos}, com o aquecimento em 'warm_up'.
+    """
+    timings = {}
+    for name in modules:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = time.perf_counter() - start
+    if warm_up:
+        start = time.perf_counter()
+        _warm_up()
+        timings['warm_up'] = time.perf_counter() - start
+    logger.info('Dependências pré-carregadas', extra={'seconds': round(sum(timings.values()), 3)})
+    return timings
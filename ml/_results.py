@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Limites padrão: tamanho total, idade desde o último uso e intervalo entre varreduras
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 3600
+DEFAULT_SWEEP_SECONDS = 300
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except FileNotFoundError:
+                pass
+    return total
+
+
+class ResultStore:
+    """
+    Resultados do processamento por usuário: cada upload recebe um id
+    único e uma pasta `<raiz>/<namespace>/<id>` com o arquivo enviado e
+    tudo o que o processamento gerar, então nomes de arquivo iguais nunca
+    se sobrescrevem. Um índice SQLite liga o id ao namespace (a sessão do
+    usuário) e aos arquivos do resultado; as rotas procuram os resultados
+    por ele, nunca pelo nome do arquivo.
+
+    A varredura (`sweep`, ou periodicamente em segundo plano com
+    `start_sweeper`) remove os resultados sem uso há mais que
+    `max_age_seconds` e depois os menos usados até o total caber em
+    `max_bytes`. Com `states` (ml._state.ModelStateStore), quando o
+    último resultado de um namespace é removido, os estados incrementais
+    dos conjuntos desse namespace também são. O objeto só guarda caminhos
+    e limites, então pode ser enviado para os processos da fila de jobs.
+    """
+
+    def __init__(self, root_dir, max_bytes=DEFAULT_MAX_BYTES, max_age_seconds=DEFAULT_MAX_AGE_SECONDS,
+                 sweep_seconds=DEFAULT_SWEEP_SECONDS, states=None):
+        self.root_dir = root_dir
+        self.states = states
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.sweep_seconds = sweep_seconds
+        self.db_path = os.path.join(root_dir, 'index.sqlite3')
+
+        os.makedirs(root_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                '''CREATE TABLE IF NOT EXISTS results (
+                    id TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    files TEXT,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )'''
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _result_dir(self, namespace, result_id):
+        return os.path.join(self.root_dir, namespace, result_id)
+
+    def create(self, namespace, name):
+        """
+        Reserva um resultado novo para o arquivo `name` do usuário
+        `namespace` e retorna (id, pasta). O resultado só fica visível em
+        `lookup` depois de `complete`.
+        """
+        result_id = uuid.uuid4().hex
+        result_dir = self._result_dir(namespace, result_id)
+        os.makedirs(result_dir)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO results (id, namespace, name, created_at, last_used) VALUES (?, ?, ?, ?, ?)',
+                (result_id, namespace, name, now, now),
+            )
+        return result_id, result_dir
+
+    def complete(self, namespace, result_id, files):
+        """
+        Registra os arquivos do resultado (`files`: dicionário serializável
+        em JSON com nomes relativos à pasta). Chamadas repetidas mantêm o
+        primeiro registro.
+        """
+        size = _dir_size(self._result_dir(namespace, result_id))
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE results SET files = ?, size = ?, last_used = ? '
+                'WHERE id = ? AND namespace = ? AND files IS NULL',
+                (json.dumps(files), size, time.time(), result_id, namespace),
+            )
+
+    def discard(self, namespace, result_id):
+        """Remove um resultado que não vai ser processado (ex.: fila cheia), com a pasta."""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM results WHERE id = ? AND namespace = ?', (result_id, namespace))
+        shutil.rmtree(self._result_dir(namespace, result_id), ignore_errors=True)
+
+    def lookup(self, namespace, result_id):
+        """
+        Retorna o resultado concluído `result_id` do usuário `namespace`
+        ({id, name, dir, files}), marcando-o como usado agora, ou None.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT id, name, files FROM results WHERE id = ? AND namespace = ? AND files IS NOT NULL',
+                (result_id, namespace),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE results SET last_used = ? WHERE id = ?', (time.time(), result_id))
+
+        result_dir = self._result_dir(namespace, result_id)
+        if not os.path.isdir(result_dir):
+            return None
+        return {'id': row['id'], 'name': row['name'], 'dir': result_dir, 'files': json.loads(row['files'])}
+
+    def sweep(self, now=None):
+        """
+        Remove os resultados vencidos (sem uso há mais que max_age_seconds)
+        e, se o total ainda passar de max_bytes, os menos usados. Os
+        tamanhos são recalculados a cada varredura, porque Excel e
+        gráficos são gerados depois, sob demanda. Retorna quantos
+        resultados foram removidos.
+        """
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            rows = conn.execute('SELECT id, namespace, last_used FROM results ORDER BY last_used DESC').fetchall()
+
+        sizes = {row['id']: _dir_size(self._result_dir(row['namespace'], row['id'])) for row in rows}
+        expired = [row for row in rows if now - row['last_used'] > self.max_age_seconds]
+        kept = [row for row in rows if now - row['last_used'] <= self.max_age_seconds]
+        total = sum(sizes[row['id']] for row in kept)
+        while kept and total > self.max_bytes:
+            row = kept.pop()
+            total -= sizes[row['id']]
+            expired.append(row)
+
+        with self._connect() as conn:
+            conn.executemany('UPDATE results SET size = ? WHERE id = ?',
+                             [(sizes[row['id']], row['id']) for row in kept])
+            conn.executemany('DELETE FROM results WHERE id = ?', [(row['id'],) for row in expired])
+            # Namespaces que ficaram sem nenhum resultado (nem em processamento)
+            emptied = [name for name in {row['namespace'] for row in expired}
+                       if conn.execute('SELECT 1 FROM results WHERE namespace = ? LIMIT 1', (name,)).fetchone() is None]
+        for row in expired:
+            shutil.rmtree(self._result_dir(row['namespace'], row['id']), ignore_errors=True)
+            try:
+                # Remove a pasta do usuário quando ela fica vazia
+                os.rmdir(os.path.join(self.root_dir, row['namespace']))
+            except OSError:
+                pass
+        if self.states is not None:
+            for name in emptied:
+                self.states.remove_namespace(name)
+        return len(expired)
+
+    def start_sweeper(self):
+        """Roda `sweep` a cada `sweep_seconds` em uma thread em segundo plano."""
+        def loop():
+            while True:
+                try:
+                    removed = self.sweep()
+                    if removed:
+                        logger.info('Resultados antigos removidos', extra={'removed': removed})
+                except Exception:
+                    logger.exception('Falha na limpeza de resultados')
+                time.sleep(self.sweep_seconds)
+
+        thread = threading.Thread(target=loop, name='result-sweeper', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+        return {'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes,
+                'max_age_seconds': self.max_age_seconds}
@@ -0,0 +1,151 @@
+import os
+import numpy as np
+import pandas as pd
+
+from ml._frames import frame_paths, load_frames, write_atomic
+
+# Agregações servidas ao dashboard e a frequência do pandas de cada uma
+GRANULARITIES = {'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+
+# Pontos por série enviados ao navegador: padrão e limites aceitos em `points`
+DEFAULT_MAX_POINTS = 500
+POINT_LIMITS = (10, 5000)
+
+# Séries dos gráficos, usadas para escolher os pontos mantidos na redução
+CHART_SERIES = ['production', 'efficiency', 'hours', 'waste']
+
+# Como cada série é agregada em trimestre/ano: totais somam, eficiência é a média
+_AGGREGATIONS = {'production': 'sum', 'efficiency': 'mean', 'hours': 'sum', 'waste': 'sum'}
+_BOUNDS = ['min_expected', 'max_expected']
+
+
+def rollup_paths(workbook_path):
+    """Caminhos dos Parquet de agregação de um resultado (`<nome>.rollup-<granularidade>.parquet`)."""
+    stem = os.path.splitext(workbook_path)[0]
+    return {granularity: f"{stem}.rollup-{granularity}.parquet" for granularity in GRANULARITIES}
+
+
+def _monthly(combined_df, forecast_df):
+    # O histórico são as linhas antes das previsões, qualquer que seja o tamanho
+    n = len(combined_df)
+    n_history = n - len(forecast_df)
+    dates = pd.DatetimeIndex(combined_df['Mes_dt'])
+    months = dates.strftime('%Y-%m')
+
+    def column(name):
+        if name not in combined_df.columns:
+            return np.full(n, np.nan)
+        return combined_df[name].to_numpy(dtype='float64')
+
+    production = column('Producao_Total_kg')
+    waste = column('Residuo_kg')
+    # O histórico não tem resíduo: usa a mesma regra das previsões (10% da produção)
+    waste = np.where(np.isnan(waste), production * 0.10, waste)
+    monthly = pd.DataFrame({
+        'months': months,
+        'start': months,
+        'end': months,
+        'production': production,
+        'efficiency': column('Eficiencia_kg_h'),
+        'hours': column('Horas_Operacionais'),
+        'waste': waste,
+        'min_expected': column('Producao_Minima_Esperada'),
+        'max_expected': column('Producao_Maxima_Esperada'),
+        'is_forecast': np.arange(n) >= n_history,
+    })
+    return monthly, dates
+
+
+def build_rollups(combined_df, forecast_df):
+    """
+    Séries do dashboard por mês, trimestre e ano, a partir dos DataFrames
+    do resultado. Produção, horas e resíduo somam no período e a eficiência
+    é a média; a faixa esperada só aparece em períodos inteiros de previsão
+    e `is_forecast` marca os períodos com pelo menos um mês previsto.
+    `start`/`end` (AAAA-MM) guardam o primeiro e o último mês do período.
+    """
+    monthly, dates = _monthly(combined_df, forecast_df)
+    rollups = {'month': monthly}
+    for granularity in ('quarter', 'year'):
+        periods = dates.to_period(GRANULARITIES[granularity])
+        grouped = monthly.groupby(periods, sort=True)
+        rollup = grouped.agg(start=('start', 'min'), end=('end', 'max'), is_forecast=('is_forecast', 'any'),
+                             **{name: (name, how) for name, how in _AGGREGATIONS.items()})
+        complete = grouped[_BOUNDS].count().eq(grouped.size(), axis=0)
+        rollup[_BOUNDS] = grouped[_BOUNDS].sum().where(complete)
+
+        index = rollup.index
+        if granularity == 'quarter':
+            labels = 'T' + index.quarter.astype(str) + '-' + index.year.astype(str)
+        else:
+            labels = index.year.astype(str)
+        rollup.insert(0, 'months', np.asarray(labels))
+        rollups[granularity] = rollup.reset_index(drop=True)[list(monthly.columns)]
+    return rollups
+
+
+def ensure_rollups(workbook_path):
+    """
+    Calcula as agregações de um resultado uma única vez e as grava em
+    Parquet ao lado dos DataFrames. São refeitas só quando os Parquet do
+    resultado são mais novos (reprocessamento na mesma pasta).
+    """
+    paths = rollup_paths(workbook_path)
+    source_mtime = os.stat(frame_paths(workbook_path)['combined']).st_mtime_ns
+    if all(os.path.exists(path) and os.stat(path).st_mtime_ns >= source_mtime for path in paths.values()):
+        return paths
+
+    rollups = build_rollups(*load_frames(workbook_path))
+    for granularity, path in paths.items():
+        write_atomic(path, lambda tmp_path: rollups[granularity].to_parquet(tmp_path, index=False))
+    return paths
+
+
+def load_rollup(workbook_path, granularity='month'):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularidade desconhecida: {granularity} (use {', '.join(GRANULARITIES)})")
+    return pd.read_parquet(ensure_rollups(workbook_path)[granularity])
+
+
+def lttb_indices(values, threshold):
+    """
+    Índices dos pontos mantidos pelo Largest-Triangle-Three-Buckets com
+    várias séries no mesmo eixo x: `values` tem formato (n_pontos,
+    n_series) e cada série é normalizada para [0, 1], então o ponto
+    escolhido em cada faixa é o que forma o maior triângulo somando todas
+    as séries. Mantém o primeiro e o último ponto e retorna no máximo
+    `threshold` índices, em ordem.
+    """
+    values = np.asarray(values, dtype='float64')
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    low, high = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+    span = np.where(high > low, high - low, 1.0)
+    y = np.nan_to_num((values - low) / span)
+    x = np.arange(n, dtype='float64')
+
+    # Limites das faixas: o primeiro e o último ponto ficam fora delas
+    edges = (np.floor(np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(int) + 1)
+    edges[-1] = n - 1
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        # Vértice c: média da faixa seguinte (ou o último ponto)
+        cx = x[end:next_end].mean()
+        cy = y[end:next_end].mean(axis=0)
+        area = np.abs((x[a] - cx) * (y[start:end] - y[a]) - (x[a] - x[start:end, None]) * (cy - y[a])).sum(axis=1)
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample(rollup, max_points):
+    """Reduz as linhas de uma agregação a no máximo `max_points`, com lttb_indices sobre CHART_SERIES."""
+    if len(rollup) <= max_points:
+        return rollup
+    return rollup.iloc[lttb_indices(rollup[CHART_SERIES].to_numpy(), max_points)]
@@ -0,0 +1,209 @@
+import os
+import json
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from ml._frames import frame_paths, result_state_path
+from ml._state import forecast_from_state
+from ml._intervals import BootstrapIntervals, CHUNK_VALUES
+
+# Ajustes aceitos em um cenário e o valor neutro de cada um:
+# variações em %, limites por mês e a fração da produção que vira resíduo
+SCENARIO_PARAMS = {
+    'efficiency_pct': 0.0,
+    'hours_pct': 0.0,
+    'efficiency_min': -np.inf,
+    'efficiency_max': np.inf,
+    'hours_min': -np.inf,
+    'hours_max': np.inf,
+    'waste_rate': 0.10,
+}
+
+# Cenários por requisição
+MAX_SCENARIOS = 200
+
+# Bases de cenário mantidas em memória por processo
+BASIS_CACHE_SIZE = 32
+
+
+def has_state(workbook_path):
+    return os.path.exists(result_state_path(workbook_path))
+
+
+@lru_cache(maxsize=BASIS_CACHE_SIZE)
+def _basis(workbook_path, version, paths, seed, level):
+    with open(result_state_path(workbook_path)) as f:
+        series = json.load(f)['series']
+    months = pd.read_parquet(frame_paths(workbook_path)['forecast'], columns=['Mes'])['Mes'].tolist()
+    periods = len(months)
+
+    intervals = BootstrapIntervals(paths=paths, seed=seed, level=level)
+    # Caminhos no último eixo (periods, paths): os quantis por mês ficam contíguos
+    eff_sims, hours_sims = (np.ascontiguousarray(sims.T)
+                            for sims in intervals.simulate(series['eff'], series['hours'], periods))
+    quantiles = [(1 - level) / 2, (1 + level) / 2]
+    lower, upper = np.quantile(eff_sims * hours_sims, quantiles, axis=-1)
+    basis = {
+        'months': months,
+        'eff': forecast_from_state(series['eff'], periods),
+        'hours': forecast_from_state(series['hours'], periods),
+        'eff_sims': eff_sims,
+        'hours_sims': hours_sims,
+        'lower': lower,
+        'upper': upper,
+        'quantiles': quantiles,
+    }
+    for values in basis.values():
+        if isinstance(values, np.ndarray):
+            values.setflags(write=False)
+    return basis
+
+
+def load_basis(workbook_path, intervals):
+    """
+    Base dos cenários de um resultado: previsões de eficiência e horas e
+    os caminhos simulados dos intervalos, refeitos a partir do estado
+    ajustado salvo com o resultado (sem reajustar modelos) e guardados em
+    memória por resultado, versão do estado salvo e configuração de
+    `intervals`. Os arrays são somente leitura, compartilhados entre threads.
+    """
+    version = os.stat(result_state_path(workbook_path)).st_mtime_ns
+    return _basis(workbook_path, version, intervals.paths, intervals.seed, intervals.level)
+
+
+def parse_scenarios(specs):
+    """
+    Valida uma lista de cenários ({'name': ..., ajuste: valor}, ver
+    SCENARIO_PARAMS) e retorna (nomes, {ajuste: array (n_cenários,)}),
+    com o valor neutro nos ajustes omitidos. Levanta ValueError para
+    cenários inválidos.
+    """
+    if not isinstance(specs, list) or not specs:
+        raise ValueError('Envie uma lista de cenários.')
+    if len(specs) > MAX_SCENARIOS:
+        raise ValueError(f'No máximo {MAX_SCENARIOS} cenários por requisição.')
+
+    names = []
+    columns = {param: np.empty(len(specs)) for param in SCENARIO_PARAMS}
+    for i, spec in enumerate(specs):
+        if not isinstance(spec, dict):
+            raise ValueError(f'Cenário {i + 1}: esperado um objeto.')
+        unknown = [key for key in spec if key != 'name' and key not in SCENARIO_PARAMS]
+        if unknown:
+            raise ValueError(f"Cenário {i + 1}: ajustes desconhecidos: {', '.join(unknown)}")
+        names.append(str(spec.get('name', f'cenario_{i + 1}')))
+        for param, default in SCENARIO_PARAMS.items():
+            value = spec.get(param, default)
+            if param in spec and (isinstance(value, bool) or not isinstance(value, (int, float))
+                                  or not np.isfinite(value)):
+                raise ValueError(f'Cenário {i + 1}: {param} deve ser um número.')
+            columns[param][i] = value
+
+    if np.any(columns['efficiency_pct'] <= -100) or np.any(columns['hours_pct'] <= -100):
+        raise ValueError('As variações devem ser maiores que -100%.')
+    if np.any(columns['efficiency_min'] > columns['efficiency_max']) or np.any(columns['hours_min'] > columns['hours_max']):
+        raise ValueError('O limite mínimo não pode ser maior que o máximo.')
+    if np.any((columns['waste_rate'] < 0) | (columns['waste_rate'] > 1)):
+        raise ValueError('waste_rate deve estar entre 0 e 1.')
+    return names, columns
+
+
+def _adjust(values, pct, low, high):
+    # values (..., periods); ajustes (n_cenários,) alinhados ao primeiro eixo
+    shape = (-1,) + (1,) * values.ndim
+    return np.clip(values[None] * (1 + pct / 100).reshape(shape), low.reshape(shape), high.reshape(shape))
+
+
+def evaluate(basis, columns):
+    """
+    Aplica os ajustes (ver parse_scenarios) às previsões e aos caminhos
+    simulados da base, todos os cenários de uma vez. Retorna arrays
+    (n_cenários, periods) de eficiência, horas, produção, resíduo e da
+    faixa esperada da produção (quantis dos caminhos ajustados).
+
+    Um fator positivo sai dos quantis (q(a·x) = a·q(x)): a variação em %
+    de uma série sem limites só escala a faixa. Os caminhos são avaliados
+    uma vez por combinação distinta dos ajustes restantes, e nenhuma vez
+    nos cenários sem limites, que usam os quantis da base.
+    """
+    eff = _adjust(basis['eff'], columns['efficiency_pct'], columns['efficiency_min'], columns['efficiency_max'])
+    hours = _adjust(basis['hours'], columns['hours_pct'], columns['hours_min'], columns['hours_max'])
+    production = eff * hours
+
+    factor = np.ones(len(production))
+    keys = []
+    for prefix in ('efficiency', 'hours'):
+        pct, low, high = (columns[f'{prefix}_{name}'] for name in ('pct', 'min', 'max'))
+        free = ~np.isfinite(low) & ~np.isfinite(high)
+        factor *= np.where(free, 1 + pct / 100, 1.0)
+        keys.append(np.where(free, 0.0, pct))
+        keys.extend([low, high])
+    unique, inverse = np.unique(np.column_stack(keys), axis=0, return_inverse=True)
+
+    periods, paths = basis['eff_sims'].shape
+    unique_lower = np.empty((len(unique), periods))
+    unique_upper = np.empty((len(unique), periods))
+    neutral = ~np.isfinite(unique[:, [1, 2, 4, 5]]).any(axis=1) & (unique[:, [0, 3]] == 0).all(axis=1)
+    unique_lower[neutral], unique_upper[neutral] = basis['lower'], basis['upper']
+
+    # Em blocos, para limitar a memória a CHUNK_VALUES valores simulados
+    pending = np.flatnonzero(~neutral)
+    step = max(1, CHUNK_VALUES // (paths * periods))
+    for start in range(0, len(pending), step):
+        rows = pending[start:start + step]
+        eff_pct, eff_min, eff_max, hours_pct, hours_min, hours_max = unique[rows].T
+        sims = (_adjust(basis['eff_sims'], eff_pct, eff_min, eff_max)
+                * _adjust(basis['hours_sims'], hours_pct, hours_min, hours_max))
+        unique_lower[rows], unique_upper[rows] = np.quantile(sims, basis['quantiles'], axis=-1)
+
+    inverse = inverse.ravel()
+    lower = factor[:, None] * unique_lower[inverse]
+    upper = factor[:, None] * unique_upper[inverse]
+
+    return {
+        'efficiency': eff,
+        'hours': hours,
+        'production': production,
+        'waste': production * columns['waste_rate'][:, None],
+        'min_expected': lower,
+        'max_expected': upper,
+    }
+
+
+def run_scenarios(workbook_path, intervals, specs):
+    """
+    Cenários "e se" sobre o resultado: cada cenário ajusta eficiência e
+    horas previstas (variação em %, limites mínimo/máximo por mês) e a
+    taxa de resíduo, e recebe as séries mensais recalculadas e os totais
+    do horizonte, comparados com a previsão original.
+    """
+    names, columns = parse_scenarios(specs)
+    basis = load_basis(workbook_path, intervals)
+    result = evaluate(basis, columns)
+
+    baseline_production = float((basis['eff'] * basis['hours']).sum())
+    baseline_waste = baseline_production * SCENARIO_PARAMS['waste_rate']
+    totals_production = result['production'].sum(axis=1)
+    totals_waste = result['waste'].sum(axis=1)
+
+    scenarios = []
+    for i, name in enumerate(names):
+        entry = {'name': name,
+                 'params': {param: float(values[i]) for param, values in columns.items()
+                            if values[i] != SCENARIO_PARAMS[param]}}
+        entry.update({field: np.round(values[i], 2).tolist() for field, values in result.items()})
+        entry['totals'] = {
+            'production': round(float(totals_production[i]), 2),
+            'waste': round(float(totals_waste[i]), 2),
+            'production_change_pct': round(float(totals_production[i] / baseline_production - 1) * 100, 2),
+            'waste_change_pct': round(float(totals_waste[i] / baseline_waste - 1) * 100, 2),
+        }
+        scenarios.append(entry)
+
+    return {
+        'months': basis['months'],
+        'baseline': {'production': round(baseline_production, 2), 'waste': round(baseline_waste, 2)},
+        'scenarios': scenarios,
+    }
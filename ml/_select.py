@@ -0,0 +1,276 @@
+import os
+import time
+import multiprocessing
+
+import numpy as np
+
+from ml._state import forecast_from_state
+
+# Modelos candidatos: nome -> argumentos do ExponentialSmoothing.
+# 'ingenuo' (repete o último mês) é a referência mínima e não usa o statsmodels.
+CANDIDATES = {
+    'ingenuo': None,
+    'holt': {'trend': 'add'},
+    'holt_amortecido': {'trend': 'add', 'damped_trend': True},
+    'holt_multiplicativo': {'trend': 'mul'},
+    'sazonal': {'trend': 'add', 'seasonal': 'add', 'seasonal_periods': 12},
+    'sazonal_amortecido': {'trend': 'add', 'damped_trend': True, 'seasonal': 'add', 'seasonal_periods': 12},
+}
+
+# Modelo usado quando a série é curta demais para a validação cruzada
+DEFAULT_MODEL = 'holt'
+
+# Validação cruzada com origem móvel: `CV_FOLDS` origens, cada uma
+# prevendo `CV_HORIZON` meses à frente do trecho de treino
+CV_FOLDS = 4
+CV_HORIZON = 3
+
+# Meses mínimos de treino por candidato (os sazonais precisam de 2 ciclos)
+MIN_TRAIN = {'ingenuo': 1, 'sazonal': 24, 'sazonal_amortecido': 24}
+DEFAULT_MIN_TRAIN = 6
+
+# Tempo máximo da seleção de modelos de um arquivo, em segundos
+DEFAULT_BUDGET_SECONDS = 30
+
+# Pool de processos da seleção: criado no primeiro uso dentro do processo
+# do job e reaproveitado pelos jobs seguintes desse processo (ver _get_pool)
+_pool = None
+_pool_key = None
+
+# Ordem dos parâmetros livres do statsmodels, usada no start_params
+_START_PARAM_ORDER = ['smoothing_level', 'smoothing_trend', 'smoothing_seasonal',
+                      'initial_level', 'initial_trend', 'damping_trend', 'initial_seasons']
+
+
+def _start_params(params, spec):
+    values = []
+    for name in _START_PARAM_ORDER:
+        if name == 'smoothing_seasonal' and not spec.get('seasonal'):
+            continue
+        if name == 'smoothing_trend' or name == 'initial_trend':
+            if not spec.get('trend'):
+                continue
+        if name == 'damping_trend' and not spec.get('damped_trend'):
+            continue
+        if name == 'initial_seasons':
+            if spec.get('seasonal'):
+                values.extend(float(v) for v in params[name])
+            continue
+        values.append(float(params[name]))
+    return values
+
+
+def fit_candidate(series, name, start_params=None):
+    """
+    Ajusta o candidato `name` a uma série mensal indexada por data e
+    retorna o estado final (ver ml._state.update_series), incluindo os
+    erros um passo à frente em `residuals` (usados nos intervalos de
+    previsão) e os parâmetros do statsmodels em `start_params` para o
+    próximo ajuste.
+    `start_params` de um ajuste anterior evita a busca inicial em grade.
+    """
+    # A frequência 'MS' significa "Month Start" (início do mês)
+    series = series.asfreq('MS')
+    spec = CANDIDATES[name]
+
+    if spec is None:
+        values = series.to_numpy(dtype='float64')
+        diffs = np.diff(values)
+        return {'model': name, 'trend_type': 'add', 'alpha': 1.0, 'beta': 0.0, 'phi': 1.0,
+                'level': float(values[-1]), 'trend': 0.0,
+                'sse': float(np.sum(diffs * diffs)), 'n': len(diffs), 'residuals': diffs.tolist()}
+
+    # O statsmodels (com o scipy) é importado só no primeiro ajuste (ver ml._preload)
+    from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+    model = ExponentialSmoothing(series, initialization_method='estimated', **spec)
+    fit = None
+    if start_params is not None:
+        try:
+            fit = model.fit(start_params=start_params)
+        except ValueError:
+            # Parâmetros de outra configuração (ex.: número de meses sazonais)
+            fit = None
+    if fit is None:
+        fit = model.fit()
+
+    params = fit.params
+    state = {
+        'model': name,
+        'trend_type': spec['trend'],
+        'alpha': float(params['smoothing_level']),
+        'beta': float(params['smoothing_trend']),
+        'phi': float(params['damping_trend']) if spec.get('damped_trend') else 1.0,
+        'level': float(fit.level.iloc[-1]),
+        'trend': float(fit.trend.iloc[-1]),
+        'sse': float(fit.sse),
+        'n': len(series),
+        'residuals': [float(v) for v in fit.resid],
+        'start_params': _start_params(params, spec),
+    }
+    if spec.get('seasonal'):
+        state['gamma'] = float(params['smoothing_seasonal'])
+        state['season'] = [float(v) for v in fit.season.iloc[-spec['seasonal_periods']:]]
+    return state
+
+
+def cv_score(series, name, folds=CV_FOLDS, horizon=CV_HORIZON, start_params=None):
+    """
+    Erro absoluto médio do candidato na validação cruzada com origem
+    móvel: para cada origem, ajusta no trecho anterior e prevê os
+    `horizon` meses seguintes. Retorna None se a série for curta demais.
+    """
+    n = len(series)
+    min_train = MIN_TRAIN.get(name, DEFAULT_MIN_TRAIN)
+    errors = []
+    for k in range(folds):
+        end = n - horizon - k
+        if end < min_train:
+            break
+        state = fit_candidate(series.iloc[:end], name, start_params)
+        forecast = forecast_from_state(state, horizon)
+        errors.append(np.abs(series.to_numpy(dtype='float64')[end:end + horizon] - forecast))
+    if not errors:
+        return None
+    return float(np.mean(np.concatenate(errors)))
+
+
+def _evaluate(series_name, series, name, folds, horizon, start_params):
+    # Pontua e ajusta o candidato na série inteira.
+    # Candidatos que não se aplicam à série (ex.: tendência multiplicativa com
+    # valores não positivos) ficam sem pontuação.
+    try:
+        score = cv_score(series, name, folds, horizon, start_params)
+        if score is None:
+            return series_name, name, None, None
+        return series_name, name, score, fit_candidate(series, name, start_params)
+    except (ValueError, np.linalg.LinAlgError):
+        return series_name, name, None, None
+
+
+def _get_pool(workers):
+    # Um pool por processo e número de workers; 'forkserver' evita herdar
+    # locks de threads do processo do job (ex.: gravação de métricas)
+    global _pool, _pool_key
+    key = (os.getpid(), workers)
+    if _pool is None or _pool_key != key:
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None
+        context = multiprocessing.get_context(method)
+        if method == 'forkserver':
+            context.set_forkserver_preload(['ml._select', 'statsmodels.tsa.holtwinters'])
+        _pool, _pool_key = context.Pool(workers), key
+    return _pool
+
+
+def _discard_pool():
+    # Interrompe os candidatos ainda em andamento; o próximo uso cria outro pool
+    global _pool, _pool_key
+    if _pool is not None:
+        _pool.terminate()
+    _pool, _pool_key = None, None
+
+
+class ModelSelector:
+    """
+    Seleção automática de modelo por série: cada candidato de CANDIDATES
+    é pontuado com validação cruzada de origem móvel e o de menor erro é
+    mantido. Os candidatos rodam em paralelo em um pool de `workers`
+    processos, criado uma vez por processo do job e reaproveitado entre
+    os jobs. Quando o tempo `budget_seconds` acaba, os candidatos que não
+    terminaram são descartados e o pool é encerrado (os processos param de
+    verdade; o próximo job cria outro). Com `workers` = 1 os candidatos
+    rodam no próprio processo do job, com o tempo verificado entre eles.
+    O modelo ingênuo é sempre avaliado, então sempre há um vencedor.
+
+    Uma seleção anterior (`warm`) define a ordem de avaliação (melhores
+    primeiro) e os parâmetros iniciais de cada candidato. O objeto só
+    guarda a configuração, então pode ser enviado para os processos da
+    fila de jobs.
+    """
+
+    def __init__(self, budget_seconds=DEFAULT_BUDGET_SECONDS, workers=None, candidates=None,
+                 folds=CV_FOLDS, horizon=CV_HORIZON):
+        self.budget_seconds = budget_seconds
+        self.workers = workers or os.cpu_count() or 1
+        self.candidates = list(candidates or CANDIDATES)
+        self.folds = folds
+        self.horizon = horizon
+
+    def params(self):
+        """Configuração que afeta o resultado (entra na chave do cache)."""
+        return {'candidates': self.candidates, 'folds': self.folds, 'horizon': self.horizon}
+
+    def _tasks(self, series_by_name, warm):
+        tasks = []
+        for series_name, series in series_by_name.items():
+            previous = (warm or {}).get(series_name, {}).get('candidates', {})
+
+            def rank(name):
+                score = previous.get(name, {}).get('score')
+                return (score is None, score if score is not None else 0.0)
+
+            for name in sorted(self.candidates, key=rank):
+                if CANDIDATES[name] is None:
+                    continue
+                start_params = previous.get(name, {}).get('start_params')
+                tasks.append((series_name, series, name, self.folds, self.horizon, start_params))
+        return tasks
+
+    def select(self, series_by_name, warm=None):
+        """
+        Escolhe e ajusta o melhor candidato de cada série de
+        `series_by_name` ({nome: série mensal}). `warm` é o resultado de
+        uma seleção anterior ({nome: estado}). Retorna {nome: estado do
+        vencedor}, com a pontuação de cada candidato em 'candidates'.
+        """
+        deadline = time.monotonic() + self.budget_seconds
+        results = {series_name: {} for series_name in series_by_name}
+
+        # Referência ingênua: rápida e avaliada sempre, mesmo sem tempo
+        if 'ingenuo' in self.candidates:
+            for series_name, series in series_by_name.items():
+                _, name, score, state = _evaluate(series_name, series, 'ingenuo', self.folds, self.horizon, None)
+                results[series_name][name] = (score, state)
+
+        tasks = self._tasks(series_by_name, warm)
+        if self.workers <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                if time.monotonic() >= deadline:
+                    break
+                series_name, name, score, state = _evaluate(*task)
+                results[series_name][name] = (score, state)
+        else:
+            pending = [_get_pool(self.workers).apply_async(_evaluate, task) for task in tasks]
+            try:
+                for result in pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        series_name, name, score, state = result.get(timeout=remaining)
+                    except multiprocessing.TimeoutError:
+                        break
+                    results[series_name][name] = (score, state)
+            finally:
+                # Fora do prazo (ou job interrompido): para os candidatos em andamento
+                if not all(result.ready() for result in pending):
+                    _discard_pool()
+
+        selected = {}
+        for series_name, series in series_by_name.items():
+            scored = {name: result for name, result in results[series_name].items() if result[0] is not None}
+            if scored:
+                winner = min(scored, key=lambda name: scored[name][0])
+                state = dict(scored[winner][1], score=scored[winner][0])
+            else:
+                # Série curta demais para validar: mantém o modelo padrão
+                state = dict(fit_candidate(series, DEFAULT_MODEL), score=None)
+
+            # Guarda pontuação e parâmetros de todos os candidatos para a próxima seleção
+            previous = (warm or {}).get(series_name, {}).get('candidates', {})
+            candidates = dict(previous)
+            for name, (score, candidate_state) in scored.items():
+                candidates[name] = {'score': score, 'start_params': candidate_state.get('start_params')}
+            state['candidates'] = candidates
+            selected[series_name] = state
+        return selected
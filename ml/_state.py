@@ -0,0 +1,253 @@
+import os
+import json
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from ml._frames import write_atomic
+
+# Incrementar quando o formato do estado mudar; estados antigos forçam um reajuste
+STATE_VERSION = 2
+
+# Séries modeladas e a coluna de cada uma
+STATE_SERIES = {'eff': 'Eficiencia_kg_h', 'hours': 'Horas_Operacionais'}
+
+# Colunas do histórico mensal guardado junto com o estado
+VALUE_COLUMNS = ['Producao_Total_kg', 'Eficiencia_kg_h', 'Horas_Operacionais']
+HISTORY_COLUMNS = ['Mes'] + VALUE_COLUMNS + ['Mes_dt']
+
+# Reajuste completo após este número de meses atualizados incrementalmente
+DEFAULT_REFIT_EVERY = 12
+
+# Um erro um passo à frente maior que isso (em RMSE do ajuste) indica desvio
+DEFAULT_DRIFT_SIGMAS = 3.0
+
+
+def _month_number(dates):
+    dates = pd.DatetimeIndex(dates)
+    return np.asarray(dates.year * 12 + dates.month - 1, dtype='int64')
+
+
+def series_rmse(series_state):
+    """RMSE dos erros um passo à frente acumulados no estado de uma série."""
+    return math.sqrt(series_state['sse'] / series_state['n']) if series_state['n'] else 0.0
+
+
+def _trend_base(series_state, level, trend):
+    # Nível + tendência amortecida um passo à frente (aditiva ou multiplicativa)
+    phi = series_state.get('phi', 1.0)
+    if series_state.get('trend_type', 'add') == 'mul':
+        return level * trend ** phi
+    return level + phi * trend
+
+
+def update_series(series_state, values):
+    """
+    Aplica as equações de suavização exponencial do modelo escolhido
+    (Holt com tendência aditiva ou multiplicativa, amortecida ou não, e
+    sazonalidade aditiva opcional) com os parâmetros já ajustados aos
+    valores novos, em O(len(values)). Retorna o novo estado e os erros um
+    passo à frente de cada valor, que também entram em 'residuals'.
+    """
+    alpha, beta = series_state['alpha'], series_state['beta']
+    phi = series_state.get('phi', 1.0)
+    gamma = series_state.get('gamma', 0.0)
+    multiplicative = series_state.get('trend_type', 'add') == 'mul'
+    level, trend = series_state['level'], series_state['trend']
+    # Componentes sazonais dos últimos m meses, do mais antigo ao mais recente
+    season = list(series_state.get('season') or [])
+
+    errors = []
+    for y in values:
+        s = season[0] if season else 0.0
+        base = _trend_base(series_state, level, trend)
+        errors.append(y - (base + s))
+        new_level = alpha * (y - s) + (1 - alpha) * base
+        if multiplicative:
+            trend = beta * (new_level / level) + (1 - beta) * trend ** phi
+        else:
+            trend = beta * (new_level - level) + (1 - beta) * phi * trend
+        if season:
+            season = season[1:] + [gamma * (y - base) + (1 - gamma) * s]
+        level = new_level
+
+    errors = np.asarray(errors, dtype='float64')
+    updated = dict(series_state, level=level, trend=trend,
+                   sse=series_state['sse'] + float(np.sum(errors * errors)),
+                   n=series_state['n'] + len(errors),
+                   residuals=list(series_state.get('residuals', [])) + errors.tolist())
+    if season:
+        updated['season'] = season
+    return updated, errors
+
+
+def forecast_from_state(series_state, periods):
+    """Previsão dos próximos `periods` meses a partir do estado final."""
+    steps = np.arange(1, periods + 1)
+    phi = series_state.get('phi', 1.0)
+    # Soma de phi^1..phi^h: com phi = 1 é o próprio horizonte h
+    damped = steps if phi == 1.0 else np.cumsum(phi ** steps)
+    if series_state.get('trend_type', 'add') == 'mul':
+        forecast = series_state['level'] * series_state['trend'] ** damped
+    else:
+        forecast = series_state['level'] + series_state['trend'] * damped
+    season = series_state.get('season')
+    if season:
+        forecast = forecast + np.asarray(season)[(steps - 1) % len(season)]
+    return forecast
+
+
+def append_months(history, df):
+    """
+    Junta as linhas de `df` ao histórico salvo de um conjunto. `df` pode
+    trazer só os meses novos ou o histórico inteiro de novo; os meses que
+    já existem precisam ter os mesmos valores.
+
+    Retorna (histórico completo, linhas novas), ou None quando `df` não é
+    uma continuação do histórico (valores antigos alterados, meses
+    anteriores ao início do histórico ou lacunas) e um ajuste completo é
+    necessário.
+    """
+    last = history['Mes_dt'].iloc[-1]
+    overlap = df[df['Mes_dt'] <= last]
+    new_rows = df[df['Mes_dt'] > last]
+
+    if len(overlap):
+        saved = history.set_index('Mes_dt')
+        if not overlap['Mes_dt'].isin(saved.index).all():
+            return None
+        old = saved.loc[overlap['Mes_dt'], VALUE_COLUMNS].to_numpy(dtype='float64')
+        if not np.array_equal(old, overlap[VALUE_COLUMNS].to_numpy(dtype='float64')):
+            return None
+
+    # Os meses novos precisam seguir o último mês salvo, sem lacunas
+    expected = _month_number([last])[0] + 1 + np.arange(len(new_rows))
+    if not np.array_equal(_month_number(new_rows['Mes_dt']), expected):
+        return None
+
+    combined = pd.concat([history, new_rows[HISTORY_COLUMNS]], ignore_index=True)
+    return combined, new_rows
+
+
+def incremental_update(state, new_rows, refit_every=DEFAULT_REFIT_EVERY, drift_sigmas=DEFAULT_DRIFT_SIGMAS):
+    """
+    Atualiza o estado salvo com os meses novos sem reajustar os parâmetros.
+
+    Retorna (novo estado, None) ou (None, motivo) quando um ajuste
+    completo deve ser feito: reajuste agendado (`refit_every` meses desde
+    o último) ou desvio (erro um passo à frente acima de `drift_sigmas`
+    vezes o RMSE do ajuste em alguma série).
+    """
+    months_since_fit = state['months_since_fit'] + len(new_rows)
+    if months_since_fit >= refit_every:
+        return None, 'agendado'
+
+    series = {}
+    for name, col in STATE_SERIES.items():
+        previous = state['series'][name]
+        updated, errors = update_series(previous, new_rows[col].to_numpy(dtype='float64'))
+        limit = drift_sigmas * series_rmse(previous)
+        if len(errors) and limit > 0 and np.max(np.abs(errors)) > limit:
+            return None, 'desvio'
+        series[name] = updated
+
+    last_month = new_rows['Mes_dt'].iloc[-1] if len(new_rows) else pd.Timestamp(state['last_month'])
+    return dict(state, series=series, months_since_fit=months_since_fit,
+                last_month=last_month.strftime('%Y-%m'), updated_at=time.time()), None
+
+
+def _dump_json(state, path):
+    with open(path, 'w') as f:
+        json.dump(state, f)
+
+
+def new_state(series, params, last_month):
+    """Estado logo após um ajuste completo."""
+    return {
+        'version': STATE_VERSION,
+        'params': params,
+        'series': series,
+        'last_month': last_month.strftime('%Y-%m'),
+        'months_since_fit': 0,
+        'fitted_at': time.time(),
+        'updated_at': time.time(),
+    }
+
+
+class ModelStateStore:
+    """
+    Estado ajustado do modelo por conjunto de dados (nível, tendência e
+    parâmetros de suavização de cada série, mais o erro do ajuste), junto
+    com o histórico mensal usado. Permite atualizar a previsão quando
+    chegam meses novos sem reajustar tudo (ver incremental_update).
+
+    Cada conjunto ocupa dois arquivos: `<conjunto>.json` (estado) e
+    `<conjunto>.parquet` (histórico), gravados de forma atômica. O objeto
+    só guarda caminhos e limites, então pode ser enviado para os
+    processos da fila de jobs.
+    """
+
+    def __init__(self, state_dir, refit_every=DEFAULT_REFIT_EVERY, drift_sigmas=DEFAULT_DRIFT_SIGMAS):
+        self.state_dir = state_dir
+        self.refit_every = refit_every
+        self.drift_sigmas = drift_sigmas
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _paths(self, dataset):
+        base = os.path.join(self.state_dir, dataset)
+        return f"{base}.json", f"{base}.parquet"
+
+    def load(self, dataset, params):
+        """
+        Retorna (estado, histórico) do conjunto, ou None se não houver
+        estado salvo ou se ele for de outra versão/parâmetros do modelo.
+        """
+        state_path, history_path = self._paths(dataset)
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+            history = pd.read_parquet(history_path)
+        except (FileNotFoundError, ValueError):
+            return None
+        if state.get('version') != STATE_VERSION or state.get('params') != params:
+            return None
+        return state, history
+
+    def save(self, dataset, state, history):
+        state_path, history_path = self._paths(dataset)
+        # O histórico vai primeiro: um estado só é visível com o histórico correspondente
+        write_atomic(history_path, lambda path: history[HISTORY_COLUMNS].to_parquet(path, index=False))
+        write_atomic(state_path, lambda path: _dump_json(state, path))
+
+    def copy_state(self, dataset, state_path, history):
+        """Grava um estado já serializado (ex.: vindo do cache de resultados)."""
+        with open(state_path) as f:
+            state = json.load(f)
+        self.save(dataset, state, history)
+
+    def state_path(self, dataset):
+        return self._paths(dataset)[0]
+
+    @staticmethod
+    def namespaced(namespace, dataset):
+        """Nome do conjunto `dataset` dentro do espaço de um usuário (`<namespace>-<conjunto>`)."""
+        return f"{namespace}-{dataset}"
+
+    def remove_namespace(self, namespace):
+        """
+        Apaga os estados de todos os conjuntos do espaço `namespace` (ver
+        namespaced). Retorna quantos arquivos foram removidos.
+        """
+        prefix = self.namespaced(namespace, '')
+        removed = 0
+        for entry in os.scandir(self.state_dir):
+            if entry.name.startswith(prefix) and entry.name.endswith(('.json', '.parquet')):
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
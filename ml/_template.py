@@ -0,0 +1,155 @@
+import io
+import re
+import hashlib
+from datetime import datetime
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
+
+# Incrementar quando as colunas ou o layout do modelo mudarem (invalida os modelos em cache)
+TEMPLATE_VERSION = 1
+
+# Colunas do modelo de upload, na ordem da planilha
+TEMPLATE_COLUMNS = ['Mes', 'Producao_Total_kg', 'Eficiencia_kg_h', 'Horas_Operacionais', 'Residuo_kg']
+
+# Colunas opcionais que podem ser pedidas em `extras` (as mesmas da base de exemplo)
+EXTRA_COLUMNS = ['Producao_Minima_Esperada', 'Producao_Maxima_Esperada', 'Utilizacao_Capacidade']
+
+DEFAULT_LANGUAGE = 'pt'
+
+# Nomes das abas e descrição de cada coluna por idioma. Os cabeçalhos da
+# aba de dados continuam os nomes das colunas, que são os que a leitura
+# do upload reconhece; a tradução vai na aba de instruções.
+LANGUAGES = {
+    'pt': {
+        'sheets': ('Dados', 'Instruções'),
+        'header': ('Coluna', 'Descrição'),
+        'key': 'Planta/linha (chave da previsão em lote)',
+        'columns': {
+            'Mes': 'Mês (AAAA-MM) ou data/hora do registro',
+            'Producao_Total_kg': 'Produção total (kg)',
+            'Eficiencia_kg_h': 'Eficiência (kg/h)',
+            'Horas_Operacionais': 'Horas operacionais',
+            'Residuo_kg': 'Resíduo (kg), opcional',
+            'Producao_Minima_Esperada': 'Produção mínima esperada (kg), opcional',
+            'Producao_Maxima_Esperada': 'Produção máxima esperada (kg), opcional',
+            'Utilizacao_Capacidade': 'Utilização da capacidade (%), opcional',
+        },
+    },
+    'en': {
+        'sheets': ('Data', 'Instructions'),
+        'header': ('Column', 'Description'),
+        'key': 'Plant/line (batch forecast key)',
+        'columns': {
+            'Mes': 'Month (YYYY-MM) or record date/time',
+            'Producao_Total_kg': 'Total production (kg)',
+            'Eficiencia_kg_h': 'Efficiency (kg/h)',
+            'Horas_Operacionais': 'Operating hours',
+            'Residuo_kg': 'Waste (kg), optional',
+            'Producao_Minima_Esperada': 'Minimum expected production (kg), optional',
+            'Producao_Maxima_Esperada': 'Maximum expected production (kg), optional',
+            'Utilizacao_Capacidade': 'Capacity utilization (%), optional',
+        },
+    },
+    'es': {
+        'sheets': ('Datos', 'Instrucciones'),
+        'header': ('Columna', 'Descripción'),
+        'key': 'Planta/línea (clave de la previsión por lotes)',
+        'columns': {
+            'Mes': 'Mes (AAAA-MM) o fecha/hora del registro',
+            'Producao_Total_kg': 'Producción total (kg)',
+            'Eficiencia_kg_h': 'Eficiencia (kg/h)',
+            'Horas_Operacionais': 'Horas operativas',
+            'Residuo_kg': 'Residuo (kg), opcional',
+            'Producao_Minima_Esperada': 'Producción mínima esperada (kg), opcional',
+            'Producao_Maxima_Esperada': 'Producción máxima esperada (kg), opcional',
+            'Utilizacao_Capacidade': 'Utilización de la capacidad (%), opcional',
+        },
+    },
+}
+
+# Data fixa gravada nas propriedades e nas entradas do zip, para que a mesma
+# variante gere sempre os mesmos bytes (e a mesma ETag) em qualquer montagem
+FIXED_TIMESTAMP = datetime(2024, 1, 1)
+
+# Nome aceito para a coluna de chave (planta/linha)
+_KEY_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]{0,63}$')
+
+# Variantes montadas já na inicialização com WASTE_PRELOAD=1: cada idioma, com e sem a chave padrão
+PRESETS = [(language, key_col, ()) for language in LANGUAGES for key_col in (None, 'Planta')]
+
+
+def template_variant(language=DEFAULT_LANGUAGE, key_col=None, extras=()):
+    """
+    Valida e normaliza os parâmetros de uma variante do modelo e retorna
+    a tupla (idioma, coluna de chave ou None, extras na ordem de
+    EXTRA_COLUMNS). Levanta ValueError para parâmetros inválidos.
+    """
+    if language not in LANGUAGES:
+        raise ValueError(f"Idioma desconhecido: {language} (use {', '.join(LANGUAGES)})")
+    if key_col is not None and not _KEY_PATTERN.match(key_col):
+        raise ValueError(f'Nome de coluna de chave inválido: {key_col}')
+    unknown = [col for col in extras if col not in EXTRA_COLUMNS]
+    if unknown:
+        raise ValueError(f"Colunas extras desconhecidas: {', '.join(unknown)}")
+    return language, key_col, tuple(col for col in EXTRA_COLUMNS if col in extras)
+
+
+def template_columns(variant):
+    _, key_col, extras = variant
+    return ([key_col] if key_col else []) + TEMPLATE_COLUMNS + list(extras)
+
+
+def template_etag(data):
+    """
+    ETag forte do modelo: hash dos próprios bytes, que são determinísticos
+    (ver build_template), então a mesma variante tem a mesma ETag entre
+    montagens e workers, e Range/If-Range nunca juntam arquivos diferentes.
+    """
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+class _FixedTimeZip(ZipFile):
+    """ZipFile que grava todas as entradas com a data FIXED_TIMESTAMP."""
+
+    def writestr(self, zinfo_or_arcname, data, *args, **kwargs):
+        if not isinstance(zinfo_or_arcname, ZipInfo):
+            zinfo_or_arcname = ZipInfo(zinfo_or_arcname, date_time=FIXED_TIMESTAMP.timetuple()[:6])
+            zinfo_or_arcname.compress_type = self.compression
+        super().writestr(zinfo_or_arcname, data, *args, **kwargs)
+
+    def write(self, filename, arcname=None, *args, **kwargs):
+        # As abas em modo write_only chegam como arquivos temporários
+        with open(filename, 'rb') as f:
+            self.writestr(arcname or filename, f.read())
+
+
+def build_template(variant):
+    """
+    Monta o arquivo Excel de uma variante (ver template_variant) e retorna
+    os bytes: aba de dados só com os cabeçalhos e aba de instruções com a
+    descrição de cada coluna no idioma pedido. Os bytes só dependem da
+    variante: as datas do arquivo e do zip são fixas (FIXED_TIMESTAMP).
+    """
+    # Importado aqui, só quando um modelo precisa ser montado (ver ml._preload)
+    from openpyxl import Workbook
+    from openpyxl.writer.excel import ExcelWriter
+
+    language, key_col, _ = variant
+    texts = LANGUAGES[language]
+    columns = template_columns(variant)
+
+    wb = Workbook(write_only=True)
+    data = wb.create_sheet(texts['sheets'][0])
+    data.append(columns)
+
+    instructions = wb.create_sheet(texts['sheets'][1])
+    instructions.append(list(texts['header']))
+    for col in columns:
+        instructions.append([col, texts['key'] if col == key_col else texts['columns'][col]])
+
+    # Workbook.save sempre grava a hora atual em `modified`; o ExcelWriter
+    # direto mantém as datas fixas
+    wb.properties.created = FIXED_TIMESTAMP
+    wb.properties.modified = FIXED_TIMESTAMP
+    buffer = io.BytesIO()
+    ExcelWriter(wb, _FixedTimeZip(buffer, 'w', ZIP_DEFLATED, allowZip64=True)).save()
+    return buffer.getvalue()
@@ -0,0 +1,62 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml._state import update_series, forecast_from_state
+from ml._intervals import coefficient_matrix, _linear_params, _recursive_paths
+
+PATHS = 40
+PERIODS = 30
+
+# Estados com os parâmetros de cada forma de modelo (ver ml._select.CANDIDATES)
+STATES = {
+    'holt': {'trend_type': 'add', 'alpha': 0.6, 'beta': 0.2},
+    'holt_amortecido': {'trend_type': 'add', 'alpha': 0.5, 'beta': 0.3, 'phi': 0.9},
+    'holt_multiplicativo': {'trend_type': 'mul', 'alpha': 0.4, 'beta': 0.1, 'trend': 1.01},
+    'sazonal': {'trend_type': 'add', 'alpha': 0.3, 'beta': 0.1, 'gamma': 0.2},
+    'sazonal_amortecido': {'trend_type': 'add', 'alpha': 0.7, 'beta': 0.05, 'phi': 0.85, 'gamma': 0.4},
+}
+
+
+def make_state(name):
+    state = {'level': 500.0, 'trend': 3.0, 'sse': 0.0, 'n': 0, 'residuals': []}
+    state.update(STATES[name])
+    if 'gamma' in state:
+        state['season'] = (20 * np.sin(2 * np.pi * np.arange(12) / 12)).tolist()
+    return state
+
+
+def recursive_reference(state, draws):
+    # Cada caminho passa pelas equações do modelo, um mês de cada vez
+    out = np.empty_like(draws)
+    for p in range(draws.shape[0]):
+        current = state
+        for h in range(draws.shape[1]):
+            out[p, h] = forecast_from_state(current, 1)[0] + draws[p, h]
+            current, _ = update_series(current, [out[p, h]])
+    return out
+
+
+@pytest.fixture
+def draws():
+    return np.random.default_rng(3).normal(0, 10, (PATHS, PERIODS))
+
+
+@pytest.mark.parametrize('name', [name for name, spec in STATES.items() if spec['trend_type'] == 'add'])
+def test_linear_paths_match_recursive_update(name, draws):
+    state = make_state(name)
+    coef = coefficient_matrix(*([v] for v in _linear_params(state)), PERIODS)[0]
+    linear = forecast_from_state(state, PERIODS)[None, :] + draws @ coef.T
+
+    reference = recursive_reference(state, draws)
+    np.testing.assert_allclose(linear, reference, rtol=1e-13, atol=1e-13 * np.abs(reference).max())
+
+
+def test_multiplicative_paths_match_recursive_update(draws):
+    state = make_state('holt_multiplicativo')
+    reference = recursive_reference(state, draws)
+    np.testing.assert_allclose(_recursive_paths(state, draws), reference, rtol=1e-13)
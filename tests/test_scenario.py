@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ml._scenario as scenario
+from ml._frames import frame_paths, result_state_path
+from ml._intervals import BootstrapIntervals
+from ml._state import forecast_from_state
+
+PERIODS = 12
+
+SERIES = {
+    'eff': {'trend_type': 'add', 'alpha': 0.4, 'beta': 0.1, 'phi': 0.9, 'gamma': 0.2,
+            'level': 120.0, 'trend': 0.5, 'season': (5 * np.sin(2 * np.pi * np.arange(12) / 12)).tolist()},
+    'hours': {'trend_type': 'mul', 'alpha': 0.5, 'beta': 0.05, 'level': 400.0, 'trend': 1.002},
+}
+
+MIXED = [
+    {'name': 'base'},
+    {'name': 'mais_eficiencia', 'efficiency_pct': 10},
+    {'name': 'menos_horas', 'hours_pct': -20, 'waste_rate': 0.05},
+    {'name': 'teto', 'efficiency_max': 123},
+    {'name': 'piso_e_variacao', 'efficiency_pct': -5, 'hours_min': 395},
+    {'name': 'faixa', 'hours_pct': 3, 'hours_min': 390, 'hours_max': 410, 'efficiency_pct': 2},
+    {'name': 'teto_repetido', 'efficiency_max': 123},
+]
+
+
+@pytest.fixture
+def intervals():
+    return BootstrapIntervals(paths=2000)
+
+
+@pytest.fixture
+def basis(tmp_path, intervals):
+    # Resultado mínimo em disco: estado ajustado e meses da previsão
+    rng = np.random.default_rng(11)
+    series = {name: dict(state, residuals=rng.normal(0, scale, 36).tolist(), sse=0.0, n=36)
+              for (name, state), scale in zip(SERIES.items(), (3.0, 8.0))}
+    workbook_path = str(tmp_path / 'dados_com_previsao.xlsx')
+    with open(result_state_path(workbook_path), 'w') as f:
+        json.dump({'series': series}, f)
+    months = pd.date_range('2025-01-01', periods=PERIODS, freq='MS').strftime('%Y-%m')
+    pd.DataFrame({'Mes': months}).to_parquet(frame_paths(workbook_path)['forecast'], index=False)
+    return scenario.load_basis(workbook_path, intervals), series
+
+
+def test_neutral_scenario_reproduces_stored_forecast(basis, intervals):
+    basis, series = basis
+    names, columns = scenario.parse_scenarios([{'name': 'neutro'}])
+    result = scenario.evaluate(basis, columns)
+
+    # Os mesmos limites que o job grava na previsão (BootstrapIntervals.production)
+    lower, upper = intervals.production(series['eff'], series['hours'], PERIODS)
+    np.testing.assert_allclose(result['min_expected'][0], lower, rtol=1e-12)
+    np.testing.assert_allclose(result['max_expected'][0], upper, rtol=1e-12)
+    production = forecast_from_state(series['eff'], PERIODS) * forecast_from_state(series['hours'], PERIODS)
+    np.testing.assert_allclose(result['production'][0], production, rtol=1e-12)
+
+
+@pytest.mark.parametrize('chunk_values', [scenario.CHUNK_VALUES, 1])
+def test_mixed_scenarios_match_brute_force(basis, monkeypatch, chunk_values):
+    basis, _ = basis
+    monkeypatch.setattr(scenario, 'CHUNK_VALUES', chunk_values)
+    names, columns = scenario.parse_scenarios(MIXED)
+    result = scenario.evaluate(basis, columns)
+
+    for i, spec in enumerate(MIXED):
+        params = dict(scenario.SCENARIO_PARAMS, **{k: v for k, v in spec.items() if k != 'name'})
+
+        def adjust(values, prefix):
+            return np.clip(values * (1 + params[f'{prefix}_pct'] / 100),
+                           params[f'{prefix}_min'], params[f'{prefix}_max'])
+
+        eff = adjust(basis['eff'], 'efficiency')
+        hours = adjust(basis['hours'], 'hours')
+        sims = adjust(basis['eff_sims'], 'efficiency') * adjust(basis['hours_sims'], 'hours')
+        lower, upper = np.quantile(sims, basis['quantiles'], axis=-1)
+
+        np.testing.assert_allclose(result['production'][i], eff * hours, rtol=1e-12)
+        np.testing.assert_allclose(result['waste'][i], eff * hours * params['waste_rate'], rtol=1e-12)
+        np.testing.assert_allclose(result['min_expected'][i], lower, rtol=1e-12)
+        np.testing.assert_allclose(result['max_expected'][i], upper, rtol=1e-12)
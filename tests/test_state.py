@@ -0,0 +1,101 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml._select import CANDIDATES, fit_candidate
+from ml._state import update_series, forecast_from_state, append_months, VALUE_COLUMNS
+
+TRAIN_MONTHS = 40
+NEW_MONTHS = 8
+HORIZON = 6
+
+
+def monthly(values, start='2020-01-01'):
+    return pd.Series(values, index=pd.date_range(start, periods=len(values), freq='MS'))
+
+
+@pytest.fixture(scope='module')
+def series():
+    # Positiva (tendência multiplicativa), com tendência, sazonalidade e ruído
+    rng = np.random.default_rng(7)
+    months = np.arange(TRAIN_MONTHS + NEW_MONTHS)
+    values = 500 + 4 * months + 30 * np.sin(2 * np.pi * months / 12) + rng.normal(0, 8, len(months))
+    return monthly(values)
+
+
+@pytest.mark.parametrize('name', [name for name, spec in CANDIDATES.items() if spec is not None])
+def test_update_and_forecast_match_statsmodels(series, name):
+    from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+    spec = CANDIDATES[name]
+    train, new = series.iloc[:TRAIN_MONTHS], series.iloc[TRAIN_MONTHS:]
+    state = fit_candidate(train, name)
+    updated, errors = update_series(state, new.to_numpy(dtype='float64'))
+
+    # Mesmo modelo na série inteira, com os parâmetros e o estado inicial
+    # do ajuste no treino fixos: os meses novos só passam pelas equações
+    trained = ExponentialSmoothing(train, initialization_method='estimated', **spec).fit()
+    params = trained.params
+    known = {'initial_level': params['initial_level'], 'initial_trend': params['initial_trend']}
+    if spec.get('seasonal'):
+        known['initial_seasonal'] = params['initial_seasons']
+    full = ExponentialSmoothing(series, initialization_method='known', **known, **spec).fit(
+        smoothing_level=params['smoothing_level'], smoothing_trend=params['smoothing_trend'],
+        smoothing_seasonal=params['smoothing_seasonal'] if spec.get('seasonal') else None,
+        damping_trend=params['damping_trend'] if spec.get('damped_trend') else None,
+        optimized=False)
+
+    np.testing.assert_allclose(errors, full.resid.to_numpy()[TRAIN_MONTHS:], rtol=1e-9, atol=1e-9)
+    assert updated['level'] == pytest.approx(full.level.iloc[-1], rel=1e-9)
+    assert updated['trend'] == pytest.approx(full.trend.iloc[-1], rel=1e-9, abs=1e-9)
+    if spec.get('seasonal'):
+        np.testing.assert_allclose(updated['season'], full.season.iloc[-spec['seasonal_periods']:], rtol=1e-9)
+    np.testing.assert_allclose(forecast_from_state(updated, HORIZON), full.forecast(HORIZON).to_numpy(), rtol=1e-9)
+    assert updated['n'] == state['n'] + NEW_MONTHS
+
+
+def test_naive_update_repeats_last_value(series):
+    train, new = series.iloc[:TRAIN_MONTHS], series.iloc[TRAIN_MONTHS:]
+    state = fit_candidate(train, 'ingenuo')
+    updated, errors = update_series(state, new.to_numpy(dtype='float64'))
+
+    np.testing.assert_allclose(errors, np.diff(series.to_numpy()[TRAIN_MONTHS - 1:]))
+    np.testing.assert_allclose(forecast_from_state(updated, HORIZON), np.full(HORIZON, series.iloc[-1]))
+
+
+def frame(start, months, offset=0.0):
+    dates = pd.date_range(start, periods=months, freq='MS')
+    df = pd.DataFrame({'Mes': dates.strftime('%Y-%m'), 'Mes_dt': dates})
+    for i, col in enumerate(VALUE_COLUMNS):
+        df[col] = 100.0 * (i + 1) + np.arange(months) + offset
+    return df
+
+
+def test_append_months_accepts_new_months_and_resent_history():
+    history = frame('2023-01-01', 12)
+    latest = frame('2023-01-01', 15)
+
+    # Só os meses novos ou o histórico inteiro de novo: o resultado é o mesmo
+    for df in (latest.iloc[12:], latest):
+        combined, new_rows = append_months(history, df)
+        assert list(new_rows['Mes']) == ['2024-01', '2024-02', '2024-03']
+        assert list(combined['Mes']) == list(latest['Mes'])
+
+
+def test_append_months_rejects_gaps_and_changed_history():
+    history = frame('2023-01-01', 12)
+    latest = frame('2023-01-01', 15)
+
+    # Lacuna: falta 2024-01
+    assert append_months(history, latest.drop(index=12)) is None
+    # Valor de um mês já salvo alterado
+    changed = latest.copy()
+    changed.loc[3, 'Producao_Total_kg'] += 1
+    assert append_months(history, changed) is None
+    # Mês anterior ao início do histórico
+    assert append_months(history, frame('2022-12-01', 16)) is None
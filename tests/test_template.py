@@ -0,0 +1,44 @@
+import os
+import sys
+import importlib
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    # O app cria a pasta de uploads, a fila e os caches no diretório atual
+    sys.path.insert(0, ROOT)
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('app'))
+    try:
+        yield importlib.import_module('app')
+    finally:
+        os.chdir(cwd)
+
+
+def test_template_bytes_and_etag_are_stable_across_builds(app_module, tmp_path, monkeypatch):
+    client = app_module.app.test_client()
+    first = client.get('/download/template?idioma=en&chave=Planta')
+    assert first.status_code == 200
+
+    # Cache vazio: a planilha é montada de novo, com os mesmos bytes e a mesma ETag
+    monkeypatch.setattr(app_module, 'template_cache', app_module.BytesCache(str(tmp_path)))
+    second = client.get('/download/template?idioma=en&chave=Planta')
+    assert second.status_code == 200
+    assert second.data == first.data
+    assert second.headers['ETag'] == first.headers['ETag']
+
+    partial = client.get('/download/template?idioma=en&chave=Planta',
+                         headers={'Range': 'bytes=100-', 'If-Range': first.headers['ETag']})
+    assert partial.status_code == 206
+    assert partial.data == first.data[100:]
+
+    cached = client.get('/download/template?idioma=en&chave=Planta',
+                        headers={'If-None-Match': first.headers['ETag']})
+    assert cached.status_code == 304
+
+    other = client.get('/download/template?idioma=pt&chave=Planta')
+    assert other.headers['ETag'] != first.headers['ETag']
@@ -0,0 +1,11 @@
+"""
+Ponto de entrada WSGI para servidores de produção.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+O `app.run(debug=True)` de app.py continua sendo só o servidor de
+desenvolvimento.
+"""
+from app import app
+
+application = app